@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from column_records import DestinationColumn, SourceColumn, ViewColumn
+from contract_yaml import dump_yaml
+
+# Driver-like values: every fetched row carries its own copy of the name and type strings
+DATA_TYPES = ['int', 'bigint', 'nvarchar', 'varchar', 'datetime2', 'decimal', 'bit', 'uniqueidentifier']
+
+
+def fetched_rows(count, tables):
+    # (table, column, type, max length, is primary key, is nullable, description) as fresh strings per row
+    for number in range(count):
+        yield ('Table%05d' % (number % tables), 'Column%07d' % number, ''.join(DATA_TYPES[number % len(DATA_TYPES)]),
+               str(number % 255) if number % 3 else None, number % 10 == 0, number % 4 != 0, None)
+
+
+def dict_columns(kind, rows):
+    # The per-column dicts the generators built before column records
+    if kind == 'source':
+        return [{'name': column, 'type': data_type} for _, column, data_type, _, _, _, _ in rows]
+    if kind == 'destination':
+        return [{'name': column, 'type': data_type, 'is_nullable': is_nullable, 'is_primary_key': is_primary_key}
+                for _, column, data_type, _, is_primary_key, is_nullable, _ in rows]
+    return [{
+        'column': column,
+        'isPrimaryKey': bool(is_primary_key),
+        'isNullable': bool(is_nullable),
+        'logicalType': data_type,
+        'physicalType': f"{data_type}({max_length})" if max_length else data_type,
+        'tags': None,
+        'description': description,
+    } for _, column, data_type, max_length, is_primary_key, is_nullable, description in rows]
+
+
+def record_columns(kind, rows):
+    if kind == 'source':
+        return [SourceColumn(column, data_type) for _, column, data_type, _, _, _, _ in rows]
+    if kind == 'destination':
+        return [DestinationColumn(column, data_type, is_nullable, is_primary_key)
+                for _, column, data_type, _, is_primary_key, is_nullable, _ in rows]
+    return [ViewColumn(column, bool(is_primary_key), bool(is_nullable), data_type,
+                       f"{data_type}({max_length})" if max_length else data_type, None, description)
+            for _, column, data_type, max_length, is_primary_key, is_nullable, description in rows]
+
+
+def measure(build, kind, count, tables):
+    # Memory still held by the built columns (the row stream itself is garbage once consumed) and build time
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        columns = build(kind, fetched_rows(count, tables))
+        elapsed = time.perf_counter() - started
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return columns, {'bytes_per_column': round(held / count, 1), 'held_mb': round(held / 1e6, 1),
+                     'peak_mb': round(peak / 1e6, 1), 'seconds': round(elapsed, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory held by column dicts versus slotted column records")
+    parser.add_argument('--columns', type=int, default=1000000)
+    parser.add_argument('--tables', type=int, default=20000)
+    parser.add_argument('--emit-columns', type=int, default=20000,
+                        help="columns dumped to YAML to check both representations emit the same text")
+    parser.add_argument('--save', help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    failures = []
+    for kind in ('source', 'destination', 'view'):
+        for representation, build in (('dict', dict_columns), ('record', record_columns)):
+            columns, results[f"{kind}_{representation}"] = measure(build, kind, args.columns, args.tables)
+            del columns
+
+        dicts = dict_columns(kind, fetched_rows(args.emit_columns, args.tables))
+        records = record_columns(kind, fetched_rows(args.emit_columns, args.tables))
+        for sort_keys in (True, False):
+            if dump_yaml(dicts, sort_keys=sort_keys) != dump_yaml(records, sort_keys=sort_keys):
+                failures.append(f"{kind} records emit different YAML than dicts (sort_keys={sort_keys})")
+
+        before, after = results[f"{kind}_dict"], results[f"{kind}_record"]
+        print(f"{kind:>12}: {before['bytes_per_column']:7.1f} -> {after['bytes_per_column']:7.1f} bytes/column  "
+              f"{before['held_mb']:8.1f} -> {after['held_mb']:8.1f} MB held  "
+              f"{before['seconds']:6.2f} -> {after['seconds']:6.2f}s to build")
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump({'parameters': vars(args), 'results': results}, results_file, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_catalog
+from synthetic_catalog import QueryLog, SyntheticCatalog
+
+SOURCE_CONNECTION_STRING = 'DRIVER={SQL Server};SERVER=synthetic;DATABASE=synthetic'
+DESTINATION_CONNECTION_STRING = 'host=synthetic dbname=synthetic'
+AIRFLOW_CONNECTION_STRING = 'host=synthetic dbname=airflow'
+
+
+def measure(function, log, repeat, trace_memory):
+    # Best wall time over repeat runs, round trips of the last run, and peak traced memory of one extra run
+    # (tracing slows allocation down, so it is kept out of the timed runs)
+    best = None
+    result = None
+    for _ in range(repeat):
+        log.reset()
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    queries = log.total()
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return result, {'seconds': round(best, 4), 'queries': queries,
+                    'peak_mb': round(peak / 1e6, 2) if peak is not None else None}
+
+
+def run_benchmarks(catalog, log, directory, repeat=1, trace_memory=True, max_workers=8, streaming_batch_size=None):
+    import contract_validation
+    import metadata_catalog
+    import mssql_data_contract_gen as v1
+    import mssql_data_contract_gen_v2 as v2
+    import schema_drift
+
+    schema = catalog.schema
+    source_tables = [name for _, name in catalog.tables]
+    source_views = [name for _, name in catalog.views]
+    view_ddls = [view[0] for view in catalog.views.values()]
+    megabytes = sum(len(view_ddl) for view_ddl in view_ddls) / 1e6
+    results = {}
+
+    def parse_all():
+        for view_ddl in view_ddls:
+            v1.parse_view_ddl(view_ddl)
+
+    _, results['parse_view_ddl'] = measure(parse_all, log, repeat, trace_memory)
+    results['parse_view_ddl']['throughput'] = f"{megabytes / results['parse_view_ddl']['seconds']:.2f} MB/s"
+
+    def generate_v1():
+        return v1.generate_yaml_from_ddl(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                         AIRFLOW_CONNECTION_STRING, schema, 'public', source_tables, source_views,
+                                         bulk_catalog=True, max_workers=max_workers, run_stats_days=30)
+
+    # View definitions arrive in one streamed query and are parsed as they complete; nothing is exported
+    contract, results['generate_yaml_from_ddl'] = measure(generate_v1, log, repeat, trace_memory)
+    object_count = len(source_tables) + len(source_views)
+    results['generate_yaml_from_ddl']['throughput'] = \
+        f"{object_count / results['generate_yaml_from_ddl']['seconds']:.0f} objects/s"
+
+    # A contract covering a handful of objects of the same large schema: the catalog snapshot is filtered to the
+    # contract's tables and views, so time and memory follow the contract rather than the schema
+    small_tables = source_tables[:20]
+    small_views = source_views[:10]
+
+    def generate_small_contract():
+        return v1.generate_yaml_from_ddl(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                         AIRFLOW_CONNECTION_STRING, schema, 'public', small_tables, small_views,
+                                         bulk_catalog=True, max_workers=max_workers, run_stats_days=30)
+
+    _, results['generate_small_contract'] = measure(generate_small_contract, log, repeat, trace_memory)
+    results['generate_small_contract']['throughput'] = \
+        f"{(len(small_tables) + len(small_views)) / results['generate_small_contract']['seconds']:.0f} objects/s"
+
+    # The contract streamed to YAML at a quarter, half and all of the catalog's objects. Sections are written as
+    # they are extracted and the source side is read streaming_batch_size objects at a time, so the traced peak
+    # should stay flat as the contract grows; main() fails the run when it does not. Batches default to the
+    # smallest run's view count, so every run reads full batches and only the number of batches grows.
+    streamed_path = os.path.join(directory, 'contract_streamed.yaml')
+    streaming_batch_size = streaming_batch_size or max(len(source_views) // 4, 1)
+    streaming_peaks = {}
+    for fraction in (4, 2, 1):
+        streamed_tables = source_tables[:len(source_tables) // fraction]
+        streamed_views = source_views[:len(source_views) // fraction]
+
+        def generate_streaming():
+            v1.generate_yaml_streaming(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                       AIRFLOW_CONNECTION_STRING, schema, 'public', streamed_tables, streamed_views,
+                                       streamed_path, bulk_catalog=True, max_workers=max_workers, run_stats_days=30,
+                                       batch_size=streaming_batch_size)
+
+        _, streamed = measure(generate_streaming, log, repeat if fraction == 1 else 1, trace_memory)
+        streaming_peaks[str(len(streamed_tables) + len(streamed_views))] = streamed['peak_mb']
+    results['generate_yaml_streaming'] = streamed
+    streamed['throughput'] = f"{object_count / streamed['seconds']:.0f} objects/s"
+    streamed['peak_mb_by_objects'] = streaming_peaks if trace_memory else None
+
+    v1_path = os.path.join(directory, 'contract_v1.yaml')
+    _, results['save_yaml'] = measure(lambda: v1.save_yaml(contract, v1_path), log, repeat, trace_memory)
+    results['save_yaml']['throughput'] = \
+        f"{os.path.getsize(v1_path) / 1e6 / results['save_yaml']['seconds']:.2f} MB/s"
+
+    # An incremental run after 1% of the tables and views were altered: the cache is primed by a full run, then
+    # only the altered objects (and views reading altered tables) are re-extracted from a snapshot of just those
+    cache_path = os.path.join(directory, 'contract_v1.cache.json')
+    altered_tables = source_tables[::100]
+    altered_views = source_views[::100]
+
+    def generate_incremental():
+        return v1.generate_yaml_incremental(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                            AIRFLOW_CONNECTION_STRING, schema, 'public', source_tables, source_views,
+                                            v1_path, cache_path, bulk_catalog=True, max_workers=max_workers,
+                                            run_stats_days=30)
+
+    generate_incremental()
+
+    def generate_altered():
+        catalog.touch(schema, altered_tables + altered_views)
+        return generate_incremental()
+
+    _, results['generate_incremental'] = measure(generate_altered, log, repeat, trace_memory)
+    results['generate_incremental']['throughput'] = \
+        f"{(len(altered_tables) + len(altered_views)) / results['generate_incremental']['seconds']:.0f} objects/s"
+
+    # The contract through the SQLite catalog: store it, render it back without a database, and one impact query
+    catalog_path = os.path.join(directory, 'contract_catalog.sqlite')
+    impact_table = catalog.views[(schema, source_views[0])][1][0][1] if source_views else source_tables[0]
+
+    def catalog_round_trip():
+        with closing(metadata_catalog.open_catalog(catalog_path)) as contract_catalog:
+            metadata_catalog.store_contract(contract_catalog, 'contract_v1', contract, schema=schema)
+            metadata_catalog.render_contract(contract_catalog, 'contract_v1',
+                                             os.path.join(directory, 'contract_v1_rendered.yaml'))
+            return metadata_catalog.views_depending_on(contract_catalog, impact_table)
+
+    _, results['catalog_round_trip'] = measure(catalog_round_trip, log, repeat, trace_memory)
+    results['catalog_round_trip']['throughput'] = \
+        f"{object_count / results['catalog_round_trip']['seconds']:.0f} objects/s"
+
+    # Source tables and views against the destination copy of the catalog, column by column and by fingerprint
+    column_count = sum(len(columns) for columns in schema_drift.contract_objects(contract)[0].values())
+    for name, fingerprint_only in (('detect_drift', False), ('detect_drift_fingerprint', True)):
+        _, results[name] = measure(lambda: schema_drift.check_contract_drift(contract, fingerprint_only),
+                                   log, repeat, trace_memory)
+        results[name]['throughput'] = f"{column_count / results[name]['seconds']:.0f} columns/s"
+
+    def live_drift():
+        return schema_drift.check_live_drift(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, schema, 'public',
+                                             object_names=source_tables, fingerprint_only=True)
+
+    _, results['check_live_drift'] = measure(live_drift, log, repeat, trace_memory)
+    results['check_live_drift']['throughput'] = \
+        f"{len(source_tables) / results['check_live_drift']['seconds']:.0f} tables/s"
+
+    def v2_view_loop():
+        cursor = synthetic_catalog.StandInConnection(catalog, log).cursor()
+        table_cache = v2.TableMetadataCache(cursor, maxsize=len(catalog.tables))
+        view_tables = v2.resolve_view_tables(cursor, {schema: []}, table_cache)
+        return list(v2.iter_view_metadata(view_tables, table_cache))
+
+    views, results['v2_view_loop'] = measure(v2_view_loop, log, repeat, trace_memory)
+    results['v2_view_loop']['throughput'] = f"{len(views) / results['v2_view_loop']['seconds']:.0f} views/s"
+
+    def v2_profiled_view_loop():
+        # Statistics for every referenced table in two queries, then one sample per table on 8 connections
+        cursor = synthetic_catalog.StandInConnection(catalog, log).cursor()
+        table_cache = v2.TableMetadataCache(cursor, maxsize=len(catalog.tables))
+        view_tables = v2.resolve_view_tables(cursor, {schema: []}, table_cache)
+        with v2.TableProfiler(lambda: synthetic_catalog.StandInConnection(catalog, log), max_workers=8) as profiler:
+            v2.profile_view_tables(profiler, cursor, table_cache, view_tables)
+            return list(v2.iter_view_metadata(view_tables, table_cache, profiler)), profiler.sla()
+
+    (profiled_views, _), results['v2_profiled_view_loop'] = measure(v2_profiled_view_loop, log, repeat, trace_memory)
+    results['v2_profiled_view_loop']['throughput'] = \
+        f"{len(profiled_views) / results['v2_profiled_view_loop']['seconds']:.0f} views/s"
+
+    def write_v2():
+        with v2.open_contract_writer(v2_path) as writer:
+            v2.write_contract(writer, v2.contract_template(), iter(views))
+
+    v2_path = os.path.join(directory, 'contract_v2.yaml')
+    _, results['v2_write_contract'] = measure(write_v2, log, repeat, trace_memory)
+    results['v2_write_contract']['throughput'] = \
+        f"{os.path.getsize(v2_path) / 1e6 / results['v2_write_contract']['seconds']:.2f} MB/s"
+
+    # Copies of the v2 contract validated across processes, the way CI checks a directory of contracts
+    contract_directory = os.path.join(directory, 'contracts')
+    os.makedirs(contract_directory, exist_ok=True)
+    contract_paths = []
+    for copy_number in range(8):
+        contract_paths.append(os.path.join(contract_directory, f"contract_{copy_number:02d}.yaml"))
+        shutil.copyfile(v2_path, contract_paths[-1])
+
+    _, results['validate_contracts'] = measure(
+        lambda: contract_validation.validate_files(contract_paths, 'v2', max_workers=max_workers),
+        log, repeat, trace_memory)
+    results['validate_contracts']['throughput'] = \
+        f"{len(contract_paths) / results['validate_contracts']['seconds']:.1f} files/s"
+
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    # Slower or larger than the baseline by more than tolerance, or any additional round trip
+    regressions = []
+    for name, expected in baseline['results'].items():
+        actual = results.get(name)
+        if actual is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        if actual['seconds'] > expected['seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: {actual['seconds']}s vs baseline {expected['seconds']}s")
+        if actual['queries'] > expected['queries']:
+            regressions.append(f"{name}: {actual['queries']} queries vs baseline {expected['queries']}")
+        if actual['peak_mb'] is not None and expected['peak_mb'] is not None \
+                and actual['peak_mb'] > expected['peak_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: {actual['peak_mb']} MB peak vs baseline {expected['peak_mb']} MB")
+    return regressions
+
+
+def find_streaming_growth(results, tolerance):
+    # The streamed run's peak memory at its largest contract against its smallest one
+    peaks = results.get('generate_yaml_streaming', {}).get('peak_mb_by_objects')
+    if not peaks:
+        return []
+    counts = sorted(peaks, key=int)
+    smallest, largest = peaks[counts[0]], peaks[counts[-1]]
+    if largest > smallest * (1 + tolerance):
+        return [f"generate_yaml_streaming: {largest} MB peak for {counts[-1]} objects vs {smallest} MB for "
+                f"{counts[0]}; streaming memory grows with the contract"]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extraction and emission benchmarks against a synthetic catalog "
+                                                 "served through stand-in database connections")
+    parser.add_argument('--tables', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=200000, help="total table columns")
+    parser.add_argument('--views', type=int, default=2000)
+    parser.add_argument('--joins', type=int, default=4, help="joined tables per view")
+    parser.add_argument('--dags', type=int, default=1000)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--streaming-batch-size', type=int, default=None,
+                        help="source objects per batch of the streamed run (default: a quarter of the views)")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced peak memory run")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown or memory growth over the baseline, as a fraction")
+    parser.add_argument('--save', help="write this run's results as JSON")
+    args = parser.parse_args(argv)
+
+    parameters = {'tables': args.tables, 'columns': args.columns, 'views': args.views, 'joins': args.joins,
+                  'dags': args.dags, 'max_workers': args.max_workers,
+                  'streaming_batch_size': args.streaming_batch_size}
+
+    started = time.perf_counter()
+    catalog = SyntheticCatalog(tables=args.tables, columns=args.columns, views=args.views, joins=args.joins,
+                               dags=args.dags)
+    print(f"Catalog: {len(catalog.tables)} tables, {catalog.column_count} columns, {len(catalog.views)} views, "
+          f"{len(catalog.dags)} dags (generated in {time.perf_counter() - started:.1f}s)")
+
+    log = QueryLog()
+    synthetic_catalog.install(catalog, log)
+
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            # The generators report skipped objects on stdout; keep that out of the measurements
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                results = run_benchmarks(catalog, log, directory, repeat=args.repeat,
+                                         trace_memory=not args.no_memory, max_workers=args.max_workers,
+                                         streaming_batch_size=args.streaming_batch_size)
+        finally:
+            os.chdir(previous_directory)
+
+    for name, result in results.items():
+        peak = f"{result['peak_mb']:9.1f} MB peak" if result['peak_mb'] is not None else ''
+        print(f"{name:>24}: {result['seconds']:8.3f}s  {result['throughput']:>16}  "
+              f"{result['queries']:6d} queries  {peak}")
+    streaming_peaks = results['generate_yaml_streaming']['peak_mb_by_objects']
+    if streaming_peaks:
+        print(f"{'streaming peak':>24}: " + ', '.join(f"{peak_mb:.1f} MB for {count} objects"
+                                                      for count, peak_mb in streaming_peaks.items()))
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump({'parameters': parameters, 'results': results}, results_file, indent=2)
+
+    # Streaming memory has to stay flat with or without a baseline to compare against
+    regressions = find_streaming_growth(results, args.tolerance)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['parameters'] != parameters:
+            print(f"Baseline was recorded with {baseline['parameters']}; rerun with the same parameters")
+            return 2
+
+        regressions += find_regressions(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
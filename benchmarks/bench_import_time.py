@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'column_records',
+    'contract_yaml',
+    'run_metrics',
+    'metadata_catalog',
+    'ddl_export',
+    'tsql_view_parser',
+    'mssql_data_contract_gen',
+    'mssql_data_contract_gen_v2',
+    'schema_drift',
+    'contract_validation',
+    'table_profiler',
+    'data_contract_cli',
+]
+
+# Imported lazily, only by the runs that use the matching backend
+DRIVER_MODULES = ['pyodbc', 'psycopg2', 'yaml']
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(set(sys.modules) - before)}}))
+"""
+
+
+def measure_import(module, repeat):
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], cwd=REPOSITORY, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output)
+        if best is None or result['seconds'] < best:
+            best = result['seconds']
+        loaded = result['modules']
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time of the contract modules in a fresh interpreter")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=50.0,
+                        help="fail when any module takes longer than this to import")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in MODULES:
+        seconds, loaded = measure_import(module, args.repeat)
+        drivers = [driver for driver in DRIVER_MODULES if driver in loaded]
+        print(f"{module:>28}: {seconds * 1000:7.2f} ms  {len(loaded):4d} modules loaded"
+              + (f"  drivers: {', '.join(drivers)}" if drivers else ''))
+
+        if drivers:
+            failures.append(f"{module} imports {', '.join(drivers)} eagerly")
+        if seconds * 1000 > args.max_ms:
+            failures.append(f"{module} took {seconds * 1000:.2f} ms to import (limit {args.max_ms} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
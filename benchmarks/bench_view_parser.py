@@ -0,0 +1,94 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tsql_view_parser import parse_view, tokenize
+
+
+# Previous regex implementation of parse_view_ddl, kept here as the comparison baseline
+def regex_parse_view_ddl(view_ddl):
+    columns = []
+    tables = set()
+    column_pattern = re.compile(r'\[?([a-zA-Z_]\w*)\]?\s*(?:,|\n|$)', re.IGNORECASE)
+    table_pattern = re.compile(r'\bFROM\s+\[?([a-zA-Z_]\w*)\]?\s*(?:\b|$)', re.IGNORECASE)
+    for match in column_pattern.finditer(view_ddl):
+        columns.append(match.group(1))
+    for match in table_pattern.finditer(view_ddl):
+        tables.add(match.group(1))
+    return columns, list(tables)
+
+
+def generate_view_ddl(rng, view_number, column_count, join_count):
+    # Generated-looking view: a CTE, bracketed names, aliases, computed columns, comments and joins
+    lines = [
+        f"/* generated view {view_number} /* nested */ */",
+        f"CREATE VIEW [dbo].[vGenerated{view_number}]",
+        "AS",
+        "WITH [Recent] AS (",
+        f"    SELECT r.[Id], r.[ModifiedDate] FROM [dbo].[Audit{view_number % 50}] AS r WHERE r.[ModifiedDate] > '2020-01-01'",
+        ")",
+        "SELECT",
+    ]
+    items = []
+    for column_number in range(column_count):
+        alias = f"t{rng.randrange(join_count + 1)}"
+        style = column_number % 4
+        if style == 0:
+            items.append(f"    {alias}.[Column{column_number}]")
+        elif style == 1:
+            items.append(f"    {alias}.[Column{column_number}] AS [Renamed{column_number}]")
+        elif style == 2:
+            items.append(f"    Computed{column_number} = ISNULL({alias}.[Column{column_number}], N'n/a') -- default")
+        else:
+            items.append(f"    CASE WHEN {alias}.[Flag] = 1 THEN 'Y' ELSE 'N' END AS [Flag{column_number}]")
+    lines.append(",\n".join(items))
+    lines.append(f"FROM [dbo].[Fact{view_number % 200}] AS t0")
+    for join_number in range(1, join_count + 1):
+        lines.append(f"    LEFT OUTER JOIN [dbo].[Dimension{rng.randrange(500)}] AS t{join_number} "
+                     f"ON t{join_number}.[Id] = t0.[Dimension{join_number}Id]")
+    lines.append("    INNER JOIN [Recent] ON [Recent].[Id] = t0.[Id]")
+    lines.append("WHERE t0.[IsDeleted] = 0")
+    return "\n".join(lines)
+
+
+def generate_corpus(view_count, column_count, join_count, seed=42):
+    rng = random.Random(seed)
+    return [generate_view_ddl(rng, view_number, column_count, join_count) for view_number in range(view_count)]
+
+
+def measure(function, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for view_ddl in corpus:
+            function(view_ddl)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the T-SQL view parser on a synthetic DDL corpus")
+    parser.add_argument('--views', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=200)
+    parser.add_argument('--joins', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.views, args.columns, args.joins)
+    megabytes = sum(len(view_ddl) for view_ddl in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} views, {megabytes:.1f} MB of DDL")
+
+    for label, function in (('tokenize', tokenize), ('parse_view', parse_view),
+                            ('regex baseline', regex_parse_view_ddl)):
+        elapsed = measure(function, corpus, args.repeat)
+        print(f"{label:>15}: {elapsed:.3f}s  {megabytes / elapsed:7.2f} MB/s  {len(corpus) / elapsed:9.1f} views/s")
+
+
+if __name__ == '__main__':
+    main()
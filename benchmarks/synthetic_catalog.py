@@ -0,0 +1,401 @@
+import datetime
+import hashlib
+import json
+import random
+import sys
+import types
+from collections import Counter, OrderedDict, namedtuple
+
+# (type, sys.columns max_length, precision, scale, v2 MaxLength, Postgres type) for the synthetic columns
+COLUMN_TYPES = [
+    ('int', 4, 10, 0, None, 'integer'),
+    ('nvarchar', 100, 0, 0, '50', 'character varying(50)'),
+    ('varchar', -1, 0, 0, 'max', 'text'),
+    ('decimal', 9, 18, 4, '18,4', 'numeric(18,4)'),
+    ('datetime2', 8, 27, 7, None, 'timestamp without time zone'),
+    ('bit', 1, 1, 0, None, 'boolean'),
+]
+
+InformationSchemaRow = namedtuple('InformationSchemaRow', ['COLUMN_NAME', 'DATA_TYPE'])
+
+
+class SyntheticCatalog:
+    # A generated SQL Server schema (tables, views with realistic DDL, view-on-view chains), its Postgres
+    # copy and an Airflow dag table, indexed the way the stand-in connections need to answer queries
+    def __init__(self, tables=10000, columns=200000, views=2000, joins=4, view_columns=24, view_on_view=0.1,
+                 dags=1000, schema='dbo', seed=42):
+        rng = random.Random(seed)
+        self.schema = schema
+        columns_per_table = max(columns // tables, 2)
+
+        # {(schema, table): [(column_id, name, type row, is_nullable, is_primary_key)]}
+        self.tables = OrderedDict()
+        for table_number in range(tables):
+            table_columns = [(1, 'Id', COLUMN_TYPES[0], False, True)]
+            for column_number in range(1, columns_per_table):
+                column_type = COLUMN_TYPES[(table_number + column_number) % len(COLUMN_TYPES)]
+                table_columns.append((column_number + 1, f"Column{column_number:02d}", column_type,
+                                      column_number % 3 != 0, False))
+            self.tables[(schema, f"Table{table_number:05d}")] = table_columns
+
+        # {(schema, view): (ddl, [(schema, object, type)], [(column_id, name, type row, is_nullable, False)])}
+        table_names = [name for _, name in self.tables]
+        self.views = OrderedDict()
+        for view_number in range(views):
+            view_name = f"vReport{view_number:05d}"
+            sources = rng.sample(table_names, min(joins + 1, len(table_names)))
+            referenced_view = None
+            if view_number and rng.random() < view_on_view:
+                referenced_view = f"vReport{rng.randrange(view_number):05d}"
+            ddl, output_columns = self._view_ddl(rng, view_name, sources, referenced_view, view_columns,
+                                                 columns_per_table)
+            edges = [(schema, name, 'U') for name in sorted(set(sources))]
+            if referenced_view:
+                edges.append((schema, referenced_view, 'V'))
+            self.views[(schema, view_name)] = (ddl, sorted(edges), output_columns)
+
+        self.dags = [(f"contract_dag_{dag_number:05d}", dag_number % 7 != 0,
+                      '@daily' if dag_number % 3 else '0 5 * * *') for dag_number in range(dags)]
+        self.last_success = datetime.datetime(2024, 1, 1, 5, 30, tzinfo=datetime.timezone.utc)
+        # Whether the Airflow database has the dataset tables of Airflow 2.4+
+        self.airflow_datasets = True
+        # Database compatibility level of the source; OPENJSON needs 130 (SQL Server 2016)
+        self.compatibility_level = 150
+
+        # sys.objects ids in creation order, and the modify_date of objects altered since (see touch)
+        self.object_ids = {key: object_id for object_id, key in enumerate(list(self.tables) + list(self.views), 1)}
+        self.created = datetime.datetime(2023, 1, 1)
+        self.modified = {}
+
+    def _view_ddl(self, rng, view_name, sources, referenced_view, view_columns, columns_per_table):
+        # Bracketed names, aliases, computed columns, comments, a CTE and joins, like hand-written views
+        items = ["    t0.[Id]"]
+        output_columns = [(1, 'Id', COLUMN_TYPES[0], False, False)]
+        for column_number in range(1, view_columns):
+            alias = rng.randrange(len(sources))
+            source_column = f"Column{rng.randrange(1, columns_per_table):02d}"
+            style = column_number % 4
+            if style == 0:
+                name = source_column if column_number < columns_per_table else f"{source_column}_{column_number}"
+                items.append(f"    t{alias}.[{source_column}] AS [{name}]")
+            elif style == 1:
+                name = f"Renamed{column_number}"
+                items.append(f"    t{alias}.[{source_column}] AS [{name}]")
+            elif style == 2:
+                name = f"Computed{column_number}"
+                items.append(f"    {name} = ISNULL(t{alias}.[{source_column}], N'n/a') -- default")
+            else:
+                name = f"Flag{column_number}"
+                items.append(f"    CASE WHEN t{alias}.[{source_column}] IS NULL THEN 'N' ELSE 'Y' END AS [{name}]")
+            output_columns.append((column_number + 1, name, COLUMN_TYPES[column_number % len(COLUMN_TYPES)], True,
+                                   False))
+
+        lines = [
+            f"/* generated view {view_name} */",
+            f"CREATE VIEW [{self.schema}].[{view_name}]",
+            "AS",
+            "WITH [Latest] AS (",
+            f"    SELECT l.[Id], MAX(l.[Column01]) AS [Latest] FROM [{self.schema}].[{sources[0]}] AS l GROUP BY l.[Id]",
+            ")",
+            "SELECT",
+            ",\n".join(items),
+            f"FROM [{self.schema}].[{sources[0]}] AS t0",
+        ]
+        for join_number, source in enumerate(sources[1:], 1):
+            lines.append(f"    LEFT OUTER JOIN [{self.schema}].[{source}] AS t{join_number} "
+                         f"ON t{join_number}.[Id] = t0.[Id]")
+        lines.append("    INNER JOIN [Latest] ON [Latest].[Id] = t0.[Id]")
+        if referenced_view:
+            lines.append(f"    INNER JOIN [{self.schema}].[{referenced_view}] AS rv ON rv.[Id] = t0.[Id]")
+        lines.append("WHERE t0.[Id] > 0")
+        return "\n".join(lines), output_columns
+
+    @property
+    def column_count(self):
+        return sum(len(columns) for columns in self.tables.values())
+
+    def objects(self, schema, names=None):
+        # Tables and views of a schema as (name, type, columns), in name order like the catalog query
+        found = [(name, 'U ', columns) for (object_schema, name), columns in self.tables.items()
+                 if object_schema == schema]
+        found += [(name, 'V ', view[2]) for (object_schema, name), view in self.views.items()
+                  if object_schema == schema]
+        if names is not None:
+            names = set(names)
+            found = [entry for entry in found if entry[0] in names]
+        return sorted(found, key=lambda entry: entry[0])
+
+    def row_count(self, key):
+        # Large, uneven tables so every sample goes through TABLESAMPLE
+        return 1000000 * (int(key[1][-2:]) % 50 + 1)
+
+    def touch(self, schema, names):
+        # ALTER the given objects: each call moves their modify_date forward
+        altered = max(self.modified.values(), default=self.created) + datetime.timedelta(seconds=1)
+        for name in names:
+            self.modified[(schema, name)] = altered
+
+    def columns_of(self, schema, name):
+        if (schema, name) in self.tables:
+            return self.tables[(schema, name)]
+        if (schema, name) in self.views:
+            return self.views[(schema, name)][2]
+        return []
+
+
+class QueryLog:
+    # Round trips and rows returned per query kind, shared by every stand-in connection of a run
+    def __init__(self):
+        self.queries = Counter()
+        self.rows = Counter()
+
+    def record(self, kind, row_count):
+        self.queries[kind] += 1
+        self.rows[kind] += row_count
+
+    def reset(self):
+        self.queries.clear()
+        self.rows.clear()
+
+    def total(self):
+        return sum(self.queries.values())
+
+
+class StandInCursor:
+    # DB-API cursor that recognises the generators' queries by their shape and answers them from the
+    # synthetic catalog, so extraction can be measured without SQL Server, Postgres or Airflow
+    arraysize = 1
+
+    def __init__(self, catalog, log, name=None):
+        self.catalog = catalog
+        self.log = log
+        self.name = name
+        self.description = None
+        self.itersize = 2000
+        self._rows = iter(())
+
+    def execute(self, query, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)) and '%s' in query:
+            params = tuple(params[0])
+        kind, rows, columns = self._answer(query, params)
+        self.description = [(column, str, None, None, None, None, True) for column in columns]
+        if self.name is not None:
+            # A named (server-side) cursor streams its rows, like psycopg2's; they are counted as they are read
+            self.log.record(kind, 0)
+            self._rows = self._counted(kind, rows)
+        else:
+            rows = list(rows)
+            self.log.record(kind, len(rows))
+            self._rows = iter(rows)
+        return self
+
+    def _counted(self, kind, rows):
+        for row in rows:
+            self.log.rows[kind] += 1
+            yield row
+
+    def _answer(self, query, params):
+        catalog = self.catalog
+        if query.strip() == 'SELECT 1':
+            return 'health_check', [(1,)], ['']
+
+        if 'compatibility_level' in query:
+            return 'compatibility_level', [(catalog.compatibility_level,)], ['compatibility_level']
+
+        if 'OPENJSON' in query and catalog.compatibility_level < 130:
+            raise sys.modules['pyodbc'].Error("Invalid object name 'OPENJSON'.")
+
+        if 'dm_db_partition_stats' in query:
+            keys = [tuple(key) for key in json.loads(params[0])]
+            rows = [key + (catalog.row_count(key), catalog.row_count(key) // 10, catalog.row_count(key) // 12)
+                    for key in keys if key in catalog.tables]
+            return 'table_storage', rows, ['SchemaName', 'TableName', 'TableRows', 'ReservedKb', 'UsedKb']
+
+        if 'dm_db_stats_histogram' in query:
+            # Only the primary key has statistics, like a table nobody has filtered on yet
+            keys = [tuple(key) for key in json.loads(params[0])]
+            rows = [key + ('Id', catalog.row_count(key), catalog.last_success, 0, catalog.row_count(key), '1',
+                           str(catalog.row_count(key)))
+                    for key in keys if key in catalog.tables]
+            return 'column_statistics', rows, ['SchemaName', 'TableName', 'ColumnName', 'StatisticsRows',
+                                               'LastUpdated', 'NullRows', 'DistinctValues', 'MinValue', 'MaxValue']
+
+        if 'COUNT_BIG(*)' in query:
+            return 'table_sample', [self._sample_row(query)], ['']
+
+        if 'modify_date' in query:
+            schema = params[0]
+            rows = [(catalog.object_ids[(schema, name)], name, object_type,
+                     catalog.modified.get((schema, name), catalog.created))
+                    for name, object_type, _ in catalog.objects(schema)]
+            return 'source_freshness', rows, ['object_id', 'name', 'type', 'modify_date']
+
+        if 'sql_modules' in query:
+            # Only views have definitions; each is cut into byte chunks of its UTF-16 text like the server query
+            chunk_bytes, schema = params[:2]
+            names = set(json.loads(params[2])) if len(params) > 2 else None
+            rows = []
+            if "'V'" in query:
+                for (view_schema, name), view in sorted(catalog.views.items()):
+                    if view_schema != schema or (names is not None and name not in names):
+                        continue
+                    definition = view[0].encode('utf-16-le')
+                    rows.extend((view_schema, name, 'V ', chunk_number, definition[start:start + chunk_bytes])
+                                for chunk_number, start in enumerate(range(0, len(definition), chunk_bytes)))
+            return 'module_definitions', rows, ['SchemaName', 'ObjectName', 'ModuleType', 'ChunkNumber',
+                                                'DefinitionChunk']
+
+        if 'ObjectType' in query:
+            schema = params[0]
+            names = json.loads(params[1]) if len(params) > 1 else None
+            rows = [(schema, name, object_type, column_id, column_name, column_type[0], column_type[1],
+                     column_type[2], column_type[3], is_nullable, is_primary_key)
+                    for name, object_type, columns in catalog.objects(schema, names)
+                    for column_id, column_name, column_type, is_nullable, is_primary_key in columns]
+            return 'catalog_columns', rows, ['SchemaName', 'ObjectName', 'ObjectType']
+
+        if 'OBJECT_DEFINITION' in query:
+            schema, name = params
+            view = catalog.views.get((schema, name))
+            return 'view_definition', [(view[0],)] if view else [], ['']
+
+        if 'INFORMATION_SCHEMA.COLUMNS' in query:
+            name, schema = params
+            rows = [InformationSchemaRow(column_name, column_type[0])
+                    for _, column_name, column_type, _, _ in catalog.columns_of(schema, name)]
+            return 'information_schema_columns', rows, list(InformationSchemaRow._fields)
+
+        if 'sql_expression_dependencies' in query:
+            if 'ViewName sysname' in query:
+                keys = [tuple(key) for key in json.loads(params[0])]
+            elif 'v.name = ?' in query:
+                keys = [tuple(params)]
+            else:
+                schemas = set(json.loads(params[0])) if 'OPENJSON' in query else {params[0]}
+                keys = [key for key in catalog.views if key[0] in schemas]
+            rows = []
+            for key in sorted(keys):
+                view = catalog.views.get(key)
+                if view is None:
+                    continue
+                # Edges may carry the server and database of a cross-database reference
+                rows.extend(key + edge + (None,) * (5 - len(edge)) for edge in view[1])
+            return 'view_dependencies', rows, ['ViewSchema', 'ViewName', 'ReferencedSchema', 'ReferencedName',
+                                               'ReferencedType', 'ReferencedServer', 'ReferencedDatabase']
+
+        if 'TableColumns' in query:
+            if 'OPENJSON' in query:
+                keys = sorted(tuple(key) for key in json.loads(params[0]))
+            else:
+                keys = [(params[1], params[0])]
+            rows = [(schema, name, column_name, column_type[0], column_type[4], is_primary_key, is_nullable, None)
+                    for schema, name in keys
+                    for _, column_name, column_type, is_nullable, is_primary_key in catalog.tables.get((schema, name), [])]
+            return 'table_columns', rows, ['SchemaName', 'TableName', 'ColumnName', 'DataType', 'MaxLength',
+                                           'IsPrimaryKey', 'IsNullable', 'ColumnDescription']
+
+        if 'to_regclass' in query:
+            return 'airflow_dataset_tables', [(catalog.airflow_datasets,)], ['']
+
+        if 'task_outlet_dataset_reference' in query and not catalog.airflow_datasets:
+            raise sys.modules['psycopg2'].Error('relation "task_outlet_dataset_reference" does not exist')
+
+        if 'FROM dag_run' in query:
+            # Filters are not applied; every DAG gets the same synthetic statistics
+            rows = [(dag_id, catalog.last_success, 312.5, 845.0, 0.02, 30) for dag_id, _, _ in catalog.dags]
+            return 'airflow_run_stats', rows, ['dag_id', 'last_success', 'p50_duration', 'p95_duration',
+                                               'failure_rate', 'run_count']
+
+        if 'FROM dag' in query:
+            return 'airflow_dags', catalog.dags, ['dag_id', 'is_active', 'schedule_interval']
+
+        if 'base_type' in query:
+            # Drift fingerprints of the destination tables, hashed the way the server query does
+            from schema_drift import destination_fingerprint
+            rows = [(name.lower(), destination_fingerprint([{'name': column_name, 'type': column_type[5]}
+                                                            for _, column_name, column_type, _, _ in columns]))
+                    for (_, name), columns in catalog.tables.items()]
+            return 'destination_drift_fingerprints', rows, ['table_name', 'fingerprint']
+
+        if 'string_agg' in query:
+            # Destination table fingerprints for incremental runs; any stable hash of the columns will do
+            rows = [(name.lower(), hashlib.md5(repr([(column_name.lower(), column_type[5], is_nullable, is_primary_key)
+                                                     for _, column_name, column_type, is_nullable, is_primary_key
+                                                     in columns]).encode('utf-8')).hexdigest())
+                    for (_, name), columns in catalog.tables.items()]
+            return 'destination_fingerprints', rows, ['table_name', 'fingerprint']
+
+        if 'pg_catalog.pg_class' in query:
+            names = set(params[1]) if len(params) > 1 else None
+            tables = sorted((name.lower(), columns) for (_, name), columns in catalog.tables.items()
+                            if names is None or name.lower() in names)
+            rows = ((table_name, column_name.lower(), column_type[5], is_nullable, is_primary_key)
+                    for table_name, columns in tables
+                    for _, column_name, column_type, is_nullable, is_primary_key in columns)
+            return 'destination_catalog', rows, ['table_name', 'column_name', 'data_type', 'is_nullable',
+                                                 'is_primary_key']
+
+        raise NotImplementedError(f"The synthetic catalog cannot answer this query:\n{query}")
+
+    @staticmethod
+    def _sample_row(query):
+        # One value per aggregate of the sample query's select list, split on top-level commas
+        select_list = query[len('SELECT '):query.index(' FROM (SELECT TOP')]
+        items, depth, start = [], 0, 0
+        for position, character in enumerate(select_list):
+            depth += {'(': 1, ')': -1}.get(character, 0)
+            if character == ',' and depth == 0:
+                items.append(select_list[start:position].strip())
+                start = position + 1
+        items.append(select_list[start:].strip())
+
+        answers = {'COUNT_BIG': 50000, 'SUM(CASE': 500, 'COUNT(DISTINCT': 1200,
+                   'CONVERT(NVARCHAR(4000), MIN': '2020-01-01T00:00:00',
+                   'CONVERT(NVARCHAR(4000), MAX': '2024-01-01T05:30:00'}
+        return tuple(next((value for prefix, value in answers.items() if item.startswith(prefix)), 0)
+                     for item in items)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        return [row for _, row in zip(range(size or self.arraysize), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        self._rows = iter(())
+
+
+class StandInConnection:
+    def __init__(self, catalog, log):
+        self.catalog = catalog
+        self.log = log
+        self.timeout = 0
+        self.closed = False
+
+    def cursor(self, name=None):
+        return StandInCursor(self.catalog, self.log, name)
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def install(catalog, log):
+    # Register stand-in pyodbc and psycopg2 modules; the generators resolve their drivers lazily, so
+    # every connection they open from now on is served by the synthetic catalog
+    for module_name in ('pyodbc', 'psycopg2'):
+        module = types.ModuleType(module_name)
+        module.Error = type('Error', (Exception,), {})
+        module.connect = lambda *args, **kwargs: StandInConnection(catalog, log)
+        sys.modules[module_name] = module
@@ -0,0 +1,146 @@
+import sys
+from collections.abc import Mapping
+
+from run_metrics import get_metrics
+
+
+def intern_string(value):
+    # Type, schema and table names repeat across millions of columns; interned, every repeat shares one string
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def fold_name(key):
+    # Object names (or (schema, object) keys) compared the way SQL Server's default collations compare them
+    if isinstance(key, tuple):
+        return tuple(fold_name(part) for part in key)
+    return key.casefold() if isinstance(key, str) else key
+
+
+def display_name(key):
+    return '.'.join(key) if isinstance(key, tuple) else key
+
+
+class NameIndex(dict):
+    # Objects keyed the way the server spells their names. Callers name objects as they were configured,
+    # which may differ in case; resolve() and lookup() then fall back to a case-insensitive match instead of
+    # missing. Those matches are remembered, and reported once each in the run metrics. The folded keys are
+    # rebuilt on a miss whenever entries were added since.
+    _folded = None
+    _folded_size = 0
+    _resolved = None
+
+    def resolve(self, key):
+        # The key as stored, or None when no object has that name in any case
+        if key in self:
+            return key
+
+        if self._folded is None or self._folded_size != len(self):
+            self._folded = {fold_name(name): name for name in self}
+            self._folded_size = len(self)
+            self._resolved = {}
+        if key in self._resolved:
+            return self._resolved[key]
+
+        name = self._resolved[key] = self._folded.get(fold_name(key))
+        if name is not None:
+            get_metrics().record_name_match(display_name(key), display_name(name))
+        return name
+
+    def lookup(self, key, default=None):
+        name = self.resolve(key)
+        return default if name is None else self[name]
+
+
+class ColumnRecord(Mapping):
+    # A column held in __slots__ instead of a per-column dict, so there is no per-instance dictionary and
+    # no repeated key table. Records read like the dicts they replace (record['name'], .get(), .items())
+    # and become plain dicts, keyed in slot order, only when a contract is emitted.
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class SourceColumn(ColumnRecord):
+    # Source table columns of the v1 contract, from the catalog snapshot or INFORMATION_SCHEMA.COLUMNS
+    __slots__ = ('name', 'type')
+
+    def __init__(self, name, type):
+        self.name = name
+        self.type = intern_string(type)
+
+
+class ViewOutputColumn(ColumnRecord):
+    # v1 view columns as SQL Server describes the view's result, with the declared type including its length,
+    # precision or scale, and the base table and column each one is read from when the view definition shows
+    # it (None for computed columns)
+    __slots__ = ('name', 'type', 'physical_type', 'is_nullable', 'table', 'column')
+
+    def __init__(self, name, type, physical_type, is_nullable, table, column):
+        self.name = name
+        self.type = intern_string(type)
+        self.physical_type = intern_string(physical_type)
+        self.is_nullable = is_nullable
+        self.table = intern_string(table)
+        self.column = column
+
+
+class DestinationColumn(ColumnRecord):
+    # Columns of the v1 destination section read from pg_catalog
+    __slots__ = ('name', 'type', 'is_nullable', 'is_primary_key')
+
+    def __init__(self, name, type, is_nullable, is_primary_key):
+        self.name = name
+        self.type = intern_string(type)
+        self.is_nullable = is_nullable
+        self.is_primary_key = is_primary_key
+
+
+class CatalogColumn(ColumnRecord):
+    # Entries of the v1 source catalog snapshot; they never reach the contract themselves
+    __slots__ = ('name', 'type', 'object_type', 'max_length', 'precision', 'scale', 'is_nullable', 'is_primary_key')
+
+    def __init__(self, name, type, object_type, max_length, precision, scale, is_nullable, is_primary_key):
+        self.name = name
+        self.type = intern_string(type)
+        self.object_type = intern_string(object_type)
+        self.max_length = max_length
+        self.precision = precision
+        self.scale = scale
+        self.is_nullable = is_nullable
+        self.is_primary_key = is_primary_key
+
+
+class ViewColumn(ColumnRecord):
+    # Columns of the referenced tables in the v2 contract, in the order the contract lists their keys
+    __slots__ = ('column', 'isPrimaryKey', 'isNullable', 'logicalType', 'physicalType', 'tags', 'description')
+
+    def __init__(self, column, isPrimaryKey, isNullable, logicalType, physicalType, tags, description):
+        self.column = column
+        self.isPrimaryKey = isPrimaryKey
+        self.isNullable = isNullable
+        self.logicalType = intern_string(logicalType)
+        self.physicalType = intern_string(physicalType)
+        self.tags = tags
+        self.description = description
+
+
+def plain_value(value):
+    # json.dump default= hook: records are written as the dicts they stand in for
+    if isinstance(value, ColumnRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,383 @@
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from functools import lru_cache
+from itertools import repeat
+
+from contract_yaml import load_yaml
+from drivers import yaml
+
+# Contract layouts in a small JSON Schema subset: type (a name or a list of names), properties,
+# required, additionalProperties (False or a schema for every other key), items, minItems and enum.
+# 'date' is the type PyYAML loads unquoted dates and timestamps as.
+SCALAR = {'type': ['string', 'integer', 'number', 'boolean', 'date', 'null']}
+STRING_LIST = {'type': ['array', 'null'], 'items': {'type': 'string'}}
+
+
+def _object(properties, required=None, nullable=False):
+    # A mapping with exactly these keys; all of them are required unless listed otherwise
+    return {
+        'type': ['object', 'null'] if nullable else 'object',
+        'properties': properties,
+        'required': list(properties) if required is None else required,
+        'additionalProperties': False,
+    }
+
+
+def _list_of(item_schema, min_items=0):
+    return {'type': ['array', 'null'], 'items': item_schema, 'minItems': min_items}
+
+
+SLA_PROPERTY_SCHEMA = _object({'property': SCALAR, 'value': SCALAR, 'unit': SCALAR, 'column': SCALAR})
+
+# mssql_data_contract_gen_v2.contract_template() with the views streamed into dataset[0].views
+V2_COLUMN_SCHEMA = _object({
+    'column': {'type': 'string'},
+    'isPrimaryKey': {'type': 'boolean'},
+    'isNullable': {'type': 'boolean'},
+    'logicalType': {'type': 'string'},
+    'physicalType': {'type': 'string'},
+    'tags': STRING_LIST,
+    'description': SCALAR,
+}, required=['column', 'logicalType', 'physicalType'])
+
+V2_VIEW_SCHEMA = _object({
+    'tables_referenced': {
+        'type': 'object',
+        'additionalProperties': _object({
+            'description': SCALAR,
+            'columns': {'type': 'array', 'items': V2_COLUMN_SCHEMA},
+        }, required=['columns']),
+    },
+})
+
+V2_CONTRACT_SCHEMA = _object({
+    **{key: SCALAR for key in ('datasetDomain', 'quantumName', 'userConsumptionMode', 'version', 'status', 'uuid')},
+    'description': _object({'purpose': SCALAR, 'limitations': SCALAR, 'usage': SCALAR}, nullable=True),
+    **{key: SCALAR for key in ('tenant', 'productDl', 'productSlackChannel', 'productFeedbackUrl', 'sourcePlatform',
+                               'sourceSystem', 'datasetProject', 'datasetName', 'kind', 'apiVersion', 'type',
+                               'driver', 'driverVersion', 'server', 'database', 'username', 'password',
+                               'schedulerAppName')},
+    'dataset': {
+        'type': 'array',
+        'minItems': 1,
+        'items': _object({'views': {'type': ['object', 'null'], 'additionalProperties': V2_VIEW_SCHEMA}}),
+    },
+    'price': _object({'priceAmount': SCALAR, 'priceCurrency': SCALAR, 'priceUnit': SCALAR}, nullable=True),
+    'stakeholders': _list_of(_object({'username': SCALAR, 'role': SCALAR, 'dateIn': SCALAR, 'dateOut': SCALAR,
+                                      'replacedByUsername': SCALAR})),
+    'roles': _list_of(_object({'role': SCALAR, 'access': SCALAR, 'firstLevelApprovers': SCALAR,
+                               'secondLevelApprovers': SCALAR})),
+    'slaDefaultColumn': SCALAR,
+    'slaProperties': _list_of(SLA_PROPERTY_SCHEMA),
+    'tags': STRING_LIST,
+    'systemInstance': SCALAR,
+    'contractCreatedTs': SCALAR,
+})
+
+# mssql_data_contract_gen: source tables and views, destination tables and Airflow DAGs
+V1_COLUMNS_SCHEMA = {'type': 'array', 'items': {
+    'type': 'object',
+    'required': ['name', 'type'],
+    'properties': {'name': {'type': 'string'}, 'type': {'type': 'string'}},
+}}
+
+V1_CONTRACT_SCHEMA = _object({
+    'source': _object({
+        'tables': {'type': ['object', 'null'], 'additionalProperties': _object({'columns': V1_COLUMNS_SCHEMA})},
+        'views': {'type': ['object', 'null'], 'additionalProperties': _object({
+            'columns': V1_COLUMNS_SCHEMA,
+            'referenced_tables': {'type': 'array', 'items': {'type': 'string'}},
+        })},
+    }),
+    'destination': {'type': ['object', 'null'], 'additionalProperties': _object({'columns': V1_COLUMNS_SCHEMA})},
+    'airflow': _object({
+        'dags': {'type': ['object', 'null'], 'additionalProperties': _object({
+            'is_active': {'type': ['boolean', 'null']},
+            'schedule_interval': SCALAR,
+            'run_stats': {'type': ['object', 'null']},
+        }, required=['is_active', 'schedule_interval'])},
+        'slaProperties': _list_of(SLA_PROPERTY_SCHEMA),
+    }, required=['dags']),
+})
+
+CONTRACT_SCHEMAS = {
+    'v1': V1_CONTRACT_SCHEMA,
+    'v2': V2_CONTRACT_SCHEMA,
+}
+
+PYTHON_TYPES = {
+    'object': (dict,),
+    'array': (list,),
+    'string': (str,),
+    'integer': (int,),
+    'number': (int, float),
+    'boolean': (bool,),
+    'date': (datetime.date,),
+    'null': (type(None),),
+}
+
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def compile_schema(schema):
+    # Turn a schema into nested closures once, so validating a document does no schema lookups at all.
+    # Each check appends (path, message) to errors; paths are linked (parent, key) pairs that are only
+    # formatted when an error is reported.
+    checks = []
+
+    if 'type' in schema:
+        type_names = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        python_types = tuple(python_type for name in type_names for python_type in PYTHON_TYPES[name])
+        # bool is an int subclass; it only counts as a boolean
+        allows_bool = 'boolean' in type_names
+        expected = ' or '.join(type_names)
+
+        def check_type(value, path, errors):
+            if not isinstance(value, python_types) or ((value is True or value is False) and not allows_bool):
+                errors.append((path, f"expected {expected}, got {_type_name(value)}"))
+                return False
+            return True
+
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append((path, f"{value!r} is not one of {allowed}"))
+            return True
+
+        checks.append(check_enum)
+
+    if 'properties' in schema or 'required' in schema or 'additionalProperties' in schema:
+        property_checks = {key: compile_schema(property_schema)
+                           for key, property_schema in schema.get('properties', {}).items()}
+        required = tuple(schema.get('required', ()))
+        additional = schema.get('additionalProperties', True)
+        additional_check = compile_schema(additional) if isinstance(additional, dict) else None
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return True
+            for key in required:
+                if key not in value:
+                    errors.append(((path, key), "required property is missing"))
+            for key, item in value.items():
+                check = property_checks.get(key)
+                if check is None:
+                    check = additional_check
+                if check is not None:
+                    check(item, (path, key), errors)
+                elif additional is False:
+                    errors.append(((path, key), "property is not allowed"))
+            return True
+
+        checks.append(check_object)
+
+    if 'items' in schema or 'minItems' in schema:
+        item_check = compile_schema(schema['items']) if 'items' in schema else None
+        min_items = schema.get('minItems', 0)
+
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return True
+            if len(value) < min_items:
+                errors.append((path, f"expected at least {min_items} items, got {len(value)}"))
+            if item_check is not None:
+                for index, item in enumerate(value):
+                    item_check(item, (path, index), errors)
+            return True
+
+        checks.append(check_array)
+
+    def validate(value, path=None, errors=None):
+        errors = [] if errors is None else errors
+        for check in checks:
+            # A value of the wrong type is not checked any further
+            if not check(value, path, errors):
+                break
+        return errors
+
+    return validate
+
+
+def _type_name(value):
+    for name, python_types in PYTHON_TYPES.items():
+        if isinstance(value, python_types) and not (name in ('integer', 'number') and isinstance(value, bool)):
+            return name
+    return type(value).__name__
+
+
+def format_path(path):
+    # JSON path of a linked (parent, key) path, e.g. $.dataset[0].views.vSales['order id']
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(key)
+
+    text = '$'
+    for key in reversed(parts):
+        if isinstance(key, int):
+            text += f"[{key}]"
+        elif IDENTIFIER_PATTERN.match(str(key)):
+            text += f".{key}"
+        else:
+            text += f"[{json.dumps(str(key))}]"
+    return text
+
+
+@lru_cache(maxsize=None)
+def compiled_validator(schema_name):
+    # Compiled once per process, so every worker pays for it a single time
+    return compile_schema(CONTRACT_SCHEMAS[schema_name])
+
+
+def schema_fingerprint(schema_name):
+    # Recorded with the validation state so a changed schema revalidates every file
+    return hashlib.sha256(json.dumps(CONTRACT_SCHEMAS[schema_name], sort_keys=True).encode()).hexdigest()
+
+
+def file_digest(path):
+    with open(path, 'rb') as contract_file:
+        return hashlib.sha256(contract_file.read()).hexdigest()
+
+
+def validate_file(path, schema_name):
+    # Returns (path, content hash, [(JSON path, message)]); the hash is of the content that was validated
+    with open(path, 'rb') as contract_file:
+        content = contract_file.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    try:
+        document = load_yaml(content)
+    except yaml.YAMLError as e:
+        return path, digest, [('$', f"invalid YAML: {e}")]
+
+    errors = compiled_validator(schema_name)(document)
+    return path, digest, [(format_path(error_path), message) for error_path, message in errors]
+
+
+def find_contract_files(patterns):
+    # Glob patterns (** recurses) and plain file paths, each file once, in name order
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(paths)
+
+
+def load_validation_state(state_path, schema_name):
+    # Content hashes of the files that passed the last validation against the same schema
+    if not state_path or not os.path.exists(state_path):
+        return {}
+
+    with open(state_path) as state_file:
+        state = json.load(state_file)
+    if state.get('schema') != schema_fingerprint(schema_name):
+        return {}
+    return state.get('files', {})
+
+
+def save_validation_state(state_path, schema_name, passed):
+    with open(state_path, 'w') as state_file:
+        json.dump({'schema': schema_fingerprint(schema_name), 'files': passed}, state_file, indent=2, sort_keys=True)
+
+
+def validate_files(paths, schema_name, max_workers=None, previous=None):
+    # Validates the files whose content hash differs from the previous successful run, across processes.
+    # Returns ({path: hash} of every passing file, {path: errors} of every failing one, skipped count).
+    previous = previous or {}
+    passed = {}
+    failed = {}
+    pending = []
+    for path in paths:
+        if path in previous and previous[path] == file_digest(path):
+            passed[path] = previous[path]
+        else:
+            pending.append(path)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(pending) <= 1:
+        results = map(validate_file, pending, repeat(schema_name))
+        for path, digest, errors in results:
+            _record(passed, failed, path, digest, errors)
+    else:
+        # Imported here so the command starts without loading multiprocessing. Files are handed out in
+        # chunks to keep the inter-process traffic per file small.
+        from concurrent.futures import ProcessPoolExecutor
+        chunk_size = max(1, len(pending) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for path, digest, errors in pool.map(validate_file, pending, repeat(schema_name), chunksize=chunk_size):
+                _record(passed, failed, path, digest, errors)
+
+    return passed, failed, len(paths) - len(pending)
+
+
+def _record(passed, failed, path, digest, errors):
+    if errors:
+        failed[path] = errors
+    else:
+        passed[path] = digest
+
+
+# Run configuration for the validate command. A config file passed to the command line overrides any of
+# these keys
+DEFAULT_CONFIG = {
+    # Contract files to validate: paths or glob patterns, ** recurses into subdirectories. The default matches
+    # the contracts generate-v2 writes (one per database when fanning out), not its views-only metadata file.
+    'contract_paths': ['output/mssql_gen_data_contract_v2*.yaml'],
+    # Layout the files must match: 'v2' (generate-v2 contracts) or 'v1' (generate contracts)
+    'schema': 'v2',
+
+    # Worker processes; None uses one per core
+    'max_workers': None,
+
+    # Content hashes of the files that passed are kept here, and unchanged files are skipped on the next
+    # run. None validates every file every time.
+    'validation_state_path': None,
+
+    # The errors of every failing file are written here as JSON
+    'validation_report_path': None,
+}
+
+
+def run(config=None):
+    # Returns 1 when any file fails validation, so CI can gate on the exit status
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    schema_name = config['schema']
+    if schema_name not in CONTRACT_SCHEMAS:
+        print(f"Unknown contract schema {schema_name}; expected one of {', '.join(CONTRACT_SCHEMAS)}")
+        return 2
+
+    paths = find_contract_files(config['contract_paths'])
+    previous = load_validation_state(config['validation_state_path'], schema_name)
+    passed, failed, skipped = validate_files(paths, schema_name, max_workers=config['max_workers'],
+                                             previous=previous)
+
+    for path, errors in sorted(failed.items()):
+        for error_path, message in errors:
+            print(f"{os.path.relpath(path)}: {error_path}: {message}")
+
+    print(f"Validated {len(paths) - skipped} of {len(paths)} contract files ({skipped} unchanged): "
+          f"{len(failed)} failed")
+
+    if config['validation_state_path']:
+        save_validation_state(config['validation_state_path'], schema_name, passed)
+    if config['validation_report_path']:
+        with open(config['validation_report_path'], 'w') as report_file:
+            json.dump({os.path.relpath(path): [{'path': error_path, 'message': message}
+                                               for error_path, message in errors]
+                       for path, errors in sorted(failed.items())}, report_file, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    from data_contract_cli import main
+    sys.exit(main(['validate'] + sys.argv[1:]))
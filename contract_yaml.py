@@ -0,0 +1,220 @@
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from column_records import ColumnRecord
+from drivers import yaml
+from run_metrics import get_metrics, timed_phase
+
+
+# Define a custom representer to avoid !!python/object/apply tag
+def ordered_dict_representer(dumper, data):
+    return dumper.represent_dict(data.items())
+
+
+def column_record_representer(dumper, data):
+    # Column records are turned into plain dicts only here, as they are emitted
+    return dumper.represent_dict(data.to_dict())
+
+
+@lru_cache(maxsize=None)
+def yaml_dumper():
+    # libyaml's C emitter when PyYAML was built with it; it produces the same output as the pure-Python
+    # dumper, only faster. Resolved on first use so importing this module does not load PyYAML.
+    dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+    yaml.add_representer(OrderedDict, ordered_dict_representer, Dumper=dumper)
+    yaml.add_multi_representer(ColumnRecord, column_record_representer, Dumper=dumper)
+    return dumper
+
+
+@lru_cache(maxsize=None)
+def yaml_loader():
+    # libyaml's C loader when available
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+# Characters that are unsafe in shard file names
+UNSAFE_FILE_CHARACTERS = re.compile(r'[^\w.-]+')
+
+
+def unique_file_name(name, extension):
+    # The sanitized name keeps the file recognisable; a short hash of the original name tells apart names
+    # that sanitize to the same text (a b, a_b) or differ only in case on a case-insensitive filesystem
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return f"{UNSAFE_FILE_CHARACTERS.sub('_', name)}.{digest}.{extension}"
+
+
+def dump_yaml(data, stream=None, sort_keys=True, width=80):
+    return yaml.dump(data, stream, Dumper=yaml_dumper(), default_flow_style=False, sort_keys=sort_keys, width=width)
+
+
+def load_yaml(stream):
+    return yaml.load(stream, Loader=yaml_loader())
+
+
+class StreamingContractWriter:
+    # Writes a contract one entry at a time instead of dumping a fully built dict. Every entry is
+    # addressed by the path of the mapping it belongs to, e.g. ('source', 'tables') or
+    # ('dataset', 0, 'views') for the mapping inside the first list item, and is rendered exactly as
+    # yaml.dump would render it in place. Callers emit entries in the order the full dump would
+    # use: sorted keys for plain dicts, insertion order for OrderedDicts.
+    def __init__(self, stream, sort_keys=True):
+        self.stream = stream
+        self.sort_keys = sort_keys
+        self._path = ()
+        self._indent = 0
+        self._pending_header = None
+
+    @timed_phase('emit')
+    def write(self, path, key, value):
+        self.open_mapping(path)
+        if self._pending_header is not None:
+            self.stream.write(self._pending_header + '\n')
+            self._pending_header = None
+
+        # Long scalars wrap at the same column as in a full dump
+        text = dump_yaml({key: value}, sort_keys=self.sort_keys, width=max(80 - self._indent, 20))
+        if self._indent:
+            prefix = ' ' * self._indent
+            text = ''.join(prefix + line for line in text.splitlines(True))
+        self.stream.write(text)
+
+    def close(self):
+        self._close_pending()
+        self._path = ()
+        self._indent = 0
+
+    def open_mapping(self, path):
+        # Start the mapping at path; it is written as {} if no entry follows
+        path = tuple(path)
+        if path == self._path:
+            return
+        self._close_pending()
+
+        # Headers of the mappings shared with the previous entry are already written
+        current_units = _header_units(self._path)
+        units = _header_units(path)
+        common = 0
+        while common < min(len(current_units), len(units)) and current_units[common] == units[common]:
+            common += 1
+
+        indent = _units_indent(units[:common])
+        headers = []
+        for index, key in units[common:]:
+            if index is None:
+                headers.append(f"{' ' * indent}{_key_text(key)}:")
+                indent += 2
+            else:
+                # Block sequences are not indented below their parent key
+                headers.append(f"{' ' * max(indent - 2, 0)}- {_key_text(key)}:")
+                indent += 2
+
+        # Parents have a child so they can be written now; the innermost header waits for its first
+        # entry so an empty mapping can still be rendered as {}
+        for header in headers[:-1]:
+            self.stream.write(header + '\n')
+        self._pending_header = headers[-1] if headers else None
+        self._path = path
+        self._indent = indent
+
+    def _close_pending(self):
+        if self._pending_header is not None:
+            self.stream.write(self._pending_header + ' {}\n')
+            self._pending_header = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ShardedContractWriter:
+    # Writes every entry below the top level to its own file and keeps only file names in memory. The
+    # index file holds the top-level entries and, per mapping path, the file of each entry. With
+    # shard_top_level the top-level entries are objects too and get their own files.
+    def __init__(self, directory, index_name='index.yaml', sort_keys=True, shard_top_level=False):
+        self.directory = directory
+        self.index_name = index_name
+        self.sort_keys = sort_keys
+        self.shard_top_level = shard_top_level
+        self.index = OrderedDict()
+        # Case-folded paths of the files written so far
+        self._files = set()
+        os.makedirs(directory, exist_ok=True)
+
+    @timed_phase('emit')
+    def write(self, path, key, value):
+        if not path and not self.shard_top_level:
+            self.index[key] = value
+            return
+
+        parts = [str(part) for part in path]
+        shard_directory = os.path.join(self.directory, *parts)
+        os.makedirs(shard_directory, exist_ok=True)
+        file_name = unique_file_name(str(key), 'yaml')
+        file_path = '/'.join(parts + [file_name])
+        if file_path.lower() in self._files:
+            raise ValueError(f"Shard file {file_path} for {key!r} was already written by another entry")
+        self._files.add(file_path.lower())
+
+        with open(os.path.join(shard_directory, file_name), 'w') as shard_file:
+            dump_yaml({key: value}, shard_file, sort_keys=self.sort_keys)
+            get_metrics().count('bytes_written', shard_file.tell())
+
+        files = self.open_mapping(path)
+        files[key] = file_path
+
+    def open_mapping(self, path):
+        # Empty mappings still get an (empty) entry in the index
+        return self.index.setdefault('shards', OrderedDict()).setdefault(
+            '/'.join(str(part) for part in path), OrderedDict())
+
+    @timed_phase('emit')
+    def close(self):
+        with open(os.path.join(self.directory, self.index_name), 'w') as index_file:
+            dump_yaml(self.index, index_file, sort_keys=self.sort_keys)
+            get_metrics().count('bytes_written', index_file.tell())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def open_contract_writer(path, shard=False, sort_keys=True, shard_top_level=False):
+    # A single YAML file, or a directory with one file per object plus an index when sharding
+    if shard:
+        with ShardedContractWriter(path, sort_keys=sort_keys, shard_top_level=shard_top_level) as writer:
+            yield writer
+    else:
+        with open(path, 'w') as stream, StreamingContractWriter(stream, sort_keys=sort_keys) as writer:
+            yield writer
+        get_metrics().count('bytes_written', os.path.getsize(path))
+
+
+def _header_units(path):
+    # Group a path into header lines: a key on its own, or a list index together with the key it opens
+    units = []
+    index = None
+    for part in path:
+        if isinstance(part, int):
+            index = part
+        else:
+            units.append((index, part))
+            index = None
+    return units
+
+
+def _units_indent(units):
+    return 2 * len(units)
+
+
+def _key_text(key):
+    # Quote keys the same way the dumper would
+    return dump_yaml([key])[2:].rstrip('\n')
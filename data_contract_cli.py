@@ -0,0 +1,71 @@
+import argparse
+import importlib
+import json
+import sys
+
+from drivers import yaml
+
+# Generator modules are imported only for the command that runs, so each command loads just the
+# drivers its backends need
+GENERATORS = {
+    'generate': ('mssql_data_contract_gen',
+                 "Generate a contract from MSSQL source, Postgres destination and Airflow metadata"),
+    'generate-v2': ('mssql_data_contract_gen_v2', "Generate a view contract from SQL Server catalog metadata"),
+    'catalog': ('metadata_catalog', "Render stored contracts and answer lineage and impact questions from the "
+                                    "local metadata catalog"),
+    'drift': ('schema_drift', "Report columns added, removed or retyped between the MSSQL source and Postgres "
+                              "destination"),
+    'validate': ('contract_validation', "Check generated or hand-edited contract files against the contract "
+                                        "layout"),
+}
+
+
+def load_config(config_path):
+    # JSON or YAML, keyed like the generator's DEFAULT_CONFIG
+    if config_path is None:
+        return {}
+
+    with open(config_path) as config_file:
+        if config_path.endswith('.json'):
+            config = json.load(config_file)
+        else:
+            from contract_yaml import load_yaml
+            config = load_yaml(config_file)
+
+    if config is None:
+        return {}
+    if not isinstance(config, dict):
+        raise ValueError(f"Config file {config_path} must contain a mapping")
+    return config
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='data-contract-gen', description="Data contract generation")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    for command, (_, description) in GENERATORS.items():
+        command_parser = commands.add_parser(command, help=description, description=description)
+        command_parser.add_argument('config', nargs='?',
+                                    help="YAML or JSON config file; omitted keys keep the generator's defaults")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error loading config: {e}", file=sys.stderr)
+        return 2
+
+    module_name, _ = GENERATORS[args.command]
+    generator = importlib.import_module(module_name)
+    # Commands that check something return a non-zero status when the check fails
+    return generator.run(config) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from contract_yaml import unique_file_name
+from run_metrics import get_metrics
+
+# Definitions of the SQL modules of a schema (views, procedures, functions) in one streamed query.
+# sys.sql_modules holds the full nvarchar(max) text; the server cuts every definition into chunks of
+# @ChunkBytes bytes of its UTF-16 encoding, cast to varbinary(8000) because SUBSTRING of a max type is still
+# typed max, so no fetched value grows with the largest module. A chunk can end inside a surrogate pair, so
+# the chunks are joined before the text is decoded. The rows arrive ordered by object and chunk so a
+# definition is complete as soon as the next object starts.
+MODULE_DEFINITIONS_QUERY = """
+    SET NOCOUNT ON;
+    DECLARE @ChunkBytes int = ?;
+    WITH modules AS (
+        SELECT
+            s.name AS SchemaName,
+            o.name AS ObjectName,
+            o.type AS ModuleType,
+            CAST(m.definition AS VARBINARY(MAX)) AS Definition,
+            DATALENGTH(m.definition) AS DefinitionBytes
+        FROM sys.sql_modules AS m
+        JOIN sys.objects AS o ON o.object_id = m.object_id
+        JOIN sys.schemas AS s ON s.schema_id = o.schema_id
+        WHERE s.name = ?
+          AND o.type IN ({module_types})
+        {object_filter}
+    ),
+    chunks AS (
+        SELECT 0 AS ChunkNumber, MAX(DefinitionBytes) AS MaxBytes FROM modules
+        UNION ALL
+        SELECT ChunkNumber + 1, MaxBytes FROM chunks WHERE (ChunkNumber + 1) * @ChunkBytes < MaxBytes
+    )
+    SELECT
+        m.SchemaName,
+        m.ObjectName,
+        m.ModuleType,
+        c.ChunkNumber,
+        CAST(SUBSTRING(m.Definition, c.ChunkNumber * @ChunkBytes + 1, @ChunkBytes) AS VARBINARY(8000))
+            AS DefinitionChunk
+    FROM modules AS m
+    JOIN chunks AS c ON c.ChunkNumber * @ChunkBytes < m.DefinitionBytes
+    ORDER BY m.SchemaName, m.ObjectName, c.ChunkNumber
+    OPTION (MAXRECURSION 0)
+"""
+
+MODULE_OBJECT_FILTER = "AND o.name IN (SELECT value FROM OPENJSON(?))"
+
+VIEW_MODULE_TYPES = ('V',)
+# Stored procedures and scalar, inline and table-valued functions
+ROUTINE_MODULE_TYPES = ('P', 'FN', 'IF', 'TF')
+
+# 4000 UTF-16 code units fill the 8000 bytes a varbinary chunk can hold
+DEFINITION_CHUNK_SIZE = 4000
+
+
+def iter_module_definitions(cursor, schema, object_names=None, module_types=VIEW_MODULE_TYPES,
+                            chunk_size=DEFINITION_CHUNK_SIZE, batch_size=500):
+    # Yields (schema, name, module type, definition) in name order, holding only the chunks of the
+    # definition being assembled. chunk_size counts UTF-16 code units.
+    if not 0 < chunk_size <= DEFINITION_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {DEFINITION_CHUNK_SIZE} characters")
+
+    # Module types are a short fixed list and are written into the query, so exporting every routine of a
+    # schema works without OPENJSON; only a list of object names needs it (SQL Server 2016, level 130)
+    types = ', '.join("'" + module_type.replace("'", "''") + "'" for module_type in module_types)
+    if object_names is None:
+        cursor.execute(MODULE_DEFINITIONS_QUERY.format(module_types=types, object_filter=''), 2 * chunk_size,
+                       schema)
+    else:
+        cursor.execute(MODULE_DEFINITIONS_QUERY.format(module_types=types, object_filter=MODULE_OBJECT_FILTER),
+                       2 * chunk_size, schema, json.dumps(list(object_names)))
+
+    current = None
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for schema_name, object_name, module_type, _, chunk in rows:
+            key = (schema_name, object_name, module_type.strip())
+            if key != current:
+                if current is not None:
+                    yield current + (b''.join(chunks).decode('utf-16-le'),)
+                current = key
+                chunks = []
+            chunks.append(chunk or b'')
+
+    if current is not None:
+        yield current + (b''.join(chunks).decode('utf-16-le'),)
+
+
+def export_definitions(definitions, writer=None):
+    # Passes the definitions through, writing each one to the export on the way
+    for definition in definitions:
+        if writer is not None:
+            writer.write(*definition)
+        yield definition
+
+
+class DefinitionFileWriter:
+    # Every definition in one script, each preceded by GO, written through a single large buffer instead of
+    # reopening the file per object. Safe to share between extraction threads. Runs append to the script, as
+    # they always have; overwrite=True starts it afresh.
+    def __init__(self, path, buffer_size=1 << 20, overwrite=False):
+        self.path = path
+        self._file = open(path, 'w' if overwrite else 'a', buffering=buffer_size)
+        # Size of the script before this run, so only this run's bytes are counted
+        self._start = self._file.tell()
+        self._lock = threading.Lock()
+
+    def write(self, schema, name, module_type, definition):
+        with self._lock:
+            self._file.write('GO' + definition)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        get_metrics().count('bytes_written', os.path.getsize(self.path) - self._start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DefinitionDirectoryWriter:
+    # One .sql file per object and a manifest.json listing each object's file, type, length and hash,
+    # so changed definitions can be found without reading the files
+    def __init__(self, directory, manifest_name='manifest.json'):
+        self.directory = directory
+        self.manifest_name = manifest_name
+        self.manifest = []
+        # Case-folded names of the files written so far
+        self._files = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, schema, name, module_type, definition):
+        file_name = unique_file_name(f'{schema}.{name}', 'sql')
+        with self._lock:
+            if file_name.lower() in self._files:
+                raise ValueError(f"Definition file {file_name} for {schema}.{name} was already written")
+            self._files.add(file_name.lower())
+
+        with open(os.path.join(self.directory, file_name), 'w') as definition_file:
+            definition_file.write(definition)
+            get_metrics().count('bytes_written', definition_file.tell())
+
+        with self._lock:
+            self.manifest.append({
+                'schema': schema,
+                'name': name,
+                'type': module_type,
+                'file': file_name,
+                'characters': len(definition),
+                'sha256': hashlib.sha256(definition.encode('utf-8')).hexdigest(),
+            })
+
+    def close(self):
+        self.manifest.sort(key=lambda entry: (entry['schema'], entry['name']))
+        with open(os.path.join(self.directory, self.manifest_name), 'w') as manifest_file:
+            json.dump({'objects': self.manifest}, manifest_file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def open_definition_writer(path, per_object=False, overwrite=False):
+    # A single script, a directory with one file per object plus a manifest, or nothing when path is None.
+    # The script is appended to unless overwrite is set.
+    if path is None:
+        yield None
+    elif per_object:
+        with DefinitionDirectoryWriter(path) as writer:
+            yield writer
+    else:
+        with DefinitionFileWriter(path, overwrite=overwrite) as writer:
+            yield writer
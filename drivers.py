@@ -0,0 +1,41 @@
+import importlib
+
+
+class LazyModule:
+    # Stands in for a driver module and imports it on first attribute access, so importing the
+    # generators stays cheap and a run only loads the backends it actually talks to
+    def __init__(self, name, purpose):
+        self._name = name
+        self._purpose = purpose
+
+    def _load_module(self):
+        # import_module rather than a sys.modules lookup: it waits while another thread is still
+        # initialising the module instead of handing out a half-imported one
+        try:
+            return importlib.import_module(self._name)
+        except ImportError as e:
+            raise ImportError(f"{self._name} is required for {self._purpose}; install it with "
+                              f"'pip install {self._name}'") from e
+
+    def __getattr__(self, attribute):
+        return getattr(self._load_module(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+pyodbc = LazyModule('pyodbc', 'SQL Server connections')
+psycopg2 = LazyModule('psycopg2', 'Postgres connections')
+yaml = LazyModule('yaml', 'reading and writing contracts')
+
+# OPENJSON, which the SQL Server catalog queries use to pass a list of names as a single parameter, needs
+# SQL Server 2016 or later and a database at compatibility level 130 or higher
+OPENJSON_COMPATIBILITY_LEVEL = 130
+COMPATIBILITY_LEVEL_QUERY = "SELECT compatibility_level FROM sys.databases WHERE database_id = DB_ID()"
+
+
+def supports_openjson(cursor):
+    # Older servers have no compatibility level that high, so the level alone answers for both
+    cursor.execute(COMPATIBILITY_LEVEL_QUERY)
+    row = cursor.fetchone()
+    return row is not None and row[0] >= OPENJSON_COMPATIBILITY_LEVEL
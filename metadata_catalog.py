@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime, timezone
+
+from column_records import plain_value
+from contract_yaml import open_contract_writer
+from run_metrics import start_run, timed_phase
+
+# Local store between extraction and YAML. Every contract is kept as the sequence of writer calls that
+# produced it, so it renders back to exactly the same YAML, and its objects, columns and dependency edges are
+# indexed for lineage and impact questions across all stored contracts. Names compare case-insensitively,
+# like SQL Server's default collation.
+CATALOG_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contracts (
+        contract_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        path TEXT,
+        server TEXT COLLATE NOCASE,
+        database TEXT COLLATE NOCASE,
+        schema TEXT COLLATE NOCASE,
+        updated_at TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS entries (
+        contract_id INTEGER NOT NULL REFERENCES contracts (contract_id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        key TEXT,
+        value TEXT,
+        PRIMARY KEY (contract_id, position)
+    );
+
+    CREATE TABLE IF NOT EXISTS objects (
+        object_id INTEGER PRIMARY KEY,
+        contract_id INTEGER NOT NULL REFERENCES contracts (contract_id) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        server TEXT COLLATE NOCASE,
+        database TEXT COLLATE NOCASE,
+        schema TEXT COLLATE NOCASE,
+        name TEXT NOT NULL COLLATE NOCASE
+    );
+    CREATE INDEX IF NOT EXISTS objects_by_name ON objects (name, schema, database, server);
+    CREATE INDEX IF NOT EXISTS objects_by_contract ON objects (contract_id);
+
+    CREATE TABLE IF NOT EXISTS columns (
+        object_id INTEGER NOT NULL REFERENCES objects (object_id) ON DELETE CASCADE,
+        name TEXT NOT NULL COLLATE NOCASE,
+        data_type TEXT
+    );
+    CREATE INDEX IF NOT EXISTS columns_by_name ON columns (name, object_id);
+    CREATE INDEX IF NOT EXISTS columns_by_object ON columns (object_id);
+
+    -- A NULL referenced_column is a table-level edge: the view reads the table but its columns are unknown
+    CREATE TABLE IF NOT EXISTS dependencies (
+        object_id INTEGER NOT NULL REFERENCES objects (object_id) ON DELETE CASCADE,
+        referenced_schema TEXT COLLATE NOCASE,
+        referenced_name TEXT NOT NULL COLLATE NOCASE,
+        referenced_column TEXT COLLATE NOCASE
+    );
+    CREATE INDEX IF NOT EXISTS dependencies_by_reference
+        ON dependencies (referenced_name, referenced_column, referenced_schema);
+    CREATE INDEX IF NOT EXISTS dependencies_by_object ON dependencies (object_id);
+"""
+
+# Mappings whose entries are catalog objects: v1 source tables and views and destination tables, and the
+# views of a v2 contract
+SOURCE_TABLES_PATH = ('source', 'tables')
+SOURCE_VIEWS_PATH = ('source', 'views')
+DESTINATION_PATH = ('destination',)
+DATASET_VIEWS_PATH = ('dataset', 0, 'views')
+OBJECT_PATHS = (SOURCE_TABLES_PATH, SOURCE_VIEWS_PATH, DESTINATION_PATH, DATASET_VIEWS_PATH)
+
+# Schema-less filters match objects stored without a schema too (v2 views know only their referenced schema)
+VIEWS_DEPENDING_ON_QUERY = """
+    SELECT c.name, v.server, v.database, v.schema, v.name, d.referenced_schema, d.referenced_name,
+           d.referenced_column
+    FROM dependencies AS d
+    JOIN objects AS v ON v.object_id = d.object_id
+    JOIN contracts AS c ON c.contract_id = v.contract_id
+    WHERE d.referenced_name = ?
+      AND (? IS NULL OR d.referenced_schema IS NULL OR d.referenced_schema = ?)
+      AND (? IS NULL OR d.referenced_column IS NULL OR d.referenced_column = ?)
+    ORDER BY c.name, v.schema, v.name, d.referenced_column
+"""
+
+CONTRACTS_INCLUDING_QUERY = """
+    SELECT c.name
+    FROM objects AS o
+    JOIN contracts AS c ON c.contract_id = o.contract_id
+    WHERE o.name = ?
+      AND (? IS NULL OR o.schema IS NULL OR o.schema = ?)
+    UNION
+    SELECT c.name
+    FROM dependencies AS d
+    JOIN objects AS v ON v.object_id = d.object_id
+    JOIN contracts AS c ON c.contract_id = v.contract_id
+    WHERE d.referenced_name = ?
+      AND (? IS NULL OR d.referenced_schema IS NULL OR d.referenced_schema = ?)
+    ORDER BY 1
+"""
+
+
+def open_catalog(catalog_path):
+    # Autocommit mode: the contract writer opens and ends its own transactions, so no implicit transaction can
+    # already be open when it begins one
+    connection = sqlite3.connect(catalog_path, isolation_level=None)
+    # WAL lets impact queries read while a generator run is writing
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.executescript(CATALOG_SCHEMA)
+    return connection
+
+
+def split_qualified_name(name, default_schema=None):
+    # 'schema.table' names; a bare name belongs to default_schema. A table of another database,
+    # 'database.schema.table', splits into ('database.schema', 'table'): a schema no local object has, so
+    # impact queries for a local schema never match it.
+    if '.' in name:
+        schema, name = name.rsplit('.', 1)
+        return schema, name
+    return default_schema, name
+
+
+def is_cross_database_name(name):
+    # database.schema.table or server.database.schema.table
+    return name.count('.') > 1
+
+
+class CatalogContractWriter:
+    # Drop-in for the YAML contract writers: the same open_mapping/write calls store one contract in the
+    # catalog, replacing any earlier contract of that name when the writer closes. Nothing is committed if
+    # the run fails. A contract rendered to path may only replace one rendered to the same path, so two
+    # outputs with the same base name never overwrite each other.
+    def __init__(self, catalog, name, server=None, database=None, schema=None, path=None):
+        self.catalog = catalog
+        self.name = name
+        self.path = contract_path(path) if path is not None else None
+        self.server = server
+        self.database = database
+        self.schema = schema
+        self._position = 0
+        self._tables = {}
+
+        # The write lock is taken up front, so the stored path cannot change between the check and the replace
+        self.catalog.execute('BEGIN IMMEDIATE')
+        stored = self.catalog.execute('SELECT path FROM contracts WHERE name = ?', (name,)).fetchone()
+        if stored is not None and None not in (stored[0], self.path) and stored[0] != self.path:
+            self.catalog.execute('ROLLBACK')
+            raise ValueError(f"Contract {name} is already stored for {stored[0]}; rename {self.path} or use "
+                             f"another catalog_path")
+
+        self.catalog.execute('DELETE FROM contracts WHERE name = ?', (name,))
+        self.contract_id = self.catalog.execute(
+            'INSERT INTO contracts (name, path, server, database, schema, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (name, self.path, server, database, schema, datetime.now(timezone.utc).isoformat())).lastrowid
+
+    def open_mapping(self, path):
+        self._record(path, None, None)
+
+    @timed_phase('emit')
+    def write(self, path, key, value):
+        path = tuple(path)
+        self._record(path, key, json.dumps(value, default=plain_value))
+
+        if path == SOURCE_TABLES_PATH:
+            self._add_object('table', self.schema, key, value.get('columns'), 'name', 'type')
+        elif path == DESTINATION_PATH:
+            self._add_object('destination_table', None, key, value.get('columns'), 'name', 'type')
+        elif path == SOURCE_VIEWS_PATH:
+            # v1 views read their referenced tables in joins and filters too, so every table keeps a
+            # table-level edge; output columns traced to a base column add a column-level edge
+            columns = value.get('columns') or []
+            object_id = self._add_object('view', self.schema, key, columns, 'name', 'type')
+            edges = [split_qualified_name(table, self.schema) + (None,)
+                     for table in value.get('referenced_tables') or []]
+            edges.extend(split_qualified_name(column['table'], self.schema) + (column['column'],)
+                         for column in columns if column.get('table') and column.get('column'))
+            self._add_dependencies(object_id, list(dict.fromkeys(edges)))
+        elif path == DATASET_VIEWS_PATH:
+            self._add_dataset_view(key, value)
+
+    def _add_dataset_view(self, key, value):
+        # v2 views list every column of each referenced table, each of which becomes a column-level edge;
+        # the tables themselves are indexed once per contract
+        view_schema, view_name = split_qualified_name(key, self.schema)
+        object_id = self._add_object('view', view_schema, view_name)
+
+        edges = []
+        for table_key, table in (value.get('tables_referenced') or {}).items():
+            table_schema, table_name = split_qualified_name(table_key, view_schema)
+            columns = table.get('columns') or []
+            if (table_schema, table_name) not in self._tables:
+                self._tables[(table_schema, table_name)] = self._add_object('table', table_schema, table_name, columns,
+                                                                            'column', 'logicalType')
+            edges += [(table_schema, table_name, column['column']) for column in columns]
+        self._add_dependencies(object_id, edges)
+
+    def _record(self, path, key, value):
+        self.catalog.execute('INSERT INTO entries (contract_id, position, path, key, value) VALUES (?, ?, ?, ?, ?)',
+                             (self.contract_id, self._position, json.dumps(list(path)), key, value))
+        self._position += 1
+
+    def _add_object(self, kind, schema, name, columns=None, name_field=None, type_field=None):
+        object_id = self.catalog.execute(
+            'INSERT INTO objects (contract_id, kind, server, database, schema, name) VALUES (?, ?, ?, ?, ?, ?)',
+            (self.contract_id, kind, self.server, self.database, schema, name)).lastrowid
+        if columns:
+            self.catalog.executemany('INSERT INTO columns (object_id, name, data_type) VALUES (?, ?, ?)',
+                                     [(object_id, column[name_field], column.get(type_field)) for column in columns])
+        return object_id
+
+    def _add_dependencies(self, object_id, edges):
+        self.catalog.executemany('INSERT INTO dependencies (object_id, referenced_schema, referenced_name, '
+                                 'referenced_column) VALUES (?, ?, ?, ?)',
+                                 [(object_id,) + edge for edge in edges])
+
+    def close(self):
+        self.catalog.execute('COMMIT')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.catalog.execute('ROLLBACK')
+
+
+def write_contract_sections(writer, data_contract, path=()):
+    # Emit a fully built contract through a writer in save_yaml's sorted key order, one call per object in
+    # the object mappings and one per remaining top-level section
+    for key in sorted(data_contract):
+        value = data_contract[key]
+        child_path = path + (key,)
+        if child_path in OBJECT_PATHS and isinstance(value, dict):
+            writer.open_mapping(child_path)
+            for object_name in sorted(value):
+                writer.write(child_path, object_name, value[object_name])
+        elif value and isinstance(value, dict) \
+                and any(object_path[:len(child_path)] == child_path for object_path in OBJECT_PATHS):
+            write_contract_sections(writer, value, child_path)
+        else:
+            writer.write(path, key, value)
+
+
+def store_contract(catalog, name, data_contract, server=None, database=None, schema=None, path=None):
+    with CatalogContractWriter(catalog, name, server=server, database=database, schema=schema,
+                               path=path) as writer:
+        write_contract_sections(writer, data_contract)
+
+
+def render_contract(catalog, name, output_path, shard=False, views_only=False):
+    # Replay a stored contract into a YAML file (or shard directory) without touching any source database.
+    # views_only renders just the dataset views as a top-level mapping, like the v2 metadata output.
+    row = catalog.execute('SELECT contract_id FROM contracts WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        raise KeyError(f"Contract {name} is not in the catalog")
+
+    entries = catalog.execute('SELECT path, key, value FROM entries WHERE contract_id = ? ORDER BY position',
+                              (row[0],))
+    with open_contract_writer(output_path, shard=shard, shard_top_level=views_only) as writer:
+        for path, key, value in entries:
+            path = tuple(json.loads(path))
+            if views_only:
+                if path[:len(DATASET_VIEWS_PATH)] != DATASET_VIEWS_PATH:
+                    continue
+                path = path[len(DATASET_VIEWS_PATH):]
+
+            if key is None:
+                writer.open_mapping(path)
+            else:
+                writer.write(path, key, json.loads(value))
+
+
+def views_depending_on(catalog, table, column=None, schema=None):
+    # Reverse lineage: the views of every stored contract that read the table, or the column of it.
+    # Table-level edges (referenced_column None) match any column of their table.
+    return [
+        {'contract': contract, 'server': server, 'database': database, 'schema': view_schema, 'view': view,
+         'referenced_schema': referenced_schema, 'referenced_table': referenced_table,
+         'referenced_column': referenced_column}
+        for contract, server, database, view_schema, view, referenced_schema, referenced_table, referenced_column
+        in catalog.execute(VIEWS_DEPENDING_ON_QUERY, (table, schema, schema, column, column))
+    ]
+
+
+def contracts_including(catalog, table, schema=None):
+    # Impact: every stored contract that contains the table or a view reading from it
+    parameters = (table, schema, schema, table, schema, schema)
+    return [name for name, in catalog.execute(CONTRACTS_INCLUDING_QUERY, parameters)]
+
+
+def contract_name(output_path):
+    # Contracts are stored under the base name of the file they are rendered to
+    base_name = os.path.basename(os.path.normpath(output_path))
+    return os.path.splitext(base_name)[0]
+
+
+def contract_path(output_path):
+    # The rendered file a stored contract belongs to, however the path was spelled
+    return os.path.normcase(os.path.abspath(output_path))
+
+
+# Run configuration for the catalog command. A config file passed to the command line overrides any of
+# these keys
+DEFAULT_CONFIG = {
+    'catalog_path': 'contract_catalog.sqlite',
+
+    # Contracts to render from the catalog into output_directory, without any source database access
+    'render_contracts': [],
+    'output_directory': 'output',
+    'shard_output': False,
+
+    # Impact question: the contracts including this table, and the views reading it (or only impact_column)
+    'impact_table': None,
+    'impact_schema': None,
+    'impact_column': None,
+}
+
+
+def run(config=None):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    metrics = start_run()
+
+    with closing(open_catalog(config['catalog_path'])) as catalog:
+        for name in config['render_contracts']:
+            suffix = '' if config['shard_output'] else '.yaml'
+            output_path = os.path.join(config['output_directory'], name + suffix)
+            render_contract(catalog, name, output_path, shard=config['shard_output'])
+            print(f"Contract {name} rendered to {output_path}")
+
+        if config['impact_table']:
+            table, schema, column = config['impact_table'], config['impact_schema'], config['impact_column']
+            contracts = contracts_including(catalog, table, schema=schema)
+            print(f"Contracts including {table}: {', '.join(contracts) or 'none'}")
+            for view in views_depending_on(catalog, table, column=column, schema=schema):
+                referenced = view['referenced_column'] or '(whole table)'
+                print(f"{view['contract']}: {view['schema'] or '?'}.{view['view']} reads "
+                      f"{view['referenced_table']}.{referenced}")
+
+    print(metrics.summary())
+
+
+if __name__ == '__main__':
+    from data_contract_cli import main
+    sys.exit(main(['catalog'] + sys.argv[1:]))
@@ -1,100 +1,548 @@
-import pyodbc
-import psycopg2
-import yaml
+import hashlib
+import itertools
+import json
+import os
 import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from column_records import (CatalogColumn, DestinationColumn, NameIndex, SourceColumn, ViewOutputColumn,
+                            fold_name, intern_string, plain_value)
+from contract_yaml import dump_yaml, load_yaml, open_contract_writer
+from ddl_export import ROUTINE_MODULE_TYPES, export_definitions, iter_module_definitions, open_definition_writer
+from drivers import psycopg2, pyodbc, supports_openjson
+from metadata_catalog import (CatalogContractWriter, contract_name, is_cross_database_name, open_catalog,
+                              render_contract, split_qualified_name, store_contract)
+from run_metrics import connect_instrumented, get_metrics, phase, start_run, timed_phase
+from tsql_view_parser import ViewParseError, parse_view
+
+
+class ConnectionPool:
+    # Keeps idle connections to a single source so each extract call borrows one instead of
+    # paying a fresh login/TLS handshake. pool_size bounds both concurrent checkouts and idle
+    # connections; idle connections older than health_check_interval seconds are probed first.
+    def __init__(self, connect, connection_string, pool_size=4, health_check_query='SELECT 1',
+                 health_check_interval=30):
+        self.connect = connect
+        self.connection_string = connection_string
+        self.pool_size = pool_size
+        self.health_check_query = health_check_query
+        self.health_check_interval = health_check_interval
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            self._checkin(conn)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError('Connection pool is closed')
+                conn, last_used = self._idle.pop() if self._idle else (None, None)
+
+            if conn is None:
+                conn = connect_instrumented(self.connect, self.connection_string)
+                with self._lock:
+                    self.opened += 1
+                return conn
+
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                with self._lock:
+                    self.reused += 1
+                return conn
+
+            self._discard(conn)
+
+    def _checkin(self, conn):
+        # End any open transaction so the next borrower starts clean
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
 
-def extract_metadata_from_mssql(connection_string, object_name, source_schema, is_view=False):
-    # Connect to MSSQL
-    conn = pyodbc.connect(connection_string)
-    cursor = conn.cursor()
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {'opened': self.opened, 'reused': self.reused, 'discarded': self.discarded}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class ContractSessions:
+    # One connection pool per source system, shared by every extract call of a contract run
+    def __init__(self, source_connection_string, destination_connection_string, airflow_connection_string,
+                 pool_size=4, health_check_interval=30):
+        self.mssql = ConnectionPool(pyodbc.connect, source_connection_string, pool_size=pool_size,
+                                    health_check_interval=health_check_interval)
+        self.destination = ConnectionPool(psycopg2.connect, destination_connection_string, pool_size=pool_size,
+                                          health_check_interval=health_check_interval)
+        self.airflow = ConnectionPool(psycopg2.connect, airflow_connection_string, pool_size=pool_size,
+                                      health_check_interval=health_check_interval)
+        # Whether the source database supports OPENJSON, probed on first use (see source_supports_openjson)
+        self.openjson = None
+
+    def stats(self):
+        return {
+            'mssql': self.mssql.stats(),
+            'destination': self.destination.stats(),
+            'airflow': self.airflow.stats(),
+        }
 
-    # Get column metadata
-    object_type = 'VIEW' if is_view else 'BASE TABLE'
+    def close(self):
+        self.mssql.close()
+        self.destination.close()
+        self.airflow.close()
 
-    if is_view:
-        # Fetch view DDL dynamically
-        cursor.execute(f"SET NOCOUNT ON; SELECT 'GO' + OBJECT_DEFINITION(object_id) FROM sys.views WHERE schema_id = SCHEMA_ID(N'{source_schema}') AND name = '{object_name}'")
-        view_ddl_result = cursor.fetchone()
+    def __enter__(self):
+        return self
 
-        if view_ddl_result:
-            view_ddl = view_ddl_result[0]
+    def __exit__(self, *exc_info):
+        self.close()
 
-            # Append view DDL to the file
-            with open('view_ddl.txt', 'a') as view_file:
-                view_file.write(view_ddl)
-                view_file.write('\n\n')
 
-            # Parse the view DDL to extract referenced columns and tables
-            columns, tables = parse_view_ddl(view_ddl)
-        else:
-            columns, tables = [], []
+def source_supports_openjson(connection_string, sessions=None):
+    # Probed once per run and remembered on the sessions. Without OPENJSON (before SQL Server 2016, or below
+    # compatibility level 130) lists of names cannot be sent as one parameter, so the generator reads each object
+    # on its own or the whole schema instead.
+    if sessions is not None and sessions.openjson is not None:
+        return sessions.openjson
+
+    pool = sessions.mssql if sessions is not None else None
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
+    try:
+        cursor = conn.cursor()
+        openjson = supports_openjson(cursor)
+        cursor.close()
+    finally:
+        release_connection(conn, pool)
+
+    if not openjson:
+        print("The source database has no OPENJSON (SQL Server 2016, compatibility level 130); "
+              "reading objects one at a time or the whole schema")
+    if sessions is not None:
+        sessions.openjson = openjson
+    return openjson
+
+
+def acquire_connection(connect, connection_string, pool=None):
+    # Borrow a pooled connection when a pool is given, otherwise open a dedicated one
+    if pool is not None:
+        return pool.acquire()
+    return connect_instrumented(connect, connection_string)
+
+
+def release_connection(conn, pool=None):
+    if pool is not None:
+        pool.release(conn)
     else:
-        # For tables, get column metadata
-        cursor.execute(f"SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{object_name}' AND TABLE_SCHEMA = '{source_schema}'")
-        columns = [{'name': row.COLUMN_NAME, 'type': row.DATA_TYPE} for row in cursor.fetchall()]
-        tables = []
+        conn.close()
+
+
+# Set-based column catalog for a whole schema. One round trip returns every column of every
+# table and view together with its type, length, nullability and primary key flag.
+# DATA_TYPE mirrors INFORMATION_SCHEMA.COLUMNS so both extraction modes report identical types.
+CATALOG_COLUMNS_QUERY = """
+    SELECT
+        s.name AS SchemaName,
+        o.name AS ObjectName,
+        o.type AS ObjectType,
+        c.column_id AS ColumnId,
+        c.name AS ColumnName,
+        ISNULL(TYPE_NAME(c.system_type_id), t.name) AS DataType,
+        c.max_length AS MaxLength,
+        c.precision AS NumericPrecision,
+        c.scale AS NumericScale,
+        c.is_nullable AS IsNullable,
+        CASE WHEN EXISTS (
+            SELECT 1
+            FROM sys.indexes AS i
+            JOIN sys.index_columns AS ic ON ic.object_id = i.object_id
+                                        AND ic.index_id = i.index_id
+            WHERE i.object_id = c.object_id
+              AND i.is_primary_key = 1
+              AND ic.column_id = c.column_id
+        ) THEN 1 ELSE 0 END AS IsPrimaryKey
+    FROM sys.objects AS o
+    JOIN sys.schemas AS s ON s.schema_id = o.schema_id
+    JOIN sys.columns AS c ON c.object_id = o.object_id
+    JOIN sys.types AS t ON t.user_type_id = c.user_type_id
+    WHERE o.type IN ('U', 'V')
+      AND s.name = ?
+    {object_filter}
+    ORDER BY s.name, o.name, c.column_id
+"""
+
+# The object list is passed as a single JSON parameter so the query text (and its cached plan)
+# stays the same no matter how many objects are requested. OPENJSON needs SQL Server 2016 and database
+# compatibility level 130; below that the whole schema is read and the objects are picked out client-side.
+CATALOG_OBJECT_FILTER = "AND o.name IN (SELECT value FROM OPENJSON(?))"
+
+
+@timed_phase('catalog_fetch')
+def extract_catalog_snapshot(connection_string, source_schema, object_names=None, pool=None, openjson=True):
+    # Connect to MSSQL
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
+
+    try:
+        cursor = conn.cursor()
+        if object_names is None:
+            cursor.execute(CATALOG_COLUMNS_QUERY.format(object_filter=''), source_schema)
+            rows = cursor
+        elif openjson:
+            cursor.execute(CATALOG_COLUMNS_QUERY.format(object_filter=CATALOG_OBJECT_FILTER),
+                           source_schema, json.dumps(list(object_names)))
+            rows = cursor
+        else:
+            cursor.execute(CATALOG_COLUMNS_QUERY.format(object_filter=''), source_schema)
+            wanted = {fold_name(object_name) for object_name in object_names}
+            rows = (row for row in cursor if fold_name(row[1]) in wanted)
+        catalog = build_catalog_index(rows)
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
+
+    return catalog
+
+
+def build_catalog_index(rows):
+    # Index the catalog rows by (schema, object); columns keep their column_id order
+    catalog = NameIndex()
+
+    for row in rows:
+        schema_name, object_name, object_type, _, column_name, data_type, max_length, precision, scale, \
+            is_nullable, is_primary_key = row
+        catalog.setdefault((intern_string(schema_name), object_name), []).append(CatalogColumn(
+            column_name, data_type, object_type.strip(), max_length, precision, scale, bool(is_nullable),
+            bool(is_primary_key)))
+
+    return catalog
+
+
+# Types whose declaration carries a length, precision or scale that sys.columns reports separately
+CHARACTER_LENGTH_TYPES = {'varchar', 'char', 'varbinary', 'binary'}
+UNICODE_LENGTH_TYPES = {'nvarchar', 'nchar'}
+NUMERIC_TYPES = {'decimal', 'numeric'}
+FRACTIONAL_SECONDS_TYPES = {'datetime2', 'datetimeoffset', 'time'}
+
+
+def physical_type(data_type, max_length, precision, scale):
+    # The type as it would be declared, e.g. nvarchar(50), varchar(max) or decimal(18,4). sys.columns stores
+    # nvarchar/nchar lengths in bytes and -1 for MAX.
+    if data_type in CHARACTER_LENGTH_TYPES or data_type in UNICODE_LENGTH_TYPES:
+        if max_length == -1:
+            return f"{data_type}(max)"
+        return f"{data_type}({max_length // 2 if data_type in UNICODE_LENGTH_TYPES else max_length})"
+    if data_type in NUMERIC_TYPES:
+        return f"{data_type}({precision},{scale})"
+    if data_type in FRACTIONAL_SECONDS_TYPES:
+        return f"{data_type}({scale})"
+    return data_type
+
+
+def lookup_columns(catalog, source_schema, object_name):
+    # Answer a column lookup from the catalog snapshot using the same shape as the per-table query
+    return [SourceColumn(column.name, column.type)
+            for column in catalog.lookup((source_schema, object_name), [])]
 
-    # Close the connection
-    conn.close()
+
+def extract_metadata_from_mssql(connection_string, object_name, source_schema, is_view=False, catalog=None,
+                                pool=None, ddl_writer=None):
+    # Tables are answered from the catalog snapshot without touching the server
+    if catalog is not None and not is_view:
+        return lookup_columns(catalog, source_schema, object_name), []
+
+    # Connect to MSSQL
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
+
+    try:
+        cursor = conn.cursor()
+
+        if is_view:
+            with phase('ddl_fetch'):
+                # Fetch view DDL dynamically
+                cursor.execute("SET NOCOUNT ON; SELECT OBJECT_DEFINITION(object_id) FROM sys.views WHERE schema_id = SCHEMA_ID(?) AND name = ?",
+                               source_schema, object_name)
+                view_ddl_result = cursor.fetchone()
+
+                if view_ddl_result:
+                    view_ddl = view_ddl_result[0]
+
+                    # The DDL export is shared by concurrent view extraction
+                    if ddl_writer is not None:
+                        ddl_writer.write(source_schema, object_name, 'V', view_ddl)
+
+            if view_ddl_result:
+                # Parse the view DDL to extract referenced columns and tables
+                columns, tables = parse_view_ddl(view_ddl, source_schema, object_name)
+            else:
+                columns, tables = [], []
+        else:
+            with phase('catalog_fetch'):
+                # For tables, get column metadata
+                cursor.execute("SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? AND TABLE_SCHEMA = ?",
+                               object_name, source_schema)
+                columns = [SourceColumn(row.COLUMN_NAME, row.DATA_TYPE) for row in cursor.fetchall()]
+            tables = []
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
 
     return columns, tables
 
 
-def parse_view_ddl(view_ddl):
+def qualified_table_name(name, default_schema=None):
+    # Referenced tables are named schema.table; unqualified names resolve in the view's own schema. Tables of
+    # another database keep their database (and server) part, e.g. OtherDb.dbo.Orders; a schema left out there
+    # depends on that database's defaults and stays empty (OtherDb..Orders).
+    server, database, schema, table = name
+    if server is None and database is None:
+        schema = schema or default_schema
+        return f"{schema}.{table}" if schema else table
+    return '.'.join(part or '' for part in name[0 if server else 1:])
+
+
+def parse_view_ddl(view_ddl, default_schema=None, view_name=None):
+    # Tokenize and parse the view body; each output column carries the table and column it reads from
+    with phase('parse'):
+        try:
+            view = parse_view(view_ddl)
+        except ViewParseError as e:
+            # The view keeps the columns SQL Server describes, without lineage; the failure is counted and
+            # listed in the run summary and metrics report
+            qualified_name = '.'.join(part for part in (default_schema, view_name) if part) or '(unnamed view)'
+            get_metrics().record_parse_error(qualified_name, str(e))
+            return [], []
+
     columns = []
-    tables = set()
+    for column in view['columns']:
+        source_table = qualified_table_name(column['source_table'], default_schema) \
+            if column['source_table'] else None
+        columns.append({'name': column['name'], 'table': source_table, 'column': column['source_column']})
 
-    # Regular expression to extract column names
-    column_pattern = re.compile(r'\[?([a-zA-Z_]\w*)\]?\s*(?:,|\n|$)', re.IGNORECASE)
+    tables = sorted({qualified_table_name(table, default_schema) for table in view['tables']})
 
-    # Regular expression to extract table names
-    table_pattern = re.compile(r'\bFROM\s+\[?([a-zA-Z_]\w*)\]?\s*(?:\b|$)', re.IGNORECASE)
+    return columns, tables
 
-    # Find all matches for columns
-    column_matches = column_pattern.finditer(view_ddl)
-    for match in column_matches:
-        column_name = match.group(1)
-        columns.append(column_name)
 
-    # Find all matches for tables
-    table_matches = table_pattern.finditer(view_ddl)
-    for match in table_matches:
-        table_name = match.group(1)
-        tables.add(table_name)
+@timed_phase('ddl_fetch')
+def extract_view_definitions(connection_string, source_schema, view_names, pool=None, ddl_writer=None):
+    # Every requested view definition in one streamed query. Each definition is written to the DDL export
+    # and parsed as soon as its last chunk arrives, so only the parsed columns and tables are kept.
+    parsed_views = NameIndex()
+    if not view_names:
+        return parsed_views
 
-    return columns, list(tables)
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
 
-def extract_data_types_from_tables(connection_string, source_schema, tables):
-    data_types = {}
+    try:
+        definitions = iter_module_definitions(conn.cursor(), source_schema, object_names=sorted(set(view_names)))
+        for _, view_name, _, view_ddl in export_definitions(definitions, ddl_writer):
+            parsed_views[view_name] = parse_view_ddl(view_ddl, source_schema, view_name)
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
+
+    return parsed_views
 
-    # Connect to MSSQL
-    conn = pyodbc.connect(connection_string)
-    cursor = conn.cursor()
 
+@timed_phase('ddl_fetch')
+def export_routine_definitions(connection_string, source_schema, ddl_writer, pool=None):
+    # Stored procedures and functions are not part of the contract; their definitions only go to the export
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
+
+    try:
+        definitions = iter_module_definitions(conn.cursor(), source_schema, module_types=ROUTINE_MODULE_TYPES)
+        for _ in export_definitions(definitions, ddl_writer):
+            pass
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
+
+
+@timed_phase('catalog_fetch')
+def extract_data_types_from_tables(connection_string, source_schema, tables, catalog=None, pool=None):
+    data_types = {}
+
+    # Tables are named schema.table. Those of the source schema are answered from the catalog snapshot
+    # without touching the server; the others are fetched one at a time. Tables of another database
+    # (database.schema.table) are not in this database's catalog, and their columns stay untraced.
+    remaining = []
     for table_name in tables:
-        # Fetch column metadata for the table
-        cursor.execute(f"SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{table_name}' AND TABLE_SCHEMA = '{source_schema}'")
-        columns = {row.COLUMN_NAME: row.DATA_TYPE for row in cursor.fetchall()}
-        data_types[table_name] = columns
+        schema, name = split_qualified_name(table_name, source_schema)
+        if catalog is not None and fold_name(schema) == fold_name(source_schema):
+            data_types[table_name] = {column['name']: column['type']
+                                      for column in lookup_columns(catalog, source_schema, name)}
+        elif is_cross_database_name(table_name):
+            data_types[table_name] = {}
+        else:
+            remaining.append((table_name, schema, name))
+    if not remaining:
+        return data_types
+
+    # Connect to MSSQL
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
 
-    # Close the connection
-    conn.close()
+    try:
+        cursor = conn.cursor()
+
+        for table_name, schema, name in remaining:
+            # Fetch column metadata for the table
+            cursor.execute("SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? AND TABLE_SCHEMA = ?",
+                           name, schema)
+            columns = {row.COLUMN_NAME: row.DATA_TYPE for row in cursor.fetchall()}
+            data_types[table_name] = columns
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
 
     return data_types
 
-def extract_metadata_from_airflow(airflow_connection_string):
+# DAGs of the Airflow metadata database, narrowed in SQL by the optional filter built below
+AIRFLOW_DAGS_QUERY = """
+    SELECT d.dag_id, d.is_active, d.schedule_interval
+    FROM dag AS d
+    {dag_filter}
+    ORDER BY d.dag_id
+"""
+
+# Run statistics of the filtered DAGs over a lookback window, aggregated by the database in one grouped
+# query so no run history is pulled to the client. Durations are in seconds and only count successful
+# runs; the failure rate is over finished (successful or failed) runs.
+AIRFLOW_RUN_STATS_QUERY = """
+    SELECT
+        r.dag_id,
+        MAX(r.end_date) FILTER (WHERE r.state = 'success') AS last_success,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM r.end_date - r.start_date))
+            FILTER (WHERE r.state = 'success') AS p50_duration,
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM r.end_date - r.start_date))
+            FILTER (WHERE r.state = 'success') AS p95_duration,
+        COUNT(*) FILTER (WHERE r.state = 'failed')::float
+            / NULLIF(COUNT(*) FILTER (WHERE r.state IN ('success', 'failed')), 0) AS failure_rate,
+        COUNT(*) AS run_count
+    FROM dag_run AS r
+    JOIN dag AS d ON d.dag_id = r.dag_id
+    WHERE r.start_date >= now() - %s * interval '1 day'
+    {dag_filter}
+    GROUP BY r.dag_id
+    ORDER BY r.dag_id
+"""
+
+
+# Whether the Airflow metadata database has the dataset tables (Airflow 2.4+) the tables criterion reads
+AIRFLOW_DATASET_TABLES_QUERY = """
+    SELECT to_regclass('task_outlet_dataset_reference') IS NOT NULL AND to_regclass('dataset') IS NOT NULL
+"""
+
+
+def _escape_like(text):
+    # Escape LIKE wildcards so names match literally
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_dag_filter(dag_filter, keyword='WHERE'):
+    # Turn {'dag_ids': [...], 'prefixes': [...], 'tags': [...], 'tables': [...]} into a SQL condition and
+    # its parameters. A DAG matches when it satisfies any of the given criteria; tables match DAGs that
+    # produce an Airflow dataset whose URI mentions the table (Airflow 2.4+ data-aware scheduling).
+    conditions = []
+    params = []
+    dag_filter = dag_filter or {}
+
+    if dag_filter.get('dag_ids'):
+        conditions.append('d.dag_id = ANY(%s)')
+        params.append(list(dag_filter['dag_ids']))
+    if dag_filter.get('prefixes'):
+        conditions.append('d.dag_id LIKE ANY(%s)')
+        params.append([_escape_like(prefix) + '%' for prefix in dag_filter['prefixes']])
+    if dag_filter.get('tags'):
+        conditions.append('EXISTS (SELECT 1 FROM dag_tag AS t WHERE t.dag_id = d.dag_id AND t.name = ANY(%s))')
+        params.append(list(dag_filter['tags']))
+    if dag_filter.get('tables'):
+        conditions.append("""EXISTS (
+            SELECT 1
+            FROM task_outlet_dataset_reference AS o
+            JOIN dataset AS ds ON ds.id = o.dataset_id
+            WHERE o.dag_id = d.dag_id AND ds.uri ILIKE ANY(%s)
+        )""")
+        params.append(['%' + _escape_like(table) + '%' for table in dag_filter['tables']])
+
+    if not conditions:
+        return '', params
+    return f"{keyword} ({' OR '.join(conditions)})", params
+
+
+@timed_phase('catalog_fetch')
+def extract_metadata_from_airflow(airflow_connection_string, pool=None, dag_filter=None, run_stats_days=None,
+                                  itersize=2000):
     metadata = {'dags': {}}
 
     # Connect to Airflow metadata database (Postgres)
-    conn = psycopg2.connect(airflow_connection_string)
-    cursor = conn.cursor()
+    conn = acquire_connection(psycopg2.connect, airflow_connection_string, pool)
 
     try:
-        # Fetch DAG metadata
-        cursor.execute("SELECT dag_id, is_active, schedule_interval FROM dag")
-        dag_records = cursor.fetchall()
+        if dag_filter and dag_filter.get('tables') and not _has_airflow_datasets(conn):
+            # Tables cannot be matched before Airflow 2.4, and querying the missing tables would fail the
+            # whole read; every DAG is read instead
+            print("Airflow has no dataset tables (Airflow 2.4+ is needed to match DAGs to tables), "
+                  "reading every DAG instead")
+            dag_filter = None
+
+        filter_sql, filter_params = build_dag_filter(dag_filter)
 
-        for dag_record in dag_records:
+        # Fetch DAG metadata through a named (server-side) cursor, itersize rows per round trip
+        cursor = conn.cursor(name='airflow_dags')
+        cursor.itersize = itersize
+        cursor.execute(AIRFLOW_DAGS_QUERY.format(dag_filter=filter_sql), filter_params)
+
+        for dag_record in cursor:
             dag_id, is_active, schedule_interval = dag_record
             metadata['dags'][dag_id] = {'is_active': is_active, 'schedule_interval': schedule_interval}
             # metadata['dags'][dag_id] = {'is_active': is_active, 'schedule_interval': schedule_interval, 'human_readable_schedule': None}
@@ -110,14 +558,40 @@ def extract_metadata_from_airflow(airflow_connection_string):
             # else:
             #     metadata['dags'][dag_id]['human_readable_schedule'] = None
 
+        cursor.close()
+
+        if run_stats_days is not None:
+            run_filter_sql, run_filter_params = build_dag_filter(dag_filter, keyword='AND')
+            cursor = conn.cursor()
+            cursor.execute(AIRFLOW_RUN_STATS_QUERY.format(dag_filter=run_filter_sql),
+                           [run_stats_days] + run_filter_params)
+            for dag_id, last_success, p50_duration, p95_duration, failure_rate, run_count in cursor.fetchall():
+                if dag_id in metadata['dags']:
+                    metadata['dags'][dag_id]['run_stats'] = {
+                        'last_success': last_success.isoformat() if last_success else None,
+                        'p50_duration_seconds': round(p50_duration, 3) if p50_duration is not None else None,
+                        'p95_duration_seconds': round(p95_duration, 3) if p95_duration is not None else None,
+                        'failure_rate': round(failure_rate, 4) if failure_rate is not None else None,
+                        'run_count': run_count,
+                    }
+            cursor.close()
+
     except Exception as e:
         print(f"Error fetching metadata from Airflow: {e}")
     finally:
         # Close the connection
-        conn.close()
+        release_connection(conn, pool)
 
     return metadata
 
+
+def _has_airflow_datasets(conn):
+    cursor = conn.cursor()
+    cursor.execute(AIRFLOW_DATASET_TABLES_QUERY)
+    has_datasets, = cursor.fetchone()
+    cursor.close()
+    return bool(has_datasets)
+
 # def parse_cron_expression(cron_expression):
 #     try:
 #         # Handle special cases
@@ -162,153 +636,806 @@ def extract_metadata_from_airflow(airflow_connection_string):
 #         print(f"Error parsing CRON expression: {e}")
 #         return None, None
     
-def extract_table_names_from_postgres(destination_connection_string, destination_schema):
-    table_names = []
+# Every column of every table and view in the destination schema in one pass over pg_catalog.
+# format_type() returns the full declared type, e.g. character varying(50) or numeric(18,4). Tables are ordered
+# with the "C" collation, by code point like Python's sorted(), whatever the database's default collation.
+DESTINATION_CATALOG_QUERY = """
+    SELECT
+        c.relname AS table_name,
+        a.attname AS column_name,
+        format_type(a.atttypid, a.atttypmod) AS data_type,
+        NOT a.attnotnull AS is_nullable,
+        COALESCE(a.attnum = ANY(pk.conkey), false) AS is_primary_key
+    FROM pg_catalog.pg_class AS c
+    JOIN pg_catalog.pg_namespace AS n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute AS a ON a.attrelid = c.oid
+    LEFT JOIN pg_catalog.pg_constraint AS pk ON pk.conrelid = c.oid
+                                             AND pk.contype = 'p'
+    WHERE n.nspname = %s
+      AND c.relkind IN ('r', 'p', 'v', 'f')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    {table_filter}
+    ORDER BY c.relname COLLATE "C", a.attnum
+"""
+
+
+def iter_destination_catalog(destination_connection_string, destination_schema, pool=None, itersize=2000,
+                             table_names=None):
+    # Errors are raised: a destination section cut short, or a drift check reporting every object of an
+    # unreadable catalog as missing, would look like a valid result
 
     # Connect to Postgres
-    conn = psycopg2.connect(destination_connection_string)
-    cursor = conn.cursor()
+    conn = acquire_connection(psycopg2.connect, destination_connection_string, pool)
 
     try:
-        # Get list of tables in the specified schema
-        formatted_schema = f"'{destination_schema}'"  # Format the schema name with single quotes
-        cursor.execute(f"SELECT table_name FROM information_schema.tables WHERE table_schema = {formatted_schema}")
-        table_names = [row[0] for row in cursor.fetchall()]
-    except Exception as e:
-        print(f"Error fetching table names from Postgres: {e}")
+        # A named cursor keeps the result set on the server and pulls it itersize rows at a time,
+        # so only one table's columns are held in memory while it is being yielded
+        cursor = conn.cursor(name='destination_catalog')
+        cursor.itersize = itersize
+        with phase('catalog_fetch'):
+            if table_names is None:
+                cursor.execute(DESTINATION_CATALOG_QUERY.format(table_filter=''), (destination_schema,))
+            else:
+                cursor.execute(DESTINATION_CATALOG_QUERY.format(table_filter='AND c.relname = ANY(%s)'),
+                               (destination_schema, list(table_names)))
+
+        for table_name, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+            yield table_name, [
+                DestinationColumn(column_name, data_type, is_nullable, is_primary_key)
+                for _, column_name, data_type, is_nullable, is_primary_key in rows
+            ]
+
+        cursor.close()
     finally:
         # Close the connection
-        conn.close()
+        release_connection(conn, pool)
 
-    return table_names
 
+def generate_yaml_from_ddl(source_connection_string, destination_connection_string, airflow_connection_string,
+                           source_schema, destination_schema, source_tables, source_views, bulk_catalog=False,
+                           sessions=None, max_workers=None, dag_filter=None, run_stats_days=None, ddl_writer=None):
+    with _run_sessions(sessions, source_connection_string, destination_connection_string, airflow_connection_string,
+                       max_workers) as sessions:
+        if max_workers and max_workers > 1:
+            return _generate_contract_concurrently(source_connection_string, destination_connection_string,
+                                                   airflow_connection_string, source_schema, destination_schema,
+                                                   source_tables, source_views, bulk_catalog, sessions, max_workers,
+                                                   dag_filter, run_stats_days, ddl_writer)
+
+        return {
+            'source': extract_source_section(source_connection_string, source_schema, source_tables, source_views,
+                                             bulk_catalog, sessions, ddl_writer=ddl_writer),
+            'destination': extract_destination_section(destination_connection_string, destination_schema, sessions),
+            'airflow': extract_airflow_section(airflow_connection_string, sessions, dag_filter, run_stats_days),
+        }
+
+
+@contextmanager
+def _run_sessions(sessions, source_connection_string, destination_connection_string, airflow_connection_string,
+                  max_workers=None):
+    # Without caller-provided sessions the run owns its pools and shuts them down at the end
+    if sessions is not None:
+        yield sessions
+        return
+
+    with ContractSessions(source_connection_string, destination_connection_string, airflow_connection_string,
+                          pool_size=max(4, max_workers or 1)) as owned_sessions:
+        yield owned_sessions
+
+
+def _generate_contract_concurrently(source_connection_string, destination_connection_string, airflow_connection_string,
+                                    source_schema, destination_schema, source_tables, source_views, bulk_catalog,
+                                    sessions, max_workers, dag_filter=None, run_stats_days=None, ddl_writer=None):
+    # The three systems are independent, so each gets its own task. Per-object work inside the source
+    # fans out on a separate executor to avoid tasks waiting on slots held by their own parent.
+    with ThreadPoolExecutor(max_workers=3) as source_executor, \
+            ThreadPoolExecutor(max_workers=max_workers) as object_executor:
+        source = source_executor.submit(extract_source_section, source_connection_string, source_schema,
+                                        source_tables, source_views, bulk_catalog, sessions, object_executor, ddl_writer)
+        destination = source_executor.submit(extract_destination_section, destination_connection_string,
+                                             destination_schema, sessions)
+        airflow = source_executor.submit(extract_airflow_section, airflow_connection_string, sessions, dag_filter,
+                                         run_stats_days)
+
+        # Assemble in a fixed order so the contract never depends on which task finished first
+        return {
+            'source': source.result(),
+            'destination': destination.result(),
+            'airflow': airflow.result(),
+        }
+
+
+def _map_objects(executor, function, object_names):
+    # executor.map yields results in input order, which keeps the contract deterministic
+    if executor is None:
+        return [function(object_name) for object_name in object_names]
+    return list(executor.map(function, object_names))
+
+
+def _iter_objects(executor, function, object_names, window):
+    # Like executor.map, but keeps at most window objects in flight so results can be written as they
+    # arrive without holding every section in memory
+    if executor is None:
+        for object_name in object_names:
+            yield object_name, function(object_name)
+        return
+
+    pending = deque()
+    for object_name in object_names:
+        pending.append((object_name, executor.submit(function, object_name)))
+        if len(pending) >= window:
+            object_name, future = pending.popleft()
+            yield object_name, future.result()
+    while pending:
+        object_name, future = pending.popleft()
+        yield object_name, future.result()
+
+
+def extract_source_section(source_connection_string, source_schema, source_tables, source_views, bulk_catalog,
+                           sessions, executor=None, ddl_writer=None):
+    extract_table, extract_view = _source_extractors(source_connection_string, source_schema, bulk_catalog, sessions,
+                                                     source_tables, source_views, ddl_writer)
+
+    # Extract metadata for source tables and views
+    return {
+        'tables': dict(zip(source_tables, _map_objects(executor, extract_table, source_tables))),
+        'views': dict(zip(source_views, _map_objects(executor, extract_view, source_views))),
+    }
+
+
+def _source_extractors(source_connection_string, source_schema, bulk_catalog, sessions, source_tables=(),
+                       source_views=(), ddl_writer=None):
+    # In bulk mode the view definitions are fetched and parsed together in one streamed query, and the
+    # columns are fetched once and all lookups are answered from them. The snapshot holds only the contract's
+    # tables and views and the source schema tables their SELECT * / alias.* reads, so its size follows the
+    # contract rather than the schema. Bulk mode passes its object lists through OPENJSON; without it every
+    # object is read on its own.
+    openjson = source_supports_openjson(source_connection_string, sessions)
+    bulk_catalog = bulk_catalog and openjson
+    parsed_views = extract_view_definitions(source_connection_string, source_schema, source_views,
+                                            pool=sessions.mssql, ddl_writer=ddl_writer) if bulk_catalog else None
+    if bulk_catalog:
+        star_tables = {split_qualified_name(column['table'], source_schema)
+                       for columns, _ in parsed_views.values()
+                       for column in columns if column['name'] == '*' and column['table']}
+        snapshot_objects = sorted(set(source_tables) | set(source_views) |
+                                  {name for schema, name in star_tables
+                                   if fold_name(schema) == fold_name(source_schema)})
+        catalog = extract_catalog_snapshot(source_connection_string, source_schema, object_names=snapshot_objects,
+                                           pool=sessions.mssql) if snapshot_objects else NameIndex()
+    else:
+        catalog = None
+
+    # View output columns come from the server's own description of each view (sys.columns), which the bulk
+    # snapshot already holds; otherwise the requested views are described together in one query
+    if catalog is not None:
+        view_catalog = catalog
+    elif source_views:
+        view_catalog = extract_catalog_snapshot(source_connection_string, source_schema,
+                                                object_names=sorted(set(source_views)), pool=sessions.mssql,
+                                                openjson=openjson)
+    else:
+        view_catalog = NameIndex()
+
+    def extract_table(table_name):
+        columns, _ = extract_metadata_from_mssql(source_connection_string, table_name, source_schema, is_view=False,
+                                                 catalog=catalog, pool=sessions.mssql)
+        return {'columns': columns}
+
+    def extract_view(view_name):
+        if parsed_views is not None:
+            columns, tables = parsed_views.lookup(view_name, ([], []))
+        else:
+            columns, tables = extract_metadata_from_mssql(source_connection_string, view_name, source_schema,
+                                                          is_view=True, pool=sessions.mssql, ddl_writer=ddl_writer)
+
+        # Table columns are only needed to trace the lineage of SELECT * / alias.*
+        star_tables = sorted({column['table'] for column in columns if column['name'] == '*' and column['table']})
+        data_types = extract_data_types_from_tables(source_connection_string, source_schema, star_tables,
+                                                    catalog=catalog, pool=sessions.mssql) if star_tables else {}
+
+        with phase('resolve'):
+            # Names, types and nullability as the server describes the view; lineage from the parsed definition
+            lineage = build_lineage_index(columns, data_types)
+            columns_with_types = []
+            for column in view_catalog.lookup((source_schema, view_name), []):
+                table, source_column = lineage.get(column.name.lower(), (None, None))
+                columns_with_types.append(ViewOutputColumn(
+                    column.name, column.type,
+                    physical_type(column.type, column.max_length, column.precision, column.scale),
+                    column.is_nullable, table, source_column))
+
+        return {'columns': columns_with_types, 'referenced_tables': tables}
+
+    return extract_table, extract_view
+
+
+def build_lineage_index(parsed_columns, data_types):
+    # Output column name -> (base table, base column), case-insensitive like SQL Server names. Columns
+    # expanded from SELECT * / alias.* give way to columns the view projects explicitly.
+    lineage = {}
+    for column in parsed_columns:
+        if column['name'] == '*':
+            for name in data_types.get(column['table'], {}):
+                lineage.setdefault(name.lower(), (column['table'], name))
+    for column in parsed_columns:
+        if column['name'] != '*' and column['table']:
+            lineage[column['name'].lower()] = (column['table'], column['column'])
+    return lineage
+
+
+def extract_airflow_section(airflow_connection_string, sessions, dag_filter=None, run_stats_days=None):
+    dags = {}
+
+    # Extract metadata from Airflow
+    airflow_metadata = extract_metadata_from_airflow(airflow_connection_string, pool=sessions.airflow,
+                                                     dag_filter=dag_filter, run_stats_days=run_stats_days)
+    for dag_id, dag_info in airflow_metadata['dags'].items():
+        dags[dag_id] = {
+            'is_active': dag_info['is_active'],
+            'schedule_interval': dag_info['schedule_interval'],
+            # 'human_readable_schedule': dag_info['human_readable_schedule'],
+        }
+        if 'run_stats' in dag_info:
+            dags[dag_id]['run_stats'] = dag_info['run_stats']
+
+    if run_stats_days is None:
+        return {'dags': dags}
+    return {'dags': dags, 'slaProperties': airflow_sla_properties(dags)}
 
-def extract_metadata_from_postgres(destination_connection_string, destination_schema, table_name):
-    columns = []
+
+def airflow_sla_properties(dags):
+    # Contract-level SLA properties from the DAGs' run statistics, each taken from the weakest DAG: the
+    # oldest last success, the slowest durations and the highest failure rate
+    stats = [dag['run_stats'] for dag in dags.values() if dag.get('run_stats')]
+
+    def weakest(key, choose):
+        values = [stat[key] for stat in stats if stat[key] is not None]
+        return choose(values) if values else None
+
+    return [
+        {'column': None, 'property': 'lastSuccess', 'unit': None, 'value': weakest('last_success', min)},
+        {'column': None, 'property': 'durationP50', 'unit': 'seconds', 'value': weakest('p50_duration_seconds', max)},
+        {'column': None, 'property': 'durationP95', 'unit': 'seconds', 'value': weakest('p95_duration_seconds', max)},
+        {'column': None, 'property': 'failureRate', 'unit': 'ratio', 'value': weakest('failure_rate', max)},
+    ]
+
+
+def extract_destination_section(destination_connection_string, destination_schema, sessions):
+    # Extract metadata from Postgres (destination) in a single catalog pass
+    return {
+        table_name: {'columns': columns}
+        for table_name, columns in iter_destination_catalog(destination_connection_string, destination_schema,
+                                                            pool=sessions.destination)
+    }
+
+# Freshness of every table and view in a schema in one round trip. object_id survives renames and
+# modify_date changes on any ALTER, so together they identify exactly which cached entries are still valid.
+SOURCE_FRESHNESS_QUERY = """
+    SELECT o.object_id, o.name, o.type, o.modify_date
+    FROM sys.objects AS o
+    WHERE o.schema_id = SCHEMA_ID(?)
+      AND o.type IN ('U', 'V')
+"""
+
+# Per-table fingerprint of the destination schema: any added, dropped, retyped or re-keyed column
+# changes the hash of its table.
+DESTINATION_FINGERPRINT_QUERY = """
+    SELECT
+        c.relname AS table_name,
+        md5(string_agg(
+            a.attname || ' ' || format_type(a.atttypid, a.atttypmod) || ' ' || a.attnotnull::text || ' '
+                || COALESCE(a.attnum = ANY(pk.conkey), false)::text,
+            ',' ORDER BY a.attnum
+        )) AS fingerprint
+    FROM pg_catalog.pg_class AS c
+    JOIN pg_catalog.pg_namespace AS n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute AS a ON a.attrelid = c.oid
+    LEFT JOIN pg_catalog.pg_constraint AS pk ON pk.conrelid = c.oid
+                                             AND pk.contype = 'p'
+    WHERE n.nspname = %s
+      AND c.relkind IN ('r', 'p', 'v', 'f')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    GROUP BY c.relname
+"""
+
+
+@timed_phase('catalog_fetch')
+def extract_source_freshness(connection_string, source_schema, pool=None):
+    # Keyed by the server's spelling of each name; configured names are resolved against it ignoring case
+    freshness = NameIndex()
+
+    # Connect to MSSQL
+    conn = acquire_connection(pyodbc.connect, connection_string, pool)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(SOURCE_FRESHNESS_QUERY, source_schema)
+        for object_id, name, object_type, modify_date in cursor.fetchall():
+            freshness[name] = {'object_id': object_id, 'type': object_type.strip(),
+                               'modify_date': modify_date.isoformat()}
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
+
+    return freshness
+
+
+@timed_phase('catalog_fetch')
+def extract_destination_fingerprints(destination_connection_string, destination_schema, pool=None):
+    fingerprints = {}
 
     # Connect to Postgres
-    conn = psycopg2.connect(destination_connection_string)
-    cursor = conn.cursor()
+    conn = acquire_connection(psycopg2.connect, destination_connection_string, pool)
 
     try:
-        # Get column metadata
-        formatted_table_name = f"'{table_name}'"  # Format the table name
-        cursor.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = {formatted_table_name} AND table_schema = '{destination_schema}'")
-        columns = [{'name': row[0], 'type': row[1]} for row in cursor.fetchall()]
-    except Exception as e:
-        print(f"Error fetching metadata from Postgres: {e}")
+        cursor = conn.cursor()
+        cursor.execute(DESTINATION_FINGERPRINT_QUERY, (destination_schema,))
+        fingerprints = dict(cursor.fetchall())
     finally:
         # Close the connection
-        conn.close()
+        release_connection(conn, pool)
 
-    return columns
+    return fingerprints
+
+
+# Credentials are left out of cache keys so a rotated password keeps the cached entries
+CONNECTION_CREDENTIALS = re.compile(r'(?i)\b(?:uid|pwd|user|password)\s*=\s*[^; ]*')
+
+# schema@connection hash, as written by metadata_cache_key
+METADATA_CACHE_KEY = re.compile(r'.*@[0-9a-f]{16}', re.DOTALL)
+
+
+def metadata_cache_key(connection_string, schema):
+    # Cached entries belong to a schema of one server and database, which the connection string names; configs
+    # sharing a cache file and a schema name on different servers or databases never read each other's entries
+    target = CONNECTION_CREDENTIALS.sub('', connection_string)
+    return f"{schema}@{hashlib.sha1(target.encode('utf-8')).hexdigest()[:16]}"
+
+
+def load_metadata_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {'source': {}, 'destination': {}}
+
+    with open(cache_path) as cache_file:
+        cache = json.load(cache_file)
+
+    # Entries of older cache files are keyed by the bare schema name. They could belong to any server or
+    # database, so they are dropped rather than guessed at; the next run extracts those objects again.
+    for section in ('source', 'destination'):
+        entries = cache.setdefault(section, {})
+        for key in [key for key in entries if not METADATA_CACHE_KEY.fullmatch(key)]:
+            del entries[key]
+    return cache
+
+
+def save_metadata_cache(cache, cache_path):
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache behind
+    temporary_path = f"{cache_path}.tmp"
+    with open(temporary_path, 'w') as cache_file:
+        json.dump(cache, cache_file, default=plain_value)
+    os.replace(temporary_path, cache_path)
+
+
+def _referenced_modify_date(freshness, source_schema, table):
+    # Referenced tables are named schema.table; only the source schema's objects are tracked, so tables of
+    # other schemas or databases have no modify_date and never invalidate a view
+    schema, name = split_qualified_name(table, source_schema)
+    if fold_name(schema) != fold_name(source_schema):
+        return None
+    return freshness.lookup(name, {}).get('modify_date')
+
+
+def _cache_name(freshness, name):
+    # Cached entries are keyed by the server's spelling of the object, however the object was configured
+    resolved = freshness.resolve(name)
+    return name if resolved is None else resolved
+
+
+def _is_source_entry_fresh(entry, name, freshness, source_schema):
+    # A cached entry is valid only for the same object (not a dropped-and-recreated or renamed one)
+    # at the same modify_date, and for views only while every referenced table is unchanged as well
+    current = freshness.get(name)
+    if entry is None or current is None:
+        return False
+    if entry['object_id'] != current['object_id'] or entry['modify_date'] != current['modify_date']:
+        return False
+    return all(_referenced_modify_date(freshness, source_schema, table) == modify_date
+               for table, modify_date in entry.get('depends_on', {}).items())
+
+
+def generate_yaml_incremental(source_connection_string, destination_connection_string, airflow_connection_string,
+                              source_schema, destination_schema, source_tables, source_views, yaml_file_path,
+                              cache_path, bulk_catalog=False, sessions=None, max_workers=None, dag_filter=None,
+                              run_stats_days=None, ddl_writer=None):
+    cache = load_metadata_cache(cache_path)
+
+    with _run_sessions(sessions, source_connection_string, destination_connection_string, airflow_connection_string,
+                       max_workers) as sessions, \
+            ThreadPoolExecutor(max_workers=max_workers or 1) as executor:
+        # Check the freshness of the whole source schema in one query
+        freshness = extract_source_freshness(source_connection_string, source_schema, pool=sessions.mssql)
+        source_cache = cache['source'].setdefault(metadata_cache_key(source_connection_string, source_schema), {})
+
+        # Entries are keyed by object name; anything no longer present in the schema was dropped or renamed
+        for name in list(source_cache):
+            if name not in freshness:
+                del source_cache[name]
+
+        cache_names = {name: _cache_name(freshness, name) for name in list(source_tables) + list(source_views)}
+        stale_tables = [name for name in source_tables
+                        if not _is_source_entry_fresh(source_cache.get(cache_names[name]), cache_names[name],
+                                                      freshness, source_schema)]
+        stale_views = [name for name in source_views
+                       if not _is_source_entry_fresh(source_cache.get(cache_names[name]), cache_names[name],
+                                                     freshness, source_schema)]
+
+        # Re-extract only the objects that changed since the cached copy was taken
+        if stale_tables or stale_views:
+            source = extract_source_section(source_connection_string, source_schema, stale_tables, stale_views,
+                                            bulk_catalog, sessions, executor if max_workers else None, ddl_writer)
+
+            for name in stale_tables:
+                source_cache[cache_names[name]] = dict(
+                    freshness.get(cache_names[name], {'object_id': None, 'modify_date': None}),
+                    section=source['tables'][name])
+            for name in stale_views:
+                section = source['views'][name]
+                depends_on = {table: _referenced_modify_date(freshness, source_schema, table)
+                              for table in section['referenced_tables']}
+                source_cache[cache_names[name]] = dict(
+                    freshness.get(cache_names[name], {'object_id': None, 'modify_date': None}),
+                    section=section, depends_on=depends_on)
+
+        # Check the destination schema fingerprint and re-extract only the tables whose hash changed
+        fingerprints = extract_destination_fingerprints(destination_connection_string, destination_schema,
+                                                        pool=sessions.destination)
+        destination_cache = cache['destination'].setdefault(
+            metadata_cache_key(destination_connection_string, destination_schema), {})
+
+        for table_name in list(destination_cache):
+            if table_name not in fingerprints:
+                del destination_cache[table_name]
+
+        stale_destination = sorted(table_name for table_name, fingerprint in fingerprints.items()
+                                   if destination_cache.get(table_name, {}).get('fingerprint') != fingerprint)
+        if stale_destination:
+            for table_name, columns in iter_destination_catalog(destination_connection_string, destination_schema,
+                                                                pool=sessions.destination,
+                                                                table_names=stale_destination):
+                destination_cache[table_name] = {'fingerprint': fingerprints[table_name],
+                                                 'section': {'columns': columns}}
+
+        # The Airflow section is a single query and is always refreshed
+        airflow = extract_airflow_section(airflow_connection_string, sessions, dag_filter, run_stats_days)
+
+    save_metadata_cache(cache, cache_path)
+    print(f"Incremental run: {len(stale_tables)} tables, {len(stale_views)} views and "
+          f"{len(stale_destination)} destination tables re-extracted")
+
+    return merge_contract(load_contract(yaml_file_path), source_cache, freshness, source_tables, source_views,
+                          destination_cache, airflow)
+
+
+def load_contract(yaml_file_path):
+    if not os.path.exists(yaml_file_path):
+        return None
+
+    with open(yaml_file_path) as yaml_file:
+        return load_yaml(yaml_file)
+
+
+def merge_contract(existing_contract, source_cache, freshness, source_tables, source_views, destination_cache,
+                   airflow):
+    data_contract = existing_contract or {}
+    source = data_contract.setdefault('source', {})
+    tables = source.setdefault('tables', {}) or {}
+    views = source.setdefault('views', {}) or {}
+
+    # Drop entries for objects that no longer exist under that name, then overlay the requested ones
+    source['tables'] = {name: section for name, section in tables.items() if freshness.resolve(name) is not None}
+    source['views'] = {name: section for name, section in views.items() if freshness.resolve(name) is not None}
+    for name in source_tables:
+        source['tables'][name] = source_cache[_cache_name(freshness, name)]['section']
+    for name in source_views:
+        source['views'][name] = source_cache[_cache_name(freshness, name)]['section']
+
+    # The destination section always mirrors the whole destination schema
+    data_contract['destination'] = {table_name: entry['section']
+                                    for table_name, entry in sorted(destination_cache.items())}
+    data_contract['airflow'] = airflow
 
+    return data_contract
 
-def generate_yaml_from_ddl(source_connection_string, destination_connection_string, airflow_connection_string,
-                           source_schema, destination_schema, source_tables, source_views):
-    data_contract = {
-        'source': {
-            'tables': {},
-            'views': {},
-        },
-        'destination': {},
-        'airflow': {'dags': {}},
-    }
 
-    # Extract metadata for source tables
-    for table_name in source_tables:
-        columns, _ = extract_metadata_from_mssql(source_connection_string, table_name, source_schema, is_view=False)
-        data_contract['source']['tables'][table_name] = {'columns': columns}
+# Source objects a streaming run extracts together; the catalog snapshot and parsed view definitions of one
+# batch are dropped before the next batch is read
+STREAMING_BATCH_SIZE = 1000
 
-    # Extract metadata for source views
-    for view_name in source_views:
-        columns, tables = extract_metadata_from_mssql(source_connection_string, view_name, source_schema, is_view=True)
 
-        # Extract data types from referenced tables
-        data_types = extract_data_types_from_tables(source_connection_string, source_schema, tables)
+def generate_yaml_streaming(source_connection_string, destination_connection_string, airflow_connection_string,
+                            source_schema, destination_schema, source_tables, source_views, yaml_file_path,
+                            shard=False, bulk_catalog=False, sessions=None, max_workers=None, dag_filter=None,
+                            run_stats_days=None, writer=None, ddl_writer=None, batch_size=STREAMING_BATCH_SIZE):
+    # Each section is written as soon as it is extracted, in the sorted key order save_yaml produces, so
+    # the output matches a full dump while memory stays flat. Source objects are extracted batch_size at a
+    # time, so peak memory follows the batch rather than the contract. With shard=True yaml_file_path is a
+    # directory that receives one file per object plus an index file. A given writer, such as the
+    # metadata catalog's, receives the sections instead of yaml_file_path.
+    with _run_sessions(sessions, source_connection_string, destination_connection_string, airflow_connection_string,
+                       max_workers) as sessions, \
+            _contract_writer(writer, yaml_file_path, shard) as writer, \
+            ThreadPoolExecutor(max_workers=max_workers or 1) as executor:
+        object_executor = executor if max_workers and max_workers > 1 else None
+        window = 2 * (max_workers or 1)
 
-        # Use data types to populate the columns in the data contract
-        columns_with_types = []
+        writer.write((), 'airflow', extract_airflow_section(airflow_connection_string, sessions, dag_filter,
+                                                            run_stats_days))
 
-        for col_info in columns:
-            if isinstance(col_info, dict):
-                col_name = col_info['name']
-                col_type = 'UNKNOWN'
+        # The catalog query orders destination tables by code point, the order save_yaml sorts keys in
+        writer.open_mapping(('destination',))
+        for table_name, columns in iter_destination_catalog(destination_connection_string, destination_schema,
+                                                            pool=sessions.destination):
+            writer.write(('destination',), table_name, {'columns': columns})
 
-                for table in tables:
-                    if table in data_types and col_name in data_types[table]:
-                        col_type = data_types[table][col_name]
-                        break
+        writer.open_mapping(('source', 'tables'))
+        _write_in_batches(writer, ('source', 'tables'), sorted(set(source_tables)), batch_size, object_executor, window,
+                          lambda batch: _source_extractors(source_connection_string, source_schema, bulk_catalog,
+                                                           sessions, batch, (), ddl_writer)[0])
 
-                columns_with_types.append({'name': col_name, 'type': col_type})
+        writer.open_mapping(('source', 'views'))
+        _write_in_batches(writer, ('source', 'views'), sorted(set(source_views)), batch_size, object_executor, window,
+                          lambda batch: _source_extractors(source_connection_string, source_schema, bulk_catalog,
+                                                           sessions, (), batch, ddl_writer)[1])
 
-        data_contract['source']['views'][view_name] = {'columns': columns_with_types, 'referenced_tables': tables}
 
-    # Extract metadata from Airflow
-    airflow_metadata = extract_metadata_from_airflow(airflow_connection_string)
-    for dag_id, dag_info in airflow_metadata['dags'].items():
-        data_contract['airflow']['dags'][dag_id] = {
-            'is_active': dag_info['is_active'],
-            'schedule_interval': dag_info['schedule_interval'],
-            # 'human_readable_schedule': dag_info['human_readable_schedule'],
-        }
+def _write_in_batches(writer, path, object_names, batch_size, executor, window, batch_extractor):
+    # The extractor of a batch, and the catalog snapshot it holds, is released before the next batch is read
+    for start in range(0, len(object_names), batch_size):
+        batch = object_names[start:start + batch_size]
+        for object_name, section in _iter_objects(executor, batch_extractor(batch), batch, window):
+            writer.write(path, object_name, section)
 
-    # Extract metadata from Postgres (destination)
-    for table_name in extract_table_names_from_postgres(destination_connection_string, destination_schema):
-        columns = extract_metadata_from_postgres(destination_connection_string, destination_schema, table_name)
-        data_contract['destination'][table_name] = {'columns': columns}
 
-    return data_contract
+@contextmanager
+def _contract_writer(writer, yaml_file_path, shard=False):
+    # A caller-provided writer is left open for the caller; otherwise the run writes the YAML file itself
+    if writer is not None:
+        yield writer
+        return
+
+    with open_contract_writer(yaml_file_path, shard=shard) as owned_writer:
+        yield owned_writer
 
+
+@timed_phase('emit')
 def save_yaml(data_contract, yaml_file_path):
     with open(yaml_file_path, 'w') as yaml_file:
-        yaml.dump(data_contract, yaml_file, default_flow_style=False)
+        dump_yaml(data_contract, yaml_file)
+    get_metrics().count('bytes_written', os.path.getsize(yaml_file_path))
      
-# Replace the placeholders with your actual SQL Server and Postgres connection details
-source_server = 'server_address'
-source_database = 'server_database'
-source_schema = 'server_schema'
-source_username = 'server_username'
-source_password = 'server_password'
-
-destination_server = 'destination_server_address'
-destination_database = 'destination_database_name'
-destination_username = 'destination_username'
-destination_password = 'destination_password'
-destination_schema = 'destination_schema'
-
-airflow_server = 'airflow_server_address'
-airflow_database = 'airflow'
-airflow_username = 'airflow'
-airflow_password = 'airflow'
-   
-# Create the MSSQL connection string for source
-source_connection_string = f'DRIVER={{SQL Server}};SERVER={source_server};DATABASE={source_database};UID={source_username};PWD={source_password}'
-
-# Create the Postgres connection string for destination
-# Adjust the connection string based on your Postgres setup
-destination_connection_string = f"host={destination_server} dbname={destination_database} user={destination_username} password={destination_password}"
-
-# Create the Airflow connection string
-# Adjust the connection string based on your Airflow database setup
-airflow_connection_string = f"host={airflow_server} dbname={airflow_database} user={airflow_username} password={airflow_password}"
-
-# Specify the source tables and views
-source_tables = []
-
-source_views = []
-
-# Specify the full path for the YAML file
-yaml_file_path = '/path/to/yaml_file.yaml'
-
-# Generate and save the YAML data contract
-yaml_data_contract = generate_yaml_from_ddl(
-    source_connection_string,
-    destination_connection_string,
-    airflow_connection_string,
-    source_schema,
-    destination_schema,
-    source_tables,
-    source_views
-)
-save_yaml(yaml_data_contract, yaml_file_path)
\ No newline at end of file
+# Run configuration. A config file passed to the command line overrides any of these keys; replace the
+# placeholders with your actual SQL Server and Postgres connection details
+DEFAULT_CONFIG = {
+    'source_server': 'server_address',
+    'source_database': 'server_database',
+    'source_schema': 'server_schema',
+    'source_username': 'server_username',
+    'source_password': 'server_password',
+
+    'destination_server': 'destination_server_address',
+    'destination_database': 'destination_database_name',
+    'destination_username': 'destination_username',
+    'destination_password': 'destination_password',
+    'destination_schema': 'destination_schema',
+
+    'airflow_server': 'airflow_server_address',
+    'airflow_database': 'airflow',
+    'airflow_username': 'airflow',
+    'airflow_password': 'airflow',
+
+    # Specify the source tables and views
+    'source_tables': [],
+    'source_views': [],
+
+    # Only DAGs matching any of these are read from Airflow, e.g. {'dag_ids': [...], 'prefixes': [...],
+    # 'tags': [...], 'tables': [...]}; tables match DAGs producing a dataset whose URI names the table.
+    # An empty filter reads every DAG, and so does a tables filter on Airflow older than 2.4, which has no datasets.
+    'airflow_dag_filter': {},
+    # Also match DAGs linked to the contract's source tables and views
+    'airflow_dags_linked_to_contract': False,
+    # Run statistics (last success, p50/p95 duration, failure rate) over this many days fill the Airflow
+    # section's slaProperties, e.g. 30; None skips the dag_run query
+    'airflow_run_stats_days': None,
+
+    # Specify the full path for the YAML file
+    'yaml_file_path': '/path/to/yaml_file.yaml',
+
+    # Number of worker threads for concurrent extraction (None or 1 extracts everything in order)
+    'max_workers': 8,
+
+    # Incremental mode re-extracts only objects changed since the last run and merges them into the
+    # existing YAML file; per-object metadata is kept in the cache file between runs
+    'incremental': False,
+    'metadata_cache_path': 'contract_metadata_cache.json',
+
+    # View definitions are read in one streamed query and written here as they are parsed: a single script,
+    # or with view_ddl_per_object a directory with one .sql file per object and a manifest.json. None skips
+    # the export. Stored procedure and function definitions are added with export_routine_definitions.
+    'view_ddl_path': 'view_ddl.txt',
+    'view_ddl_per_object': False,
+    # Each run appends its definitions to the view_ddl_path script; True replaces the script instead
+    'view_ddl_overwrite': False,
+    'export_routine_definitions': False,
+
+    # Local SQLite catalog the extracted contract is stored in, under the base name of yaml_file_path; the YAML
+    # file is then rendered from the catalog. The catalog command answers lineage and impact questions across
+    # every stored contract and re-renders contracts without database access. None writes the YAML directly.
+    'catalog_path': None,
+
+    # Streaming mode writes each section as soon as it is extracted instead of building the whole contract
+    # in memory; sharding turns yaml_file_path into a directory with one file per object and an index
+    'stream_output': False,
+    'shard_output': False,
+
+    # Per-phase timings, query latency histograms and row/round-trip/byte counts are written here after the
+    # run: a JSON report, or a Prometheus textfile when the path ends in .prom
+    'metrics_report_path': None,
+    # Fraction of queries logged verbatim with their latency and result columns (0 disables query logging)
+    'query_log_sample_rate': 0.0,
+}
+
+
+def build_source_connection_string(config):
+    # Create the MSSQL connection string for source
+    return (f"DRIVER={{SQL Server}};SERVER={config['source_server']};DATABASE={config['source_database']};"
+            f"UID={config['source_username']};PWD={config['source_password']}")
+
+
+def build_destination_connection_string(config):
+    # Create the Postgres connection string for destination
+    # Adjust the connection string based on your Postgres setup
+    return (f"host={config['destination_server']} dbname={config['destination_database']} "
+            f"user={config['destination_username']} password={config['destination_password']}")
+
+
+def build_airflow_connection_string(config):
+    # Create the Airflow connection string
+    # Adjust the connection string based on your Airflow database setup
+    return (f"host={config['airflow_server']} dbname={config['airflow_database']} "
+            f"user={config['airflow_username']} password={config['airflow_password']}")
+
+
+def run(config=None):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    metrics = start_run(query_log_sample_rate=config['query_log_sample_rate'])
+
+    source_connection_string = build_source_connection_string(config)
+    destination_connection_string = build_destination_connection_string(config)
+    airflow_connection_string = build_airflow_connection_string(config)
+
+    source_schema = config['source_schema']
+    destination_schema = config['destination_schema']
+    source_tables = config['source_tables']
+    source_views = config['source_views']
+    yaml_file_path = config['yaml_file_path']
+    max_workers = config['max_workers']
+    incremental = config['incremental']
+    stream_output = config['stream_output']
+
+    dag_filter = dict(config['airflow_dag_filter'] or {})
+    if config['airflow_dags_linked_to_contract']:
+        dag_filter['tables'] = list(dag_filter.get('tables', [])) + list(source_tables) + list(source_views)
+    airflow_options = {'dag_filter': dag_filter, 'run_stats_days': config['airflow_run_stats_days']}
+
+    catalog = open_catalog(config['catalog_path']) if config['catalog_path'] else None
+    catalog_options = {'server': config['source_server'], 'database': config['source_database'],
+                       'schema': source_schema}
+
+    # A catalog that cannot be read fails the run with status 2 rather than leaving sections out of the contract
+    try:
+        # Generate and save the YAML data contract, reusing one set of pooled connections for the whole run
+        with ContractSessions(source_connection_string, destination_connection_string, airflow_connection_string,
+                              pool_size=max_workers or 1) as sessions, \
+                open_definition_writer(config['view_ddl_path'], per_object=config['view_ddl_per_object'],
+                                       overwrite=config['view_ddl_overwrite']) as ddl_writer:
+            if config['export_routine_definitions'] and ddl_writer is not None:
+                export_routine_definitions(source_connection_string, source_schema, ddl_writer, pool=sessions.mssql)
+
+            if incremental:
+                yaml_data_contract = generate_yaml_incremental(
+                    source_connection_string,
+                    destination_connection_string,
+                    airflow_connection_string,
+                    source_schema,
+                    destination_schema,
+                    source_tables,
+                    source_views,
+                    yaml_file_path,
+                    config['metadata_cache_path'],
+                    bulk_catalog=True,
+                    sessions=sessions,
+                    max_workers=max_workers,
+                    ddl_writer=ddl_writer,
+                    **airflow_options
+                )
+            elif stream_output and catalog is not None:
+                with CatalogContractWriter(catalog, contract_name(yaml_file_path), path=yaml_file_path,
+                                           **catalog_options) as writer:
+                    generate_yaml_streaming(
+                        source_connection_string,
+                        destination_connection_string,
+                        airflow_connection_string,
+                        source_schema,
+                        destination_schema,
+                        source_tables,
+                        source_views,
+                        yaml_file_path,
+                        bulk_catalog=True,
+                        sessions=sessions,
+                        max_workers=max_workers,
+                        writer=writer,
+                        ddl_writer=ddl_writer,
+                        **airflow_options
+                    )
+            elif stream_output:
+                generate_yaml_streaming(
+                    source_connection_string,
+                    destination_connection_string,
+                    airflow_connection_string,
+                    source_schema,
+                    destination_schema,
+                    source_tables,
+                    source_views,
+                    yaml_file_path,
+                    shard=config['shard_output'],
+                    bulk_catalog=True,
+                    sessions=sessions,
+                    max_workers=max_workers,
+                    ddl_writer=ddl_writer,
+                    **airflow_options
+                )
+            else:
+                yaml_data_contract = generate_yaml_from_ddl(
+                    source_connection_string,
+                    destination_connection_string,
+                    airflow_connection_string,
+                    source_schema,
+                    destination_schema,
+                    source_tables,
+                    source_views,
+                    bulk_catalog=True,
+                    sessions=sessions,
+                    max_workers=max_workers,
+                    ddl_writer=ddl_writer,
+                    **airflow_options
+                )
+
+            if catalog is not None:
+                # The contract goes through the catalog and the YAML file is rendered back from it
+                if not stream_output or incremental:
+                    store_contract(catalog, contract_name(yaml_file_path), yaml_data_contract, path=yaml_file_path,
+                                   **catalog_options)
+                render_contract(catalog, contract_name(yaml_file_path), yaml_file_path,
+                                shard=stream_output and not incremental and config['shard_output'])
+                catalog.close()
+            elif not stream_output or incremental:
+                save_yaml(yaml_data_contract, yaml_file_path)
+
+            # Report how many connections were opened versus served from the pools
+            for source_name, counters in sessions.stats().items():
+                print(f"{source_name} connections: {counters['opened']} opened, {counters['reused']} reused")
+    except (pyodbc.Error, psycopg2.Error) as e:
+        print(f"Error generating contract: {e}")
+        return 2
+
+    print(metrics.summary())
+    if config['metrics_report_path']:
+        metrics.write_report(config['metrics_report_path'])
+
+
+if __name__ == '__main__':
+    from data_contract_cli import main
+    sys.exit(main(['generate'] + sys.argv[1:]))
@@ -1,242 +1,782 @@
-import pyodbc
-import re
-import yaml
+import json
+import math
+import os
+import sys
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-# Replace these values with your MSSQL connection details
-SERVER = 'server_name'
-DATABASE = 'database_name'
-USERNAME = 'username'
-PASSWORD = 'password'
-DRIVER = 'ODBC Driver 17 for SQL Server'
-
-# Establish a connection
-connection_string = f'DRIVER={DRIVER};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
-connection = pyodbc.connect(connection_string)
-cursor = connection.cursor()
-
-# Dictionary of schema names and associated views (empty list implies all views)
-# The following is a sample for the AdventureWorks database
-
-# SCHEMA_VIEWS = {
-#     'Person': [
-#         'vStateProvinceCountryRegion'
-#     ],
-#     'HumanResources': [],
-#     'Sales': []
-# }
-
-SCHEMA_VIEWS = {
-    'Person': [
-        'vStateProvinceCountryRegion'
-    ],
-    'HumanResources': [],
-    'Sales': []
-}
+from column_records import NameIndex, ViewColumn, fold_name, intern_string
+from contract_yaml import UNSAFE_FILE_CHARACTERS, load_yaml, open_contract_writer
+from drivers import pyodbc, supports_openjson
+from metadata_catalog import CatalogContractWriter, contract_name, open_catalog, render_contract
+from run_metrics import connect_instrumented, get_metrics, phase, start_run, timed_phase
+from table_profiler import TableProfiler, column_tags
 
-# Initialize the metadata dictionary
-metadata = OrderedDict()
-
-# Fetch view columns metadata
-for schema, views in SCHEMA_VIEWS.items():
-    # If views list is empty, fetch all views for the schema
-    if not views:
-        cursor.execute(f"SELECT TABLE_NAME FROM INFORMATION_SCHEMA.VIEWS WHERE TABLE_SCHEMA = '{schema}'")
-        views = [row.TABLE_NAME for row in cursor.fetchall()]
-    
-    for view in views:
-        try:
-        
-            # Get the DDL of the view
-            cursor.execute(f"SELECT OBJECT_DEFINITION(OBJECT_ID('{schema}.{view}')) AS ViewDDL")
-            view_ddl = cursor.fetchone().ViewDDL
-            
-            # Extract referenced tables from the DDL using regex
-            if view_ddl is not None:
-                referenced_tables = re.findall(fr'\[{schema}\]\.\[(.*?)\]', view_ddl)
-
-                # Maintain a set of processed columns for each table
-                processed_columns = {}
+# Every view with the objects it references, straight from the server's dependency tracking instead of
+# scanning the DDL text. Unqualified references are resolved to their actual schema where SQL Server
+# could bind them, and views without any dependency still appear once so their existence can be checked.
+# References to other databases and ones the server could not bind come back without a type; they are
+# reported in the run metrics rather than dropped.
+VIEW_DEPENDENCIES_QUERY = """
+    SELECT DISTINCT
+        SCHEMA_NAME(v.schema_id) AS ViewSchema,
+        v.name AS ViewName,
+        COALESCE(OBJECT_SCHEMA_NAME(d.referenced_id), d.referenced_schema_name,
+                 CASE WHEN d.referenced_database_name IS NULL THEN SCHEMA_NAME(v.schema_id) END)
+            AS ReferencedSchema,
+        COALESCE(OBJECT_NAME(d.referenced_id), d.referenced_entity_name) AS ReferencedName,
+        r.type AS ReferencedType,
+        d.referenced_server_name AS ReferencedServer,
+        d.referenced_database_name AS ReferencedDatabase
+    FROM sys.views AS v
+    {view_filter}
+    LEFT JOIN sys.sql_expression_dependencies AS d ON d.referencing_id = v.object_id
+                                                  AND d.referenced_class = 1
+    LEFT JOIN sys.objects AS r ON r.object_id = d.referenced_id
+    ORDER BY ViewSchema, ViewName, ReferencedSchema, ReferencedName
+"""
 
-                # Fetch columns metadata for each referenced table
-                for table in referenced_tables:
-                    # Skip the view itself
-                    if table == view:
-                        continue
+# Filters are passed as a single JSON parameter so the query text stays the same for any number of names.
+# OPENJSON needs SQL Server 2016 and compatibility level 130; without it each schema or view is read on its own.
+VIEW_SCHEMA_FILTER = "JOIN OPENJSON(?) AS f ON f.value = SCHEMA_NAME(v.schema_id)"
+VIEW_OBJECT_FILTER = """JOIN OPENJSON(?) WITH (SchemaName sysname '$[0]', ViewName sysname '$[1]') AS f
+        ON f.SchemaName = SCHEMA_NAME(v.schema_id) AND f.ViewName = v.name"""
+VIEW_SCHEMA_NAME_FILTER = "JOIN sys.schemas AS fs ON fs.schema_id = v.schema_id AND fs.name = ?"
+VIEW_NAME_FILTER = "JOIN sys.schemas AS fs ON fs.schema_id = v.schema_id AND fs.name = ? AND v.name = ?"
+
+
+@timed_phase('catalog_fetch')
+def load_view_dependencies(cursor, schemas=None, views=None, openjson=True):
+    # Build the adjacency index {(schema, view): [(schema, object, type), ...]} in one round trip, or one per
+    # schema or view without OPENJSON. Objects in other databases are named [server.]database.schema.
+    if not openjson:
+        filters = ([(VIEW_NAME_FILTER, tuple(view)) for view in views] if views is not None
+                   else [(VIEW_SCHEMA_NAME_FILTER, (schema,)) for schema in schemas])
+    elif views is not None:
+        filters = [(VIEW_OBJECT_FILTER, (json.dumps([list(view) for view in views]),))]
+    else:
+        filters = [(VIEW_SCHEMA_FILTER, (json.dumps(list(schemas)),))]
+
+    dependency_index = NameIndex()
+    for view_filter, params in filters:
+        cursor.execute(VIEW_DEPENDENCIES_QUERY.format(view_filter=view_filter), *params)
+        for row in cursor.fetchall():
+            view_schema, view_name, referenced_schema, referenced_name, referenced_type, server, database = row
+            edges = dependency_index.setdefault((view_schema, view_name), [])
+            if referenced_name is None:
+                continue
+            if database is not None:
+                referenced_schema = '.'.join([part for part in (server, database) if part] + [referenced_schema or ''])
+            edges.append((referenced_schema, referenced_name, referenced_type.strip() if referenced_type else None))
+
+    return dependency_index
+
+
+@timed_phase('resolve')
+def resolve_base_tables(cursor, dependency_index, schema, view, openjson=True):
+    # Walk view-on-view chains level by level down to base tables. Views outside the preloaded schemas
+    # are fetched in one batch per level, and the seen set stops cycles and repeated diamonds. Referenced
+    # names are spelled as the view definition writes them, so they are matched ignoring case. References
+    # without a type cannot be followed and are recorded in the run metrics.
+    base_tables = []
+    seen = {fold_name((schema, view))}
+    pending = [(schema, view)]
+
+    while pending:
+        missing = [node for node in pending if dependency_index.resolve(node) is None]
+        if missing:
+            dependency_index.update(load_view_dependencies(cursor, views=missing, openjson=openjson))
+            for node in missing:
+                if dependency_index.resolve(node) is None:
+                    dependency_index[node] = []
+
+        next_level = []
+        for node in pending:
+            for referenced_schema, referenced_name, referenced_type in dependency_index.lookup(node):
+                key = (referenced_schema, referenced_name)
+                if fold_name(key) in seen:
+                    continue
+                seen.add(fold_name(key))
+                if referenced_type == 'V':
+                    next_level.append(key)
+                elif referenced_type == 'U':
+                    base_tables.append(key)
+                elif referenced_type is None:
+                    get_metrics().record_unresolved_reference('.'.join(node), '.'.join(key))
+        pending = next_level
+
+    return base_tables
+
+
+# Common Table Expression (CTE) to get the columns and data types from tables. It returns exactly one
+# row per column: the primary key flag comes from the table's primary key index only, so a column that
+# belongs to several indexes is not repeated. MaxLength is decided on the base system type so alias types
+# behave like their underlying type: nvarchar/nchar lengths are stored in bytes and halved, -1 means MAX,
+# decimal/numeric report precision and scale, and types without a declared length return NULL.
+TABLE_COLUMNS_QUERY = """
+    WITH TableColumns AS (
+        SELECT
+            SCHEMA_NAME(t.schema_id) AS SchemaName,
+            t.name AS TableName,
+            c.column_id AS ColumnId,
+            c.name AS ColumnName,
+            ty.name AS DataType,
+            CASE
+                WHEN TYPE_NAME(c.system_type_id) IN ('varchar', 'char', 'nvarchar', 'nchar', 'varbinary', 'binary')
+                     AND c.max_length = -1 THEN 'max'
+                WHEN TYPE_NAME(c.system_type_id) IN ('nvarchar', 'nchar') THEN CAST(c.max_length / 2 AS VARCHAR(10))
+                WHEN TYPE_NAME(c.system_type_id) IN ('varchar', 'char', 'varbinary', 'binary')
+                    THEN CAST(c.max_length AS VARCHAR(10))
+                WHEN TYPE_NAME(c.system_type_id) IN ('decimal', 'numeric')
+                    THEN CAST(c.precision AS VARCHAR(10)) + ',' + CAST(c.scale AS VARCHAR(10))
+            END AS MaxLength,
+            CAST(CASE WHEN pk.column_id IS NULL THEN 0 ELSE 1 END AS BIT) AS IsPrimaryKey,
+            c.is_nullable AS IsNullable,
+            CAST(ep.value AS NVARCHAR(MAX)) AS ColumnDescription
+        FROM
+            sys.objects AS t
+        JOIN
+            sys.columns AS c ON t.object_id = c.object_id
+        JOIN
+            sys.types AS ty ON c.system_type_id = ty.system_type_id
+                            AND c.user_type_id = ty.user_type_id
+        LEFT JOIN (
+            SELECT ic.object_id, ic.column_id
+            FROM sys.indexes AS i
+            JOIN sys.index_columns AS ic ON ic.object_id = i.object_id
+                                        AND ic.index_id = i.index_id
+            WHERE i.is_primary_key = 1
+        ) AS pk ON pk.object_id = c.object_id
+               AND pk.column_id = c.column_id
+        LEFT JOIN
+            sys.extended_properties AS ep ON ep.class = 1
+                                        AND t.object_id = ep.major_id
+                                        AND c.column_id = ep.minor_id
+                                        AND ep.name = 'MS_Description'
+        WHERE
+            {table_filter}
+    )
+    SELECT
+        SchemaName,
+        TableName,
+        ColumnName,
+        DataType,
+        MaxLength,
+        IsPrimaryKey,
+        IsNullable,
+        ColumnDescription
+    FROM
+        TableColumns
+    ORDER BY
+        SchemaName,
+        TableName,
+        ColumnId
+"""
 
-                    # Common Table Expression (CTE) to get the columns and data types from tables
-                    query = f"""
-                        WITH TableColumns AS (
-                            SELECT
-                                t.name AS TableName,
-                                c.name AS ColumnName,
-                                ty.name AS DataType,
-                                CASE
-                                    WHEN ty.name IN ('varchar', 'char', 'nvarchar', 'nchar') THEN c.max_length / 2
-                                    ELSE c.max_length
-                                END AS MaxLength,
-                                ic.column_id AS IsPrimaryKey,
-                                c.is_nullable AS IsNullable,
-                                CAST(ep.value AS NVARCHAR(MAX)) AS ColumnDescription
-                            FROM
-                                sys.objects AS t
-                            JOIN
-                                sys.columns AS c ON t.object_id = c.object_id
-                            JOIN
-                                sys.types AS ty ON c.system_type_id = ty.system_type_id
-                                                AND c.user_type_id = ty.user_type_id
-                            LEFT JOIN
-                                sys.index_columns AS ic ON t.object_id = ic.object_id
-                                                    AND c.column_id = ic.column_id
-                            LEFT JOIN
-                                sys.extended_properties AS ep ON t.object_id = ep.major_id
-                                                            AND c.column_id = ep.minor_id
-                                                            AND ep.name = 'MS_Description'
-                            WHERE
-                                t.name = '{table}' AND t.schema_id = SCHEMA_ID('{schema}')
-                        )
-                        SELECT
-                            TableName,
-                            ColumnName,
-                            DataType,
-                            MaxLength,
-                            IsPrimaryKey,
-                            IsNullable,
-                            ColumnDescription
-                        FROM
-                            TableColumns
-                    """
-
-                    print(f"Executing query: {query}")
-
-                    cursor.execute(query)
-
-                    # Print details of each row before fetchall
-                    for column_info in cursor.description:
-                        print(f"Column: {column_info[0]}, Type: {column_info[1]}")
-
-                    rows = cursor.fetchall()
+TABLE_FILTER = "t.name = ? AND t.schema_id = SCHEMA_ID(?)"
+TABLE_LIST_FILTER = """EXISTS (
+                SELECT 1
+                FROM OPENJSON(?) WITH (SchemaName sysname '$[0]', TableName sysname '$[1]') AS f
+                WHERE f.SchemaName = SCHEMA_NAME(t.schema_id) AND f.TableName = t.name
+            )"""
+
+
+def table_column_row(row):
+    # Cached rows drop the schema; the table name and data type repeat on every row and are interned
+    _, table_name, column_name, data_type, max_length, is_primary_key, is_nullable, column_description = row
+    return (intern_string(table_name), column_name, intern_string(data_type), max_length, is_primary_key,
+            is_nullable, column_description)
+
+
+class TableMetadataCache:
+    # Column rows per (schema, table), shared by every view of a run so heavily reused dimension tables
+    # are queried once. Least recently used tables are evicted beyond maxsize.
+    def __init__(self, cursor, maxsize=1024):
+        self.cursor = cursor
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, schema, table):
+        key = (schema, table)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        with phase('catalog_fetch'):
+            self.cursor.execute(TABLE_COLUMNS_QUERY.format(table_filter=TABLE_FILTER), table, schema)
+            rows = [table_column_row(row) for row in self.cursor.fetchall()]
+        self._store(key, rows)
+        return rows
+
+    @timed_phase('catalog_fetch')
+    def prefetch(self, tables):
+        # Warm the cache for many tables with a single query; tables without columns are cached as empty
+        keys = [key for key in dict.fromkeys(tables) if key not in self._entries]
+        if not keys:
+            return
+
+        self.cursor.execute(TABLE_COLUMNS_QUERY.format(table_filter=TABLE_LIST_FILTER),
+                            json.dumps([list(key) for key in keys]))
+
+        grouped = OrderedDict((key, []) for key in keys)
+        for row in self.cursor.fetchall():
+            grouped.setdefault((row[0], row[1]), []).append(table_column_row(row))
+        for key, rows in grouped.items():
+            self._store(key, rows)
+
+    def _store(self, key, rows):
+        self._entries[key] = rows
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}
+
+
+def iter_view_metadata(view_tables, table_cache, profiler=None):
+    # Yield each view's section as soon as its tables are processed so it can be written out immediately.
+    # With a profiler, column tags carry the profile of the referenced table's column.
+    emitted = set()
+
+    for (schema, view), referenced_tables in view_tables.items():
+        try:
+            if referenced_tables is None:
+                print(f"View {schema}.{view} does not exist. Skipping.")
+                continue
 
+            with phase('resolve'):
+                view_metadata = {'tables_referenced': {}}
+
+                # Fetch columns metadata for each referenced table
+                for table_schema, table in referenced_tables:
+                    rows = table_cache.get(table_schema, table)
+                    profile = profiler.get(table_schema, table) if profiler else None
                     for row in rows:
                         table_name, column_name, data_type, max_length, is_primary_key, is_nullable, column_description = row
 
-                        if view not in metadata:
-                            metadata[view] = {'tables_referenced': {}}
-
-                        if table_name not in metadata[view]['tables_referenced']:
-                            metadata[view]['tables_referenced'][table_name] = {'description': None, 'columns': []}
-
-                        # Check if the column has been processed for this table
-                        if column_name not in processed_columns.get(table_name, set()):
-                            metadata[view]['tables_referenced'][table_name]['columns'].append({
-                                'column': column_name,
-                                'isPrimaryKey': bool(is_primary_key),
-                                'isNullable': bool(is_nullable),
-                                'logicalType': data_type,
-                                'physicalType': f"{data_type}({max_length})" if max_length else data_type,
-                                'tags': None,
-                                'description': column_description
-                            })
-
-                            # Add the column to the set of processed columns for this table
-                            processed_columns.setdefault(table_name, set()).add(column_name)
-                            
-            else:
-                print(f"View {schema}.{view} does not exist or DDL is empty. Skipping.")
-                
-        except pyodbc.Error as e:
-                # Handle the error and continue to the next view
-                print(f"Error processing view {schema}.{view}: {str(e)}")
-                continue
+                        # Tables from other schemas are qualified so they cannot collide with local ones
+                        if table_schema != schema:
+                            table_name = f"{table_schema}.{table_name}"
 
-# Close the cursor and connection
-cursor.close()
-connection.close()
-
-# Define a custom representer to avoid !!python/object/apply tag
-def ordered_dict_representer(dumper, data):
-    return dumper.represent_dict(data.items())
-
-# Add the custom representer to the YAML dumper
-yaml.add_representer(OrderedDict, ordered_dict_representer)
-
-# Save the metadata to a YAML file
-metadata_output_path = 'output/mssql_metadata_output.yaml'
-with open(metadata_output_path, 'w') as metadata_file:
-    yaml.dump(metadata, metadata_file, default_flow_style=False)
-
-print(f"Metadata saved to {metadata_output_path}")
-
-# Now, incorporate the metadata into the main YAML structure
-main_metadata = OrderedDict({
-    "datasetDomain": None,
-    "quantumName": None,
-    "userConsumptionMode": None,
-    "version": None,
-    "status": None,
-    "uuid": None,
-    "description": {
-        "purpose": None,
-        "limitations": None,
-        "usage": None
-    },
-    "tenant": None,
-    "productDl": None,
-    "productSlackChannel": None,
-    "productFeedbackUrl": None,
-    "sourcePlatform": None,
-    "sourceSystem": None,
-    "datasetProject": None,
-    "datasetName": None,
-    "kind": None,
-    "apiVersion": None,
-    "type": None,
-    "driver": None,
-    "driverVersion": None,
-    "server": None,
-    "database": None,
-    "username": None,
-    "password": None,
-    "schedulerAppName": None,
-    "dataset": [
-        {
-            "views": metadata
-        }
-    ],
-    "price": {
-        "priceAmount": None,
-        "priceCurrency": None,
-        "priceUnit": None
-    },
-    "stakeholders": [
-        {
-            "username": None,
-            "role": None,
-            "dateIn": None,
-            "dateOut": None,
-            "replacedByUsername": None
+                        if table_name not in view_metadata['tables_referenced']:
+                            view_metadata['tables_referenced'][table_name] = {'description': None, 'columns': []}
+
+                        # The query returns one row per column, so no client-side deduplication is needed
+                        view_metadata['tables_referenced'][table_name]['columns'].append(ViewColumn(
+                            column=column_name,
+                            isPrimaryKey=bool(is_primary_key),
+                            isNullable=bool(is_nullable),
+                            logicalType=data_type,
+                            physicalType=f"{data_type}({max_length})" if max_length else data_type,
+                            tags=column_tags(profile['columns'].get(column_name)) if profile else None,
+                            description=column_description
+                        ))
+
+        except Exception as e:
+            # Handle the error and continue to the next view
+            print(f"Error processing view {schema}.{view}: {str(e)}")
+            continue
+
+        if view_metadata['tables_referenced']:
+            # A view name already written for another schema is qualified to keep the keys unique
+            view_key = view if view not in emitted else f"{schema}.{view}"
+            emitted.add(view_key)
+            yield view_key, view_metadata
+
+
+def contract_template():
+    # Main YAML structure of the contract; the views of the dataset are streamed in at write time
+    return OrderedDict({
+        "datasetDomain": None,
+        "quantumName": None,
+        "userConsumptionMode": None,
+        "version": None,
+        "status": None,
+        "uuid": None,
+        "description": {
+            "purpose": None,
+            "limitations": None,
+            "usage": None
         },
-    ],
-    "roles": [
-        {
-            "role": None,
-            "access": None,
-            "firstLevelApprovers": None,
-            "secondLevelApprovers": None
+        "tenant": None,
+        "productDl": None,
+        "productSlackChannel": None,
+        "productFeedbackUrl": None,
+        "sourcePlatform": None,
+        "sourceSystem": None,
+        "datasetProject": None,
+        "datasetName": None,
+        "kind": None,
+        "apiVersion": None,
+        "type": None,
+        "driver": None,
+        "driverVersion": None,
+        "server": None,
+        "database": None,
+        "username": None,
+        "password": None,
+        "schedulerAppName": None,
+        "dataset": [
+            {
+                "views": None
+            }
+        ],
+        "price": {
+            "priceAmount": None,
+            "priceCurrency": None,
+            "priceUnit": None
         },
-    ],
-    "slaDefaultColumn": None,
-    "slaProperties": [
-        {"property": None, "value": None, "unit": None, "column": None},
-    ],
-    "tags": None,
-    "systemInstance": None,
-    "contractCreatedTs": None
-    })
-
-# Save the final metadata to a YAML file
-output_path = 'output/mssql_gen_data_contract_v2.yaml'
-with open(output_path, 'w') as yaml_file:
-    yaml.dump(main_metadata, yaml_file, default_flow_style=False, default_style=False)
-
-print(f"View columns metadata saved to {output_path}")
\ No newline at end of file
+        "stakeholders": [
+            {
+                "username": None,
+                "role": None,
+                "dateIn": None,
+                "dateOut": None,
+                "replacedByUsername": None
+            },
+        ],
+        "roles": [
+            {
+                "role": None,
+                "access": None,
+                "firstLevelApprovers": None,
+                "secondLevelApprovers": None
+            },
+        ],
+        "slaDefaultColumn": None,
+        "slaProperties": [
+            {"property": None, "value": None, "unit": None, "column": None},
+        ],
+        "tags": None,
+        "systemInstance": None,
+        "contractCreatedTs": None
+        })
+
+
+def write_contract(writer, template, views):
+    # Emit the template in order, streaming the views into dataset[0].views as they are produced
+    for key, value in template.items():
+        if key == 'dataset':
+            writer.open_mapping(('dataset', 0, 'views'))
+            for view_name, view_metadata in views:
+                writer.write(('dataset', 0, 'views'), view_name, view_metadata)
+        else:
+            writer.write((), key, value)
+
+
+def with_sla(template, views, profiler):
+    # slaDefaultColumn and slaProperties follow dataset in the template, so they are filled in once every
+    # view, and with it every table profile, has been written
+    yield from views
+    template['slaDefaultColumn'], template['slaProperties'] = profiler.sla()
+
+
+def tee_views(writer, views):
+    # Also write every view to the standalone metadata output while it passes through
+    for view_name, view_metadata in views:
+        writer.write((), view_name, view_metadata)
+        yield view_name, view_metadata
+
+
+def build_connection_string(server, database, username, password, driver):
+    return f'DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}'
+
+
+def resolve_view_tables(cursor, schema_views, table_cache, prefetch=True):
+    # Load the view dependency graph for all requested schemas in one query. Without OPENJSON the graph is
+    # read a schema at a time and the tables are not prefetched but fetched one at a time through the cache.
+    openjson = supports_openjson(cursor)
+    if not openjson:
+        print("The database has no OPENJSON (SQL Server 2016, compatibility level 130); "
+              "reading schemas and tables one at a time")
+    dependency_index = load_view_dependencies(cursor, schemas=list(schema_views), openjson=openjson)
+
+    # Resolve the base tables behind every view, following views that reference other views. The server
+    # matched the requested names ignoring case; so do the lookups in the index, which uses its spelling.
+    view_tables = OrderedDict()
+    for schema, views in schema_views.items():
+        # If views list is empty, take all views of the schema from the dependency index
+        if not views:
+            views = [view_name for view_schema, view_name in dependency_index
+                     if fold_name(view_schema) == fold_name(schema)]
+
+        for view in views:
+            try:
+                view_key = dependency_index.resolve((schema, view))
+                if view_key is not None:
+                    view_tables[(schema, view)] = resolve_base_tables(cursor, dependency_index, *view_key,
+                                                                   openjson=openjson)
+                else:
+                    view_tables[(schema, view)] = None
+            except pyodbc.Error as e:
+                # Handle the error and continue to the next view
+                print(f"Error resolving dependencies of view {schema}.{view}: {str(e)}")
+
+    if prefetch and openjson:
+        try:
+            table_cache.prefetch(table for tables in view_tables.values() if tables for table in tables)
+        except pyodbc.Error as e:
+            # Fall back to fetching tables one at a time through the cache
+            print(f"Error prefetching table metadata: {str(e)}")
+
+    return view_tables
+
+
+def profile_view_tables(profiler, cursor, table_cache, view_tables):
+    # Start profiling every table behind the views; samples keep running while the views are extracted
+    try:
+        profiler.profile(cursor, table_cache, (table for tables in view_tables.values() if tables for table in tables))
+    except pyodbc.Error as e:
+        print(f"Error profiling tables: {str(e)}")
+
+
+def print_cache_stats(table_cache):
+    cache_stats = table_cache.stats()
+    print(f"Table metadata cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+          f"{cache_stats['evictions']} evictions")
+
+
+def run_single(connection_string, schema_views, output_directory='output', shard_output=False,
+               table_cache_size=1024, prefetch=True, profile_options=None, catalog=None, server=None, database=None):
+    # Save the metadata to a YAML file, and incorporate it into the main YAML structure. Each view is written
+    # to both files as soon as it is extracted; with shard_output each output becomes a directory holding one
+    # file per view and an index file
+    suffix = '' if shard_output else '.yaml'
+    metadata_output_path = os.path.join(output_directory, 'mssql_metadata_output' + suffix)
+    output_path = os.path.join(output_directory, 'mssql_gen_data_contract_v2' + suffix)
+
+    # Establish a connection; it is closed however the run ends
+    connection = connect_instrumented(pyodbc.connect, connection_string)
+    profiler = None
+    try:
+        cursor = connection.cursor()
+
+        table_cache = TableMetadataCache(cursor, maxsize=table_cache_size)
+        view_tables = resolve_view_tables(cursor, schema_views, table_cache, prefetch=prefetch)
+
+        # Optional profiling of the referenced tables from catalog statistics and bounded samples
+        if profile_options is not None:
+            profiler = TableProfiler(lambda: connect_instrumented(pyodbc.connect, connection_string),
+                                     **profile_options)
+            profile_view_tables(profiler, cursor, table_cache, view_tables)
+
+        template = contract_template()
+        if catalog is not None:
+            # The contract is stored in the catalog and both outputs are rendered back from it
+            views = iter_view_metadata(view_tables, table_cache, profiler)
+            with CatalogContractWriter(catalog, contract_name(output_path), server=server, database=database,
+                                       path=output_path) as contract_writer:
+                write_contract(contract_writer, template, with_sla(template, views, profiler) if profiler else views)
+            render_contract(catalog, contract_name(output_path), metadata_output_path, shard=shard_output,
+                            views_only=True)
+            render_contract(catalog, contract_name(output_path), output_path, shard=shard_output)
+        else:
+            with open_contract_writer(metadata_output_path, shard=shard_output,
+                                      shard_top_level=True) as metadata_writer, \
+                    open_contract_writer(output_path, shard=shard_output) as contract_writer:
+                views = tee_views(metadata_writer, iter_view_metadata(view_tables, table_cache, profiler))
+                write_contract(contract_writer, template, with_sla(template, views, profiler) if profiler else views)
+    finally:
+        if profiler is not None:
+            profiler.close()
+        # Closing the connection closes its cursors too
+        connection.close()
+
+    print(f"Metadata saved to {metadata_output_path}")
+
+    print_cache_stats(table_cache)
+
+    print(f"View columns metadata saved to {output_path}")
+
+
+def target_file_name(*parts):
+    return '.'.join(UNSAFE_FILE_CHARACTERS.sub('_', str(part)) for part in parts)
+
+
+def remaining_query_timeout(started, target_timeout, query_timeout):
+    # Query timeout in whole seconds (0 is none) that keeps the next query within the target's remaining time,
+    # so a single slow query cannot run past target_timeout
+    if target_timeout is None:
+        return query_timeout
+    remaining = target_timeout - (time.monotonic() - started)
+    if remaining <= 0:
+        raise TimeoutError(f"target exceeded {target_timeout}s")
+    remaining = max(1, math.ceil(remaining))
+    return min(query_timeout, remaining) if query_timeout else remaining
+
+
+def extract_target(target, username, password, driver, partial_directory, table_cache_size=1024, prefetch=True,
+                   target_timeout=None, query_timeout=0, login_timeout=0, profile_options=None, target_index=0):
+    # Fan-out worker: one connection per target, views written to a partial file as they are extracted.
+    # Any failure is reported in the returned summary instead of raised so other targets keep going.
+    # The partial is named after the target's position too, since several targets can share a schema
+    # with different view filters.
+    server, database, schema, view_filter = target
+    partial_name = target_file_name(f"{target_index:05d}", server, database, schema, 'yaml')
+    summary = {'server': server, 'database': database, 'schema': schema, 'status': 'ok', 'views': 0,
+               'partial': os.path.join(partial_directory, partial_name), 'error': None, 'sla': None}
+    started = time.monotonic()
+
+    try:
+        # The login and query timeouts keep a hanging server from holding a worker forever; each query is also
+        # cut off when the target runs out of time
+        connection_string = build_connection_string(server, database, username, password, driver)
+        connection = connect_instrumented(pyodbc.connect, connection_string, timeout=login_timeout)
+        profiler = None
+
+        try:
+            connection.timeout = remaining_query_timeout(started, target_timeout, query_timeout)
+            cursor = connection.cursor()
+            table_cache = TableMetadataCache(cursor, maxsize=table_cache_size)
+            view_tables = resolve_view_tables(cursor, {schema: list(view_filter)}, table_cache, prefetch=prefetch)
+
+            if profile_options is not None:
+                profiler = TableProfiler(
+                    lambda: connect_instrumented(pyodbc.connect, connection_string, timeout=login_timeout),
+                    **profile_options)
+                profile_view_tables(profiler, cursor, table_cache, view_tables)
+
+            with open_contract_writer(summary['partial']) as writer:
+                for view_name, view_metadata in iter_view_metadata(view_tables, table_cache, profiler):
+                    writer.write((), view_name, view_metadata)
+                    summary['views'] += 1
+                    connection.timeout = remaining_query_timeout(started, target_timeout, query_timeout)
+
+            # Merged into the database's contract together with the other targets' SLA fields
+            if profiler is not None:
+                summary['sla'] = list(profiler.sla())
+        finally:
+            if profiler is not None:
+                profiler.close()
+            # Closing the connection closes its cursors too
+            connection.close()
+    except TimeoutError as e:
+        summary.update(status='timeout', error=str(e))
+    except Exception as e:
+        # HYT00 is the ODBC query timeout
+        timed_out = isinstance(e, pyodbc.Error) and bool(e.args) and e.args[0] == 'HYT00'
+        summary.update(status='timeout' if timed_out else 'failed', error=str(e))
+
+    summary['seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
+
+def merge_partials(summaries, output_directory, catalog=None):
+    # Deterministic merge: one contract per (server, database), with views in target order regardless of
+    # which worker finished first. Only one partial is held in memory at a time. With a catalog the merged
+    # contract is stored there first and rendered back from it.
+    databases = OrderedDict()
+    for summary in summaries:
+        if summary['status'] == 'ok':
+            databases.setdefault((summary['server'], summary['database']), []).append(summary)
+
+    output_paths = []
+    for (server, database), database_summaries in databases.items():
+        template = contract_template()
+        template['server'] = server
+        template['database'] = database
+
+        # Profiled targets contribute their table properties, once per (property, column) even when targets
+        # share tables. The first default column found is kept, and only its latestValue.
+        slas = [summary['sla'] for summary in database_summaries if summary.get('sla')]
+        if slas:
+            default_column = next((column for column, _ in slas if column), None)
+            sla_properties = OrderedDict()
+            for _, properties in slas:
+                for sla_property in properties:
+                    if sla_property['property'] == 'latestValue' and sla_property['column'] != default_column:
+                        continue
+                    sla_properties.setdefault((sla_property['property'], sla_property['column']), sla_property)
+            template['slaDefaultColumn'] = default_column
+            template['slaProperties'] = list(sla_properties.values())
+
+        def iter_partial_views():
+            emitted = set()
+            extracted = set()
+            for summary in database_summaries:
+                with open(summary['partial']) as partial_file:
+                    partial_views = load_yaml(partial_file) or {}
+                for view_name, view_metadata in partial_views.items():
+                    # Overlapping view filters on one schema extract the same view more than once, under names
+                    # that may differ in case
+                    view_id = fold_name((summary['schema'], view_name))
+                    if view_id in extracted:
+                        continue
+                    extracted.add(view_id)
+
+                    # A view name already written for another schema is qualified to keep the keys unique
+                    view_key = view_name if view_name not in emitted else f"{summary['schema']}.{view_name}"
+                    emitted.add(view_key)
+                    yield view_key, view_metadata
+
+        output_path = os.path.join(output_directory,
+                                   target_file_name('mssql_gen_data_contract_v2', server, database, 'yaml'))
+        if catalog is not None:
+            with CatalogContractWriter(catalog, contract_name(output_path), server=server, database=database,
+                                       path=output_path) as writer:
+                write_contract(writer, template, iter_partial_views())
+            render_contract(catalog, contract_name(output_path), output_path)
+        else:
+            with open_contract_writer(output_path) as writer:
+                write_contract(writer, template, iter_partial_views())
+        output_paths.append(output_path)
+
+    return output_paths
+
+
+def extract_target_in_process(query_log_sample_rate, *args):
+    # Worker processes collect their own metrics and hand them back with the summary to be merged
+    start_run(query_log_sample_rate=query_log_sample_rate)
+    summary = extract_target(*args)
+    summary['metrics'] = get_metrics().snapshot()
+    return summary
+
+
+def run_targets(targets, username, password, driver, output_directory='output', max_workers=8, executor='thread',
+                table_cache_size=1024, prefetch=True, target_timeout=None, query_timeout=0, login_timeout=0,
+                profile_options=None, catalog=None):
+    partial_directory = os.path.join(output_directory, 'partials')
+    os.makedirs(partial_directory, exist_ok=True)
+
+    if executor == 'process':
+        # multiprocessing is only loaded by runs that ask for worker processes
+        from concurrent.futures import ProcessPoolExecutor as executor_class
+        worker = (extract_target_in_process, get_metrics().query_log_sample_rate)
+    else:
+        executor_class = ThreadPoolExecutor
+        worker = (extract_target,)
+    with executor_class(max_workers=max_workers) as pool:
+        futures = [pool.submit(*worker, tuple(target), username, password, driver, partial_directory,
+                               table_cache_size, prefetch, target_timeout, query_timeout, login_timeout,
+                               profile_options, target_index)
+                   for target_index, target in enumerate(targets)]
+
+        # Collect in target order; a crashed worker process is recorded like any other failure
+        summaries = []
+        for target, future in zip(targets, futures):
+            try:
+                summary = future.result()
+                if 'metrics' in summary:
+                    get_metrics().merge(summary.pop('metrics'))
+                summaries.append(summary)
+            except Exception as e:
+                server, database, schema, _ = target
+                summaries.append({'server': server, 'database': database, 'schema': schema, 'status': 'failed',
+                                  'views': 0, 'partial': None, 'error': str(e), 'seconds': None})
+
+    output_paths = merge_partials(summaries, output_directory, catalog=catalog)
+
+    # Per-target success/failure summary
+    for summary in summaries:
+        line = f"{summary['server']}/{summary['database']}/{summary['schema']}: {summary['status']}, " \
+               f"{summary['views']} views in {summary['seconds']}s"
+        print(line + (f" ({summary['error']})" if summary['error'] else ''))
+    succeeded = sum(1 for summary in summaries if summary['status'] == 'ok')
+    print(f"{succeeded}/{len(summaries)} targets succeeded; contracts saved to {', '.join(output_paths) or 'nothing'}")
+
+    return summaries
+
+
+# Run configuration. A config file passed to the command line overrides any of these keys; replace these
+# values with your MSSQL connection details
+DEFAULT_CONFIG = {
+    'server': 'server_name',
+    'database': 'database_name',
+    'username': 'username',
+    'password': 'password',
+    'driver': 'ODBC Driver 17 for SQL Server',
+
+    # Dictionary of schema names and associated views (empty list implies all views)
+    # The following is a sample for the AdventureWorks database
+    'schema_views': {
+        'Person': [
+            'vStateProvinceCountryRegion'
+        ],
+        'HumanResources': [],
+        'Sales': []
+    },
+
+    # Fan-out targets as [server, database, schema, view filter]; an empty filter implies all views of the
+    # schema. When targets are given they replace server/database/schema_views, run on a worker pool with one
+    # connection per target, and produce one merged contract per database, e.g.
+    # [['server_name', 'AdventureWorks', 'Person', ['vStateProvinceCountryRegion']],
+    #  ['server_name', 'AdventureWorks', 'Sales', []]]
+    'targets': [],
+    'fan_out_workers': 8,
+    'fan_out_executor': 'thread',  # or 'process'
+    'target_timeout': 600,  # seconds per target
+    'query_timeout': 120,  # seconds per query
+    'login_timeout': 30,  # seconds per connection attempt
+
+    # Table metadata cache shared by all views; prefetching warms it for every referenced table in one query
+    'table_cache_size': 1024,
+    'prefetch_table_metadata': True,
+
+    # Profiling of the tables behind the views fills column tags, slaProperties and slaDefaultColumn. Row counts,
+    # sizes and column profiles come from partition stats and existing statistics histograms; columns without
+    # statistics are sampled with TABLESAMPLE, at most profile_sample_rows rows and profile_table_timeout
+    # seconds per table, on profile_workers concurrent connections
+    'profile_tables': False,
+    'profile_workers': 4,
+    'profile_sample_rows': 100000,
+    'profile_table_timeout': 30,
+
+    'output_directory': 'output',
+    # Local SQLite catalog the contracts are stored in before being rendered to YAML; see metadata_catalog
+    'catalog_path': None,
+    # Each output becomes a directory holding one file per view and an index file
+    'shard_output': False,
+
+    # Per-phase timings, query latency histograms and row/round-trip/byte counts are written here after the
+    # run: a JSON report, or a Prometheus textfile when the path ends in .prom
+    'metrics_report_path': None,
+    # Fraction of queries logged verbatim with their latency and result columns (0 disables query logging)
+    'query_log_sample_rate': 0.0,
+}
+
+
+def run(config=None):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    metrics = start_run(query_log_sample_rate=config['query_log_sample_rate'])
+
+    profile_options = None
+    if config['profile_tables']:
+        profile_options = {'max_workers': config['profile_workers'], 'row_budget': config['profile_sample_rows'],
+                           'table_timeout': config['profile_table_timeout']}
+
+    catalog = open_catalog(config['catalog_path']) if config['catalog_path'] else None
+
+    if config['targets']:
+        run_targets(config['targets'], config['username'], config['password'], config['driver'],
+                    output_directory=config['output_directory'], max_workers=config['fan_out_workers'],
+                    executor=config['fan_out_executor'], table_cache_size=config['table_cache_size'],
+                    prefetch=config['prefetch_table_metadata'], target_timeout=config['target_timeout'],
+                    query_timeout=config['query_timeout'], login_timeout=config['login_timeout'],
+                    profile_options=profile_options, catalog=catalog)
+    else:
+        run_single(build_connection_string(config['server'], config['database'], config['username'],
+                                           config['password'], config['driver']),
+                   config['schema_views'], output_directory=config['output_directory'],
+                   shard_output=config['shard_output'], table_cache_size=config['table_cache_size'],
+                   prefetch=config['prefetch_table_metadata'], profile_options=profile_options, catalog=catalog,
+                   server=config['server'], database=config['database'])
+
+    if catalog is not None:
+        catalog.close()
+
+    print(metrics.summary())
+    if config['metrics_report_path']:
+        metrics.write_report(config['metrics_report_path'])
+
+
+if __name__ == '__main__':
+    from data_contract_cli import main
+    sys.exit(main(['generate-v2'] + sys.argv[1:]))
@@ -0,0 +1,334 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Phases of a contract run; time spent in nested phases is charged to the innermost one only
+PHASES = ['connect', 'catalog_fetch', 'ddl_fetch', 'parse', 'resolve', 'profile', 'emit']
+
+# Upper bounds in seconds of the query latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0]
+
+COUNTERS = ['rows_fetched', 'round_trips', 'bytes_written', 'parse_errors', 'unresolved_references']
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class RunMetrics:
+    # Per-phase timers, per-query latency histograms and row/round-trip/byte counters of one run. Safe to
+    # share between threads; each thread keeps its own phase stack, so with concurrent extraction the
+    # phase totals add up the work of all threads and can exceed the wall clock time.
+    def __init__(self, query_log_sample_rate=0.0):
+        self.query_log_sample_rate = query_log_sample_rate
+        self.started = time.time()
+        self.phases = {phase: {'seconds': 0.0, 'count': 0} for phase in PHASES}
+        self.queries = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Names as configured -> the server's spelling, for names found only by ignoring case
+        self.name_matches = {}
+        # View -> why its definition could not be parsed, for views written without column lineage
+        self.parse_errors = {}
+        # View -> references the server could not bind to an object in this database (cross-database or missing)
+        self.unresolved_references = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._logged = 0
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            # Pause the enclosing phase while this one runs
+            self._charge(stack[-1][0], now - stack[-1][1], 0)
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = stack.pop()
+            self._charge(name, now - started, 1)
+            if stack:
+                stack[-1][1] = now
+
+    def current_phase(self):
+        stack = self._stack()
+        return stack[-1][0] if stack else None
+
+    def record_query(self, backend, query, seconds, description=None, round_trip=True):
+        label = (backend, self.current_phase() or 'other')
+        with self._lock:
+            histogram = self.queries.get(label)
+            if histogram is None:
+                histogram = self.queries[label] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)}
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            if round_trip:
+                self.counters['round_trips'] += 1
+
+            # Verbose query logging is opt-in and keeps one query out of every 1/sample_rate
+            log_query = False
+            if self.query_log_sample_rate > 0:
+                self._logged += self.query_log_sample_rate
+                if self._logged >= 1:
+                    self._logged -= 1
+                    log_query = True
+
+        if log_query:
+            columns = ', '.join(column[0] for column in description) if description else ''
+            print(f"[{label[0]}/{label[1]}] {seconds * 1000:.1f} ms: {WHITESPACE.sub(' ', query).strip()}"
+                  + (f" -> {columns}" if columns else ''))
+
+    def count(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def record_name_match(self, requested, matched):
+        # Each configured name is reported once per run however often it is looked up
+        with self._lock:
+            self.name_matches.setdefault(requested, matched)
+
+    def record_parse_error(self, view, message):
+        with self._lock:
+            self.counters['parse_errors'] += 1
+            self.parse_errors.setdefault(view, message)
+
+    def record_unresolved_reference(self, view, reference):
+        with self._lock:
+            references = self.unresolved_references.setdefault(view, [])
+            if reference not in references:
+                self.counters['unresolved_references'] += 1
+                references.append(reference)
+
+    def snapshot(self):
+        # Plain-dict form of the metrics, used for the JSON report and to merge worker process results
+        with self._lock:
+            return {
+                'started': self.started,
+                'duration_seconds': round(time.time() - self.started, 6),
+                'phases': {name: dict(phase) for name, phase in self.phases.items()},
+                'queries': [{'backend': backend, 'phase': phase, 'count': histogram['count'],
+                             'sum_seconds': histogram['sum'],
+                             'buckets': dict(zip(map(str, LATENCY_BUCKETS), histogram['buckets']))}
+                            for (backend, phase), histogram in sorted(self.queries.items())],
+                'counters': dict(self.counters),
+                'name_matches': dict(sorted(self.name_matches.items())),
+                'parse_errors': dict(sorted(self.parse_errors.items())),
+                'unresolved_references': {view: sorted(references)
+                                          for view, references in sorted(self.unresolved_references.items())},
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, phase in snapshot['phases'].items():
+                totals = self.phases.setdefault(name, {'seconds': 0.0, 'count': 0})
+                totals['seconds'] += phase['seconds']
+                totals['count'] += phase['count']
+            for query in snapshot['queries']:
+                histogram = self.queries.setdefault((query['backend'], query['phase']), {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)})
+                histogram['count'] += query['count']
+                histogram['sum'] += query['sum_seconds']
+                for index, bound in enumerate(LATENCY_BUCKETS):
+                    histogram['buckets'][index] += query['buckets'].get(str(bound), 0)
+            for counter, value in snapshot['counters'].items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+            for requested, matched in snapshot.get('name_matches', {}).items():
+                self.name_matches.setdefault(requested, matched)
+            for view, message in snapshot.get('parse_errors', {}).items():
+                self.parse_errors.setdefault(view, message)
+            for view, references in snapshot.get('unresolved_references', {}).items():
+                merged = self.unresolved_references.setdefault(view, [])
+                merged.extend(reference for reference in references if reference not in merged)
+
+    def summary(self):
+        phases = ', '.join(f"{name} {phase['seconds']:.2f}s" for name, phase in self.phases.items() if phase['count'])
+        summary = (f"Phases: {phases or 'none'}; {self.counters['round_trips']} round trips, "
+                   f"{self.counters['rows_fetched']} rows fetched, {self.counters['bytes_written']} bytes written")
+        if self.name_matches:
+            matches = ', '.join(f"{requested} -> {matched}" for requested, matched in sorted(self.name_matches.items()))
+            summary += f"; matched ignoring case: {matches}"
+        if self.parse_errors:
+            errors = ', '.join(f"{view} ({message})" for view, message in sorted(self.parse_errors.items()))
+            summary += f"; views without lineage: {errors}"
+        if self.unresolved_references:
+            references = ', '.join(f"{view} -> {', '.join(sorted(names))}"
+                                   for view, names in sorted(self.unresolved_references.items()))
+            summary += f"; unresolved references: {references}"
+        return summary
+
+    def write_report(self, path, report_format=None):
+        # JSON run report, or a Prometheus textfile for node_exporter's textfile collector (.prom)
+        report_format = report_format or ('prometheus' if path.endswith('.prom') else 'json')
+        if report_format == 'prometheus':
+            text = self.prometheus_text()
+        else:
+            text = json.dumps(self.snapshot(), indent=2) + '\n'
+
+        # The collector may read the file at any moment, so it is replaced atomically
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w') as report_file:
+            report_file.write(text)
+        os.replace(temporary_path, path)
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP data_contract_phase_seconds_total Time spent in each phase of the contract run.',
+            '# TYPE data_contract_phase_seconds_total counter',
+        ]
+        lines += [f'data_contract_phase_seconds_total{{phase="{name}"}} {phase["seconds"]:.6f}'
+                  for name, phase in snapshot['phases'].items()]
+
+        lines += [
+            '# HELP data_contract_query_seconds Latency of the queries run in each phase.',
+            '# TYPE data_contract_query_seconds histogram',
+        ]
+        for query in snapshot['queries']:
+            labels = f'backend="{query["backend"]}",phase="{query["phase"]}"'
+            cumulative = 0
+            for bound, count in query['buckets'].items():
+                cumulative += count
+                lines.append(f'data_contract_query_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'data_contract_query_seconds_bucket{{{labels},le="+Inf"}} {query["count"]}')
+            lines.append(f'data_contract_query_seconds_sum{{{labels}}} {query["sum_seconds"]:.6f}')
+            lines.append(f'data_contract_query_seconds_count{{{labels}}} {query["count"]}')
+
+        for counter, value in snapshot['counters'].items():
+            lines += [
+                f'# HELP data_contract_{counter}_total Total {counter.replace("_", " ")} in the contract run.',
+                f'# TYPE data_contract_{counter}_total counter',
+                f'data_contract_{counter}_total {value}',
+            ]
+
+        lines += [
+            '# HELP data_contract_run_duration_seconds Wall clock duration of the contract run.',
+            '# TYPE data_contract_run_duration_seconds gauge',
+            f'data_contract_run_duration_seconds {snapshot["duration_seconds"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _charge(self, name, seconds, count):
+        with self._lock:
+            totals = self.phases.setdefault(name, {'seconds': 0.0, 'count': 0})
+            totals['seconds'] += seconds
+            totals['count'] += count
+
+
+class InstrumentedCursor:
+    # Times every execute and counts the rows fetched through the cursor; everything else is passed through
+    def __init__(self, cursor, backend):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_backend', backend)
+
+    def execute(self, query, *params):
+        started = time.perf_counter()
+        result = self._cursor.execute(query, *params)
+        metrics = get_metrics()
+        # A named (server-side) cursor only declares the query here; its rows come in the fetches counted by
+        # __iter__
+        metrics.record_query(self._backend, query, time.perf_counter() - started, self._cursor.description,
+                             round_trip=not getattr(self._cursor, 'name', None))
+        # pyodbc returns the cursor itself so calls can be chained
+        return self if result is self._cursor else result
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            get_metrics().count('rows_fetched')
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        get_metrics().count('rows_fetched', len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        get_metrics().count('rows_fetched', len(rows))
+        return rows
+
+    def __iter__(self):
+        # Named (server-side) cursors fetch itersize rows per round trip and stop after the fetch that
+        # returns no rows
+        itersize = getattr(self._cursor, 'itersize', None) if getattr(self._cursor, 'name', None) else None
+        metrics = get_metrics()
+        for number, row in enumerate(self._cursor):
+            metrics.count('rows_fetched')
+            if itersize and number % itersize == 0:
+                metrics.count('round_trips')
+            yield row
+        if itersize:
+            metrics.count('round_trips')
+
+    def __getattr__(self, attribute):
+        return getattr(self._cursor, attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._cursor, attribute, value)
+
+
+class InstrumentedConnection:
+    def __init__(self, connection, backend):
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, '_backend', backend)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._backend)
+
+    def __getattr__(self, attribute):
+        return getattr(self._connection, attribute)
+
+    def __setattr__(self, attribute, value):
+        # e.g. pyodbc's connection.timeout
+        setattr(self._connection, attribute, value)
+
+
+def connect_instrumented(connect, *args, **kwargs):
+    # Open a connection inside the connect phase; queries on its cursors are recorded under the driver's name
+    with phase('connect'):
+        connection = connect(*args, **kwargs)
+    backend = type(connection).__module__.split('.')[0]
+    return InstrumentedConnection(connection, backend)
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def start_run(query_log_sample_rate=0.0):
+    # Start collecting a fresh set of metrics for a new run
+    global _metrics
+    _metrics = RunMetrics(query_log_sample_rate=query_log_sample_rate)
+    return _metrics
+
+
+def phase(name):
+    return _metrics.phase(name)
+
+
+def timed_phase(name):
+    # Decorator form of phase() for functions that belong to a single phase
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import re
+import sys
+
+from drivers import psycopg2, pyodbc
+from mssql_data_contract_gen import (
+    DEFAULT_CONFIG as GENERATOR_CONFIG,
+    ContractSessions,
+    acquire_connection,
+    build_destination_connection_string,
+    build_source_connection_string,
+    extract_catalog_snapshot,
+    iter_destination_catalog,
+    load_contract,
+    release_connection,
+    source_supports_openjson,
+)
+from run_metrics import phase, start_run, timed_phase
+
+# Postgres types a column of each MSSQL type can be replicated into, preferred type first. Lengths,
+# precisions and scales are not compared: the v1 contract records MSSQL types without them.
+TYPE_COMPATIBILITY = {
+    'bigint': ('bigint', 'numeric'),
+    'int': ('integer', 'bigint', 'numeric'),
+    'smallint': ('smallint', 'integer', 'bigint', 'numeric'),
+    'tinyint': ('smallint', 'integer', 'bigint', 'numeric'),
+    'bit': ('boolean', 'smallint', 'integer'),
+    'decimal': ('numeric',),
+    'numeric': ('numeric',),
+    'money': ('numeric', 'money'),
+    'smallmoney': ('numeric', 'money'),
+    'float': ('double precision', 'numeric'),
+    'real': ('real', 'double precision', 'numeric'),
+    'date': ('date', 'timestamp without time zone'),
+    'time': ('time without time zone', 'interval'),
+    'datetime': ('timestamp without time zone', 'timestamp with time zone'),
+    'datetime2': ('timestamp without time zone', 'timestamp with time zone'),
+    'smalldatetime': ('timestamp without time zone', 'timestamp with time zone'),
+    'datetimeoffset': ('timestamp with time zone',),
+    'char': ('character', 'character varying', 'text'),
+    'nchar': ('character', 'character varying', 'text'),
+    'varchar': ('character varying', 'text'),
+    'nvarchar': ('character varying', 'text'),
+    'sysname': ('character varying', 'text'),
+    'text': ('text', 'character varying'),
+    'ntext': ('text', 'character varying'),
+    'uniqueidentifier': ('uuid', 'character varying', 'text'),
+    'binary': ('bytea',),
+    'varbinary': ('bytea',),
+    'image': ('bytea',),
+    'timestamp': ('bytea',),
+    'rowversion': ('bytea',),
+    'xml': ('xml', 'text'),
+}
+
+# Every allowed (MSSQL type, Postgres type) pair, so each column check is a single set lookup
+COMPATIBLE_TYPES = frozenset((source_type, destination_type)
+                             for source_type, destination_types in TYPE_COMPATIBILITY.items()
+                             for destination_type in destination_types)
+
+# Type modifiers in format_type() output, e.g. character varying(50) or timestamp(3) without time zone
+TYPE_MODIFIERS = re.compile(r'\(.*?\)')
+
+# Postgres types hashed alike in fingerprints, because every MSSQL type preferring one of them also accepts
+# the other; without this a varchar replicated as text would send its table down the column-by-column path
+FINGERPRINT_TYPE_ALIASES = {'character varying': 'text'}
+
+# Per-table column hash of the destination schema, computed exactly like destination_fingerprint() below so
+# it can be compared with hashes of the source columns. Names are lower-cased and ordered byte-wise, types
+# lose their modifiers and FINGERPRINT_TYPE_ALIASES apply. Should the server and Python ever disagree on a
+# name, the table is only drilled into needlessly; drift is never missed.
+DESTINATION_DRIFT_FINGERPRINT_QUERY = """
+    SELECT
+        c.relname AS table_name,
+        md5(string_agg(
+            lower(a.attname) || E'\\t' || CASE t.base_type WHEN 'character varying' THEN 'text' ELSE t.base_type END,
+            E'\\n' ORDER BY lower(a.attname) COLLATE "C"
+        )) AS fingerprint
+    FROM pg_catalog.pg_class AS c
+    JOIN pg_catalog.pg_namespace AS n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute AS a ON a.attrelid = c.oid
+    CROSS JOIN LATERAL (
+        SELECT lower(regexp_replace(format_type(a.atttypid, a.atttypmod), '\\(.*?\\)', '', 'g')) AS base_type
+    ) AS t
+    WHERE n.nspname = %s
+      AND c.relkind IN ('r', 'p', 'v', 'f')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    GROUP BY c.relname
+"""
+
+
+def normalize_destination_type(data_type):
+    return TYPE_MODIFIERS.sub('', data_type or '').lower()
+
+
+def preferred_destination_type(data_type):
+    # Unknown source types (including UNKNOWN from unresolved view columns) keep their own name, so their
+    # objects never match on fingerprint and are always checked column by column
+    source_type = (data_type or '').lower()
+    return TYPE_COMPATIBILITY.get(source_type, (source_type,))[0]
+
+
+def check_type(source_type, destination_type):
+    source_type = (source_type or '').lower()
+    if source_type not in TYPE_COMPATIBILITY:
+        return 'unchecked'
+    if (source_type, normalize_destination_type(destination_type)) in COMPATIBLE_TYPES:
+        return 'compatible'
+    return 'incompatible'
+
+
+def _fingerprint(columns):
+    lines = sorted(f"{name.lower()}\t{FINGERPRINT_TYPE_ALIASES.get(data_type, data_type)}"
+                   for name, data_type in columns)
+    return hashlib.md5('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def source_fingerprint(columns):
+    # Hash of the destination columns a faithful replica of these source columns would have
+    return _fingerprint((column['name'], preferred_destination_type(column['type'])) for column in columns)
+
+
+def destination_fingerprint(columns):
+    return _fingerprint((column['name'], normalize_destination_type(column['type'])) for column in columns)
+
+
+def new_drift_report():
+    return {
+        'objects_checked': 0,
+        'objects_skipped': 0,
+        'missing_objects': [],
+        'added': [],
+        'removed': [],
+        'incompatible': [],
+        'unchecked': [],
+    }
+
+
+def has_drift(report):
+    # Unchecked columns have no compatibility rule and are reported without counting as drift
+    return any(report[key] for key in ('missing_objects', 'added', 'removed', 'incompatible'))
+
+
+@timed_phase('resolve')
+def detect_drift(source, destination, report=None):
+    # source and destination map object names to column lists. Objects and columns are indexed by their
+    # lower-cased names (Postgres folds unquoted identifiers), so the comparison is one hash lookup per
+    # column. Destination objects outside the source are not part of the contract and are ignored.
+    if report is None:
+        report = new_drift_report()
+    destination_objects = {object_name.lower(): object_name for object_name in destination}
+
+    for object_name, columns in source.items():
+        destination_name = destination_objects.get(object_name.lower())
+        if destination_name is None:
+            report['missing_objects'].append(object_name)
+            continue
+
+        report['objects_checked'] += 1
+        _compare_columns(report, object_name, columns, destination[destination_name])
+
+    return report
+
+
+def _compare_columns(report, object_name, source_columns, destination_columns):
+    source_index = {column['name'].lower(): column for column in source_columns}
+    destination_index = {column['name'].lower(): column for column in destination_columns}
+
+    for key, column in source_index.items():
+        destination_column = destination_index.get(key)
+        if destination_column is None:
+            report['added'].append({'object': object_name, 'column': column['name'], 'type': column['type']})
+            continue
+
+        status = check_type(column['type'], destination_column['type'])
+        if status != 'compatible':
+            report[status].append({'object': object_name, 'column': column['name'],
+                                   'source_type': column['type'], 'destination_type': destination_column['type']})
+
+    for key, column in destination_index.items():
+        if key not in source_index:
+            report['removed'].append({'object': object_name, 'column': column['name'], 'type': column['type']})
+
+
+def detect_drift_by_fingerprint(source, destination_fingerprints, fetch_destination):
+    # Compare one hash per object and fetch the destination columns only for objects whose hashes differ.
+    # fetch_destination(table_names) returns {table_name: columns} for the given destination tables.
+    report = new_drift_report()
+    destination_objects = {object_name.lower(): object_name for object_name in destination_fingerprints}
+    changed = {}
+
+    with phase('resolve'):
+        for object_name, columns in source.items():
+            destination_name = destination_objects.get(object_name.lower())
+            if destination_name is None:
+                report['missing_objects'].append(object_name)
+            elif source_fingerprint(columns) == destination_fingerprints[destination_name]:
+                report['objects_skipped'] += 1
+            else:
+                changed[object_name] = destination_name
+
+    destination = fetch_destination(sorted(set(changed.values()))) if changed else {}
+    return detect_drift({object_name: source[object_name] for object_name in changed}, destination, report)
+
+
+def contract_objects(data_contract):
+    # Source tables and views, and destination tables, of a contract written by the generator
+    source_section = data_contract.get('source') or {}
+    source = {}
+    for section in ('tables', 'views'):
+        for object_name, entry in (source_section.get(section) or {}).items():
+            source[object_name] = entry.get('columns') or []
+
+    destination = {table_name: entry.get('columns') or []
+                   for table_name, entry in (data_contract.get('destination') or {}).items()}
+    return source, destination
+
+
+@timed_phase('catalog_fetch')
+def extract_destination_drift_fingerprints(destination_connection_string, destination_schema, pool=None):
+    # Connect to Postgres
+    conn = acquire_connection(psycopg2.connect, destination_connection_string, pool)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(DESTINATION_DRIFT_FINGERPRINT_QUERY, (destination_schema,))
+        fingerprints = dict(cursor.fetchall())
+    finally:
+        # Close the connection
+        release_connection(conn, pool)
+
+    return fingerprints
+
+
+def check_live_drift(source_connection_string, destination_connection_string, source_schema, destination_schema,
+                     object_names=None, fingerprint_only=False, sessions=None):
+    # The source columns come from one catalog query; in fingerprint mode the destination answers with one
+    # hash per table and only the tables whose hash differs are read column by column
+    openjson = object_names is None or source_supports_openjson(source_connection_string, sessions)
+    catalog = extract_catalog_snapshot(source_connection_string, source_schema, object_names=object_names,
+                                       pool=sessions.mssql if sessions else None, openjson=openjson)
+    source = {object_name: columns for (_, object_name), columns in catalog.items()}
+    destination_pool = sessions.destination if sessions else None
+
+    def fetch_destination(table_names=None):
+        return dict(iter_destination_catalog(destination_connection_string, destination_schema,
+                                             pool=destination_pool, table_names=table_names))
+
+    if not fingerprint_only:
+        return detect_drift(source, fetch_destination())
+
+    fingerprints = extract_destination_drift_fingerprints(destination_connection_string, destination_schema,
+                                                          pool=destination_pool)
+    return detect_drift_by_fingerprint(source, fingerprints, fetch_destination)
+
+
+def check_contract_drift(data_contract, fingerprint_only=False):
+    source, destination = contract_objects(data_contract)
+    if not fingerprint_only:
+        return detect_drift(source, destination)
+
+    with phase('resolve'):
+        fingerprints = {table_name: destination_fingerprint(columns) for table_name, columns in destination.items()}
+    return detect_drift_by_fingerprint(source, fingerprints,
+                                       lambda table_names: {name: destination[name] for name in table_names})
+
+
+def print_drift_report(report):
+    for object_name in report['missing_objects']:
+        print(f"Missing from destination: {object_name}")
+    for entry in report['added']:
+        print(f"Added column: {entry['object']}.{entry['column']} ({entry['type']})")
+    for entry in report['removed']:
+        print(f"Removed column: {entry['object']}.{entry['column']} ({entry['type']})")
+    for entry in report['incompatible']:
+        print(f"Incompatible type: {entry['object']}.{entry['column']} "
+              f"({entry['source_type']} -> {entry['destination_type']})")
+
+    print(f"Drift check: {report['objects_checked']} objects compared, {report['objects_skipped']} unchanged by "
+          f"fingerprint, {len(report['missing_objects'])} missing, {len(report['added'])} added, "
+          f"{len(report['removed'])} removed, {len(report['incompatible'])} incompatible and "
+          f"{len(report['unchecked'])} unchecked columns")
+
+
+# Run configuration. Connection settings are the generator's; a config file passed to the command line
+# overrides any of these keys
+DEFAULT_CONFIG = {
+    **{key: value for key, value in GENERATOR_CONFIG.items() if key.startswith(('source_', 'destination_'))},
+
+    # Compare the sections of a contract written by the generator instead of querying both databases
+    'contract_path': None,
+
+    # Compare one hash per object first and check columns only where the hashes differ
+    'fingerprint_only': False,
+
+    # The drift report is written here as JSON
+    'drift_report_path': None,
+
+    'metrics_report_path': None,
+    'query_log_sample_rate': 0.0,
+}
+
+
+def run(config=None):
+    # Returns 1 when drift was found and 2 when it could not be checked, so scheduled checks can alert on the
+    # exit status
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    metrics = start_run(query_log_sample_rate=config['query_log_sample_rate'])
+
+    if config['contract_path']:
+        data_contract = load_contract(config['contract_path'])
+        if data_contract is None:
+            print(f"Contract {config['contract_path']} not found")
+            return 2
+        report = check_contract_drift(data_contract, fingerprint_only=config['fingerprint_only'])
+    else:
+        source_connection_string = build_source_connection_string(config)
+        destination_connection_string = build_destination_connection_string(config)
+        object_names = list(config['source_tables']) + list(config['source_views'])
+
+        try:
+            with ContractSessions(source_connection_string, destination_connection_string, None,
+                                  pool_size=1) as sessions:
+                report = check_live_drift(source_connection_string, destination_connection_string,
+                                          config['source_schema'], config['destination_schema'],
+                                          object_names=object_names or None,
+                                          fingerprint_only=config['fingerprint_only'], sessions=sessions)
+        except (pyodbc.Error, psycopg2.Error) as e:
+            print(f"Error checking drift: {e}")
+            return 2
+
+    print_drift_report(report)
+    if config['drift_report_path']:
+        with open(config['drift_report_path'], 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    print(metrics.summary())
+    if config['metrics_report_path']:
+        metrics.write_report(config['metrics_report_path'])
+
+    return 1 if has_drift(report) else 0
+
+
+if __name__ == '__main__':
+    from data_contract_cli import main
+    sys.exit(main(['drift'] + sys.argv[1:]))
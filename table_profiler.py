@@ -0,0 +1,325 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from drivers import pyodbc
+from run_metrics import phase, timed_phase
+
+# Row counts and sizes of many tables in one round trip, from partition metadata rather than COUNT(*).
+# Heaps (index_id 0) and clustered indexes (index_id 1) hold every row once; pages count all indexes.
+TABLE_STORAGE_QUERY = """
+    SELECT
+        f.SchemaName,
+        f.TableName,
+        SUM(CASE WHEN ps.index_id IN (0, 1) THEN ps.row_count ELSE 0 END) AS TableRows,
+        SUM(ps.reserved_page_count) * 8 AS ReservedKb,
+        SUM(ps.used_page_count) * 8 AS UsedKb
+    FROM OPENJSON(?) WITH (SchemaName sysname '$[0]', TableName sysname '$[1]') AS f
+    JOIN sys.dm_db_partition_stats AS ps
+        ON ps.object_id = OBJECT_ID(QUOTENAME(f.SchemaName) + '.' + QUOTENAME(f.TableName))
+    GROUP BY f.SchemaName, f.TableName
+"""
+
+# Column profiles from the statistics the server already keeps, one row per column that leads a statistics
+# object with a histogram. Histogram counts are scaled to the table, so the NULL step gives the null count,
+# equal and distinct range rows add up to a distinct estimate, and the first and last keys are min and max.
+# When a column leads several statistics the one with the largest sample wins. Filtered statistics describe only
+# the rows their filter matches, so they are left out.
+COLUMN_STATISTICS_QUERY = """
+    WITH ColumnStatistics AS (
+        SELECT
+            f.SchemaName,
+            f.TableName,
+            c.name AS ColumnName,
+            sp.rows AS StatisticsRows,
+            sp.last_updated AS LastUpdated,
+            h.NullRows,
+            h.DistinctValues,
+            h.MinValue,
+            h.MaxValue,
+            ROW_NUMBER() OVER (PARTITION BY s.object_id, sc.column_id
+                               ORDER BY sp.rows_sampled DESC, sp.last_updated DESC) AS Preference
+        FROM OPENJSON(?) WITH (SchemaName sysname '$[0]', TableName sysname '$[1]') AS f
+        JOIN sys.stats AS s ON s.object_id = OBJECT_ID(QUOTENAME(f.SchemaName) + '.' + QUOTENAME(f.TableName))
+                           AND s.has_filter = 0
+        JOIN sys.stats_columns AS sc ON sc.object_id = s.object_id
+                                    AND sc.stats_id = s.stats_id
+                                    AND sc.stats_column_id = 1
+        JOIN sys.columns AS c ON c.object_id = sc.object_id
+                             AND c.column_id = sc.column_id
+        CROSS APPLY sys.dm_db_stats_properties(s.object_id, s.stats_id) AS sp
+        CROSS APPLY (
+            SELECT
+                SUM(CASE WHEN hg.range_high_key IS NULL THEN hg.equal_rows ELSE 0 END) AS NullRows,
+                SUM(hg.distinct_range_rows)
+                    + SUM(CASE WHEN hg.range_high_key IS NOT NULL AND hg.equal_rows > 0 THEN 1 ELSE 0 END)
+                    AS DistinctValues,
+                CONVERT(NVARCHAR(4000), MIN(hg.range_high_key), 126) AS MinValue,
+                CONVERT(NVARCHAR(4000), MAX(hg.range_high_key), 126) AS MaxValue
+            FROM sys.dm_db_stats_histogram(s.object_id, s.stats_id) AS hg
+            HAVING COUNT(*) > 0
+        ) AS h
+    )
+    SELECT
+        SchemaName, TableName, ColumnName, StatisticsRows, LastUpdated, NullRows, DistinctValues, MinValue, MaxValue
+    FROM ColumnStatistics
+    WHERE Preference = 1
+"""
+
+NUMERIC_TYPES = {'tinyint', 'smallint', 'int', 'bigint', 'decimal', 'numeric', 'money', 'smallmoney', 'float', 'real'}
+TEMPORAL_TYPES = {'date', 'time', 'datetime', 'datetime2', 'smalldatetime', 'datetimeoffset'}
+STRING_TYPES = {'char', 'nchar', 'varchar', 'nvarchar', 'sysname'}
+# Only null ratios are sampled for these; they cannot be compared or counted distinct
+UNCOMPARABLE_TYPES = {'text', 'ntext', 'image', 'xml', 'geography', 'geometry'}
+
+# Name fragments of columns recording when a row last changed, most telling first, for slaDefaultColumn
+TIMESTAMP_COLUMN_HINTS = ('modif', 'updat', 'load', 'insert', 'creat')
+
+
+def quote_name(name):
+    return '[' + name.replace(']', ']]') + ']'
+
+
+def build_sample_query(schema, table, columns, table_rows, row_budget, seed=42):
+    # One bounded query per table for the columns without statistics. TOP caps the rows read; on tables
+    # larger than the budget TABLESAMPLE picks pages at random first, oversampled twice because page
+    # sampling is uneven. Returns the query and, per column, which aggregates it selects.
+    sample = ''
+    if table_rows is None or table_rows > row_budget:
+        percent = 100.0 if not table_rows else min(100.0, 200.0 * row_budget / table_rows)
+        sample = f" TABLESAMPLE SYSTEM ({percent:.6f} PERCENT) REPEATABLE ({seed})"
+
+    select_list = []
+    layout = []
+    for name, data_type, max_length, is_nullable in columns:
+        column = quote_name(name)
+        counts_distinct = data_type not in UNCOMPARABLE_TYPES
+        has_range = data_type in NUMERIC_TYPES or data_type in TEMPORAL_TYPES \
+            or (data_type in STRING_TYPES and max_length != 'max')
+
+        select_list.append(f"SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END)" if is_nullable else "0")
+        if counts_distinct:
+            select_list.append(f"COUNT(DISTINCT {column})")
+        if has_range:
+            select_list += [f"CONVERT(NVARCHAR(4000), MIN({column}), 126)",
+                            f"CONVERT(NVARCHAR(4000), MAX({column}), 126)"]
+        layout.append((name, counts_distinct, has_range))
+
+    columns_list = ', '.join(quote_name(name) for name, _, _, _ in columns)
+    query = (f"SELECT COUNT_BIG(*), {', '.join(select_list)} "
+             f"FROM (SELECT TOP ({int(row_budget)}) {columns_list} "
+             f"FROM {quote_name(schema)}.{quote_name(table)}{sample}) AS s OPTION (MAXDOP 1)")
+    return query, layout
+
+
+def parse_sample_row(row, layout, table_rows):
+    sampled_rows = row[0] or 0
+    values = iter(row[1:])
+    profiles = {}
+
+    for name, counts_distinct, has_range in layout:
+        nulls = next(values) or 0
+        distinct = next(values) if counts_distinct else None
+        minimum, maximum = (next(values), next(values)) if has_range else (None, None)
+
+        # A sample only bounds the distinct count from below, except for columns unique within the sample,
+        # which are taken to be unique keys and scaled to the table
+        if distinct is not None and table_rows and sampled_rows and distinct == sampled_rows - nulls \
+                and table_rows > sampled_rows:
+            distinct = round(distinct * table_rows / sampled_rows)
+
+        profiles[name] = {
+            'source': 'sample',
+            'null_ratio': round(nulls / sampled_rows, 6) if sampled_rows else None,
+            'distinct_estimate': distinct,
+            'min': minimum,
+            'max': maximum,
+            'sampled_rows': sampled_rows,
+        }
+
+    return profiles
+
+
+class TableProfiler:
+    # Row counts, sizes and column profiles of the tables behind the views. Everything the catalog
+    # statistics can answer is read in two set-based queries; only columns without a statistics histogram
+    # are sampled, with one bounded query per table on worker connections of their own, so sampling runs
+    # concurrently across tables and alongside view extraction. Each sample is bounded by row_budget rows
+    # and by table_timeout seconds (the worker connections' query timeout).
+    def __init__(self, connect, max_workers=4, row_budget=100000, table_timeout=30):
+        self.connect = connect
+        self.row_budget = row_budget
+        self.table_timeout = table_timeout
+        self._profiles = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def profile(self, cursor, table_cache, tables):
+        # tables are (schema, table) keys; their columns come from the shared table metadata cache
+        keys = [key for key in dict.fromkeys(tables) if key not in self._profiles]
+        if not keys:
+            return
+
+        storage = self._load_storage(cursor, keys)
+        statistics = self._load_statistics(cursor, keys)
+
+        for key in keys:
+            table_rows, reserved_kb, used_kb = storage.get(key, (None, None, None))
+            profile = {'rows': table_rows, 'reserved_kb': reserved_kb, 'used_kb': used_kb, 'status': 'ok',
+                       'error': None, 'columns': OrderedDict(), 'timestamp_columns': []}
+
+            unprofiled = []
+            for _, column_name, data_type, max_length, _, is_nullable, _ in table_cache.get(*key):
+                column_statistics = statistics.get(key + (column_name,))
+                profile['columns'][column_name] = column_statistics
+                if data_type in TEMPORAL_TYPES and data_type != 'time':
+                    profile['timestamp_columns'].append(column_name)
+                if column_statistics is None:
+                    unprofiled.append((column_name, data_type, max_length, bool(is_nullable)))
+
+            # Empty tables need no sample
+            if unprofiled and table_rows != 0:
+                self._profiles[key] = self._executor.submit(self._sample, key, profile, unprofiled)
+            else:
+                self._profiles[key] = profile
+
+    @timed_phase('catalog_fetch')
+    def _load_storage(self, cursor, keys):
+        # VIEW DATABASE STATE is needed for partition stats; without it samples are bounded by TOP alone
+        try:
+            cursor.execute(TABLE_STORAGE_QUERY, json.dumps([list(key) for key in keys]))
+            return {(schema, table): (table_rows, reserved_kb, used_kb)
+                    for schema, table, table_rows, reserved_kb, used_kb in cursor.fetchall()}
+        except pyodbc.Error as e:
+            print(f"Error reading table sizes, sampling without row counts: {str(e)}")
+            return {}
+
+    @timed_phase('catalog_fetch')
+    def _load_statistics(self, cursor, keys):
+        # sys.dm_db_stats_histogram needs SQL Server 2016 SP1 CU2 or later; older servers sample every column
+        try:
+            cursor.execute(COLUMN_STATISTICS_QUERY, json.dumps([list(key) for key in keys]))
+            rows = cursor.fetchall()
+        except pyodbc.Error as e:
+            print(f"Error reading column statistics, sampling instead: {str(e)}")
+            return {}
+
+        statistics = {}
+        for schema, table, column_name, statistics_rows, last_updated, null_rows, distinct_values, minimum, \
+                maximum in rows:
+            statistics[(schema, table, column_name)] = {
+                'source': 'statistics',
+                'null_ratio': round(null_rows / statistics_rows, 6) if statistics_rows else None,
+                'distinct_estimate': round(distinct_values) if distinct_values is not None else None,
+                'min': minimum,
+                'max': maximum,
+                'statistics_updated': last_updated.isoformat() if last_updated else None,
+            }
+        return statistics
+
+    def _connection(self):
+        # One connection per worker thread, opened on first use and closed with the profiler
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connect()
+            connection.timeout = self.table_timeout
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _sample(self, key, profile, columns):
+        schema, table = key
+        started = time.monotonic()
+        query, layout = build_sample_query(schema, table, columns, profile['rows'], self.row_budget)
+
+        with phase('profile'):
+            try:
+                cursor = self._connection().cursor()
+                cursor.execute(query)
+                row = cursor.fetchone()
+                cursor.close()
+                profile['columns'].update(parse_sample_row(row, layout, profile['rows']))
+            except Exception as e:
+                # A failed sample only leaves this table's columns without statistics unprofiled. HYT00 is the
+                # ODBC query timeout; anything else, a driver error or a sample row that cannot be read, is a failure
+                timed_out = isinstance(e, pyodbc.Error) and bool(e.args) and e.args[0] == 'HYT00'
+                profile.update(status='timeout' if timed_out else 'failed', error=str(e) or type(e).__name__)
+
+        profile['sample_seconds'] = round(time.monotonic() - started, 3)
+        return profile
+
+    def get(self, schema, table):
+        # Waits for the table's sample if it is still running
+        profile = self._profiles.get((schema, table))
+        if profile is None or isinstance(profile, dict):
+            return profile
+        profile = self._profiles[(schema, table)] = profile.result()
+        return profile
+
+    def sla(self):
+        # Contract-level SLA fields: each table's row count and size, and as default column the most telling
+        # timestamp column of the largest table, with its latest value
+        profiles = [(key, self.get(*key)) for key in list(self._profiles)]
+        properties = []
+        for (schema, table), profile in profiles:
+            qualified_name = f"{schema}.{table}"
+            properties.append({'property': 'rowCount', 'value': profile['rows'], 'unit': 'rows',
+                               'column': qualified_name})
+            properties.append({'property': 'reservedSize', 'value': profile['reserved_kb'], 'unit': 'KB',
+                               'column': qualified_name})
+
+        default_column = None
+        best = None
+        for (schema, table), profile in profiles:
+            for column_name in profile['timestamp_columns']:
+                column_profile = profile['columns'][column_name]
+                if not column_profile or column_profile['max'] is None:
+                    continue
+                lowered = column_name.lower()
+                hint = next((rank for rank, fragment in enumerate(TIMESTAMP_COLUMN_HINTS) if fragment in lowered),
+                            len(TIMESTAMP_COLUMN_HINTS))
+                candidate = (hint, -(profile['rows'] or 0))
+                if best is None or candidate < best:
+                    best = candidate
+                    default_column = (f"{schema}.{table}.{column_name}", column_profile['max'])
+
+        if default_column is not None:
+            properties.append({'property': 'latestValue', 'value': default_column[1], 'unit': None,
+                               'column': default_column[0]})
+            return default_column[0], properties
+        return None, properties
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def column_tags(column_profile):
+    # Column profile as contract tags, e.g. ['nullRatio:0.02', 'distinctEstimate:1500', 'min:1', 'max:99']
+    if not column_profile:
+        return None
+
+    tags = []
+    if column_profile['null_ratio'] is not None:
+        tags.append(f"nullRatio:{column_profile['null_ratio']}")
+    if column_profile['distinct_estimate'] is not None:
+        tags.append(f"distinctEstimate:{column_profile['distinct_estimate']}")
+    if column_profile['min'] is not None:
+        tags.append(f"min:{column_profile['min']}")
+    if column_profile['max'] is not None:
+        tags.append(f"max:{column_profile['max']}")
+    tags.append(f"profiledFrom:{column_profile['source']}")
+    return tags
@@ -0,0 +1,35 @@
+import sys
+
+import pytest
+
+import synthetic_catalog
+from synthetic_catalog import QueryLog, SyntheticCatalog
+
+
+@pytest.fixture
+def stand_in_catalog(monkeypatch, tmp_path):
+    # A small synthetic catalog served through stand-in pyodbc and psycopg2 modules, with the test running in
+    # its own directory; the real driver modules, if any, are put back afterwards
+    for module_name in ('pyodbc', 'psycopg2'):
+        monkeypatch.setitem(sys.modules, module_name, None)
+    catalog = SyntheticCatalog(tables=6, columns=18, views=3, joins=1, view_columns=4, dags=2)
+    catalog.log = QueryLog()
+    synthetic_catalog.install(catalog, catalog.log)
+    monkeypatch.chdir(tmp_path)
+    return catalog
+
+
+@pytest.fixture
+def opened_connections(monkeypatch, stand_in_catalog):
+    # Every stand-in connection the generators open, to check how they were configured and that they were closed
+    opened = []
+    for module_name in ('pyodbc', 'psycopg2'):
+        module = sys.modules[module_name]
+
+        def recording_connect(*args, connect=module.connect, **kwargs):
+            connection = connect(*args, **kwargs)
+            opened.append(connection)
+            return connection
+
+        monkeypatch.setattr(module, 'connect', recording_connect)
+    return opened
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import mssql_data_contract_gen as v1
+from bench_extraction import AIRFLOW_CONNECTION_STRING
+
+
+def test_dag_filter_matches_any_criterion_with_literal_names():
+    sql, params = v1.build_dag_filter({'dag_ids': ['load_orders'], 'prefixes': ['sales_'], 'tags': ['finance'],
+                                       'tables': ['Order%Lines']})
+
+    assert sql.startswith('WHERE (d.dag_id = ANY(%s) OR d.dag_id LIKE ANY(%s) OR EXISTS')
+    assert 'task_outlet_dataset_reference' in sql and sql.count(' OR ') == 3
+    assert params == [['load_orders'], ['sales\\_%'], ['finance'], ['%Order\\%Lines%']]
+    assert v1.build_dag_filter({}) == ('', [])
+    assert v1.build_dag_filter({'dag_ids': ['a']}, keyword='AND')[0] == 'AND (d.dag_id = ANY(%s))'
+
+
+def test_table_filter_reads_every_dag_without_airflow_datasets(stand_in_catalog):
+    dag_ids = [dag_id for dag_id, _, _ in stand_in_catalog.dags]
+    dag_filter = {'tables': ['Table00001']}
+
+    assert list(v1.extract_metadata_from_airflow(AIRFLOW_CONNECTION_STRING, dag_filter=dag_filter)['dags']) == dag_ids
+
+    # Before Airflow 2.4 the dataset tables are missing; the filter is dropped instead of failing the read
+    stand_in_catalog.airflow_datasets = False
+    assert list(v1.extract_metadata_from_airflow(AIRFLOW_CONNECTION_STRING, dag_filter=dag_filter)['dags']) == dag_ids
+    assert stand_in_catalog.log.queries['airflow_dataset_tables'] == 2
+
+
+def test_unfiltered_read_does_not_look_for_datasets(stand_in_catalog):
+    v1.extract_metadata_from_airflow(AIRFLOW_CONNECTION_STRING, dag_filter={'dag_ids': ['contract_dag_00000']})
+
+    assert stand_in_catalog.log.queries['airflow_dataset_tables'] == 0
+
+
+def test_run_stats_are_merged_into_each_dag_and_the_sla(stand_in_catalog):
+    section = v1.extract_airflow_section(AIRFLOW_CONNECTION_STRING, SimpleNamespace(airflow=None), run_stats_days=30)
+
+    assert [dag['run_stats'] for dag in section['dags'].values()] == [{
+        'last_success': stand_in_catalog.last_success.isoformat(),
+        'p50_duration_seconds': 312.5,
+        'p95_duration_seconds': 845.0,
+        'failure_rate': 0.02,
+        'run_count': 30,
+    }] * len(stand_in_catalog.dags)
+    assert {sla['property']: sla['value'] for sla in section['slaProperties']} == {
+        'lastSuccess': stand_in_catalog.last_success.isoformat(), 'durationP50': 312.5, 'durationP95': 845.0,
+        'failureRate': 0.02,
+    }
+
+
+def test_run_stats_are_read_only_when_configured(stand_in_catalog):
+    section = v1.extract_airflow_section(AIRFLOW_CONNECTION_STRING, SimpleNamespace(airflow=None),
+                                         run_stats_days=v1.DEFAULT_CONFIG['airflow_run_stats_days'])
+
+    assert stand_in_catalog.log.queries['airflow_run_stats'] == 0
+    assert section == {'dags': {dag_id: {'is_active': is_active, 'schedule_interval': schedule_interval}
+                                for dag_id, is_active, schedule_interval in stand_in_catalog.dags}}
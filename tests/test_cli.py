@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+import pytest
+
+from data_contract_cli import main
+from synthetic_catalog import StandInCursor
+
+GOLDEN_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+
+def write_config(config, path='config.json'):
+    with open(path, 'w') as config_file:
+        json.dump(config, config_file)
+    return path
+
+
+def test_generate_v2_then_validate(stand_in_catalog):
+    os.makedirs('output')
+    assert main(['generate-v2', write_config({'schema_views': {stand_in_catalog.schema: []}})]) == 0
+    with open('output/mssql_gen_data_contract_v2.yaml') as contract_file, \
+            open(os.path.join(GOLDEN_DIRECTORY, 'contract_v2.yaml')) as golden_file:
+        assert contract_file.read() == golden_file.read()
+
+    assert main(['validate', write_config({'max_workers': 1}, 'validate.json')]) == 0
+
+    with open('output/mssql_gen_data_contract_v2.yaml', 'a') as contract_file:
+        contract_file.write('unexpectedKey: true\n')
+    assert main(['validate', 'validate.json']) == 1
+
+
+def test_generate_writes_the_configured_contract(stand_in_catalog):
+    config = {'source_schema': stand_in_catalog.schema, 'destination_schema': 'public',
+              'source_tables': [name for _, name in stand_in_catalog.tables],
+              'source_views': [name for _, name in stand_in_catalog.views],
+              'airflow_run_stats_days': 30, 'yaml_file_path': 'contract_v1.yaml'}
+
+    assert main(['generate', write_config(config)]) == 0
+    with open('contract_v1.yaml') as contract_file, \
+            open(os.path.join(GOLDEN_DIRECTORY, 'contract_v1.yaml')) as golden_file:
+        assert contract_file.read() == golden_file.read()
+
+
+def test_drift_exit_status_tells_drift_from_errors(stand_in_catalog):
+    tables = [name for _, name in stand_in_catalog.tables]
+    live = {'source_schema': stand_in_catalog.schema, 'destination_schema': 'public', 'source_tables': tables}
+
+    assert main(['drift', write_config(live)]) == 0
+    # The golden contract's views are not replicated to the destination
+    assert main(['drift', write_config({'contract_path': os.path.join(GOLDEN_DIRECTORY, 'contract_v1.yaml')})]) == 1
+    assert main(['drift', write_config({'contract_path': 'missing.yaml'})]) == 2
+
+
+def test_unusable_config_files_exit_with_2(tmp_path, capsys):
+    with open(tmp_path / 'list.yaml', 'w') as config_file:
+        config_file.write('- not\n- a mapping\n')
+
+    assert main(['validate', str(tmp_path / 'missing.yaml')]) == 2
+    assert main(['validate', str(tmp_path / 'list.yaml')]) == 2
+    assert main(['validate', write_config({'schema': 'v3'}, str(tmp_path / 'config.json'))]) == 2
+    assert 'must contain a mapping' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('argv', [[], ['publish']])
+def test_unknown_or_missing_commands_are_usage_errors(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+
+    assert exit_info.value.code == 2
+
+
+def test_generate_fails_when_the_destination_catalog_cannot_be_read(monkeypatch, stand_in_catalog):
+    answer = StandInCursor._answer
+
+    def answer_or_fail(cursor, query, params):
+        if 'pg_catalog.pg_class' in query:
+            raise sys.modules['psycopg2'].Error('permission denied for table pg_attribute')
+        return answer(cursor, query, params)
+
+    monkeypatch.setattr(StandInCursor, '_answer', answer_or_fail)
+    config = {'source_schema': stand_in_catalog.schema, 'destination_schema': 'public',
+              'source_tables': [name for _, name in stand_in_catalog.tables], 'yaml_file_path': 'contract_v1.yaml'}
+
+    assert main(['generate', write_config(config)]) == 2
+    assert not os.path.exists('contract_v1.yaml')
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+import mssql_data_contract_gen as v1
+from bench_extraction import AIRFLOW_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, SOURCE_CONNECTION_STRING
+
+
+def generate(catalog, **options):
+    tables = [name for _, name in catalog.tables]
+    views = [name for _, name in catalog.views]
+    return v1.generate_yaml_from_ddl(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                     AIRFLOW_CONNECTION_STRING, catalog.schema, 'public', tables, views,
+                                     run_stats_days=30, **options)
+
+
+def test_sections_are_extracted_at_the_same_time(monkeypatch, stand_in_catalog):
+    sequential = generate(stand_in_catalog)
+
+    # Each section waits until all three have started, which only a concurrent run gets past
+    started = threading.Barrier(3, timeout=5)
+    for name in ('extract_source_section', 'extract_destination_section', 'extract_airflow_section'):
+        def extract_after_barrier(*args, extract=getattr(v1, name)):
+            started.wait()
+            return extract(*args)
+
+        monkeypatch.setattr(v1, name, extract_after_barrier)
+
+    assert generate(stand_in_catalog, max_workers=4) == sequential
+
+
+def test_a_failing_section_fails_the_run_and_closes_every_connection(monkeypatch, stand_in_catalog,
+                                                                     opened_connections):
+    def extract_destination_section(*args):
+        raise RuntimeError('destination unreachable')
+
+    monkeypatch.setattr(v1, 'extract_destination_section', extract_destination_section)
+
+    with pytest.raises(RuntimeError, match='destination unreachable'):
+        generate(stand_in_catalog, max_workers=4)
+
+    assert opened_connections and all(connection.closed for connection in opened_connections)
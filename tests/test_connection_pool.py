@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from bench_extraction import AIRFLOW_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, SOURCE_CONNECTION_STRING
+from mssql_data_contract_gen import ConnectionPool, ContractSessions, generate_yaml_from_ddl
+from synthetic_catalog import StandInConnection
+
+
+@pytest.fixture
+def make_pool(stand_in_catalog):
+    opened = []
+
+    def connect(connection_string):
+        connection = StandInConnection(stand_in_catalog, stand_in_catalog.log)
+        opened.append(connection)
+        return connection
+
+    def make_pool(**options):
+        pool = ConnectionPool(connect, 'connection string', **options)
+        pool.opened_connections = opened
+        return pool
+
+    return make_pool
+
+
+def test_released_connections_are_reused_without_a_health_check(make_pool, stand_in_catalog):
+    pool = make_pool()
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert second is first
+    assert pool.stats() == {'opened': 1, 'reused': 1, 'discarded': 0}
+    assert stand_in_catalog.log.queries['health_check'] == 0
+
+
+def test_idle_connections_are_health_checked_before_reuse(make_pool, stand_in_catalog):
+    pool = make_pool(health_check_interval=0)
+    pool.release(pool.acquire())
+    pool.acquire()
+
+    assert pool.stats() == {'opened': 1, 'reused': 1, 'discarded': 0}
+    assert stand_in_catalog.log.queries['health_check'] == 1
+
+
+def test_unhealthy_connections_are_replaced(make_pool):
+    # The stand-in cannot answer this query, so the health check fails
+    pool = make_pool(health_check_interval=0, health_check_query='SELECT broken')
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert second is not first
+    assert pool.opened_connections[0].closed
+    assert pool.stats() == {'opened': 2, 'reused': 0, 'discarded': 1}
+
+
+def test_connections_that_cannot_roll_back_are_discarded(make_pool):
+    pool = make_pool()
+    connection = pool.acquire()
+
+    def rollback():
+        raise RuntimeError('connection reset')
+
+    connection.rollback = rollback
+    pool.release(connection)
+
+    assert pool.opened_connections[0].closed
+    assert pool.acquire() is not connection
+    assert pool.stats() == {'opened': 2, 'reused': 0, 'discarded': 1}
+
+
+def test_pool_size_bounds_concurrent_checkouts(make_pool):
+    pool = make_pool(pool_size=1)
+    connection = pool.acquire()
+    acquired = []
+    waiting = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiting.start()
+
+    waiting.join(0.1)
+    assert waiting.is_alive() and not acquired
+
+    pool.release(connection)
+    waiting.join(5)
+    assert acquired == [connection]
+
+
+def test_a_failed_connect_gives_its_slot_back(stand_in_catalog):
+    attempts = []
+
+    def connect(connection_string):
+        attempts.append(connection_string)
+        if len(attempts) == 1:
+            raise ConnectionError('login timeout')
+        return StandInConnection(stand_in_catalog, stand_in_catalog.log)
+
+    pool = ConnectionPool(connect, 'connection string', pool_size=1)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+
+    assert pool.acquire() is not None
+    assert pool.stats()['opened'] == 1
+
+
+def test_closing_the_pool_closes_idle_and_returned_connections(make_pool):
+    pool = make_pool()
+    idle, borrowed = pool.acquire(), pool.acquire()
+    pool.release(idle)
+    pool.close()
+
+    assert pool.opened_connections[0].closed and not pool.opened_connections[1].closed
+    with pytest.raises(RuntimeError, match='closed'):
+        pool.acquire()
+
+    pool.release(borrowed)
+    assert pool.opened_connections[1].closed
+
+
+def test_a_run_shares_one_pool_per_system_and_closes_them(stand_in_catalog, opened_connections):
+    tables = [name for _, name in stand_in_catalog.tables]
+    views = [name for _, name in stand_in_catalog.views]
+    with ContractSessions(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, AIRFLOW_CONNECTION_STRING,
+                          pool_size=4) as sessions:
+        generate_yaml_from_ddl(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, AIRFLOW_CONNECTION_STRING,
+                               stand_in_catalog.schema, 'public', tables, views, sessions=sessions)
+        stats = sessions.stats()
+
+    # Every per-object call borrowed a pooled connection instead of logging in again
+    assert all(system['opened'] == 1 for system in stats.values())
+    assert stats['mssql']['reused'] > len(stand_in_catalog.tables)
+    assert len(opened_connections) == 3 and all(connection.closed for connection in opened_connections)
@@ -0,0 +1,182 @@
+import os
+from contextlib import closing
+
+import pytest
+
+import metadata_catalog
+import mssql_data_contract_gen as v1
+import mssql_data_contract_gen_v2 as v2
+import synthetic_catalog
+from bench_extraction import AIRFLOW_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, SOURCE_CONNECTION_STRING
+from run_metrics import start_run
+
+# Golden contracts of the stand_in_catalog fixture, written by the current generators and reviewed by hand.
+# They pin today's output so any change to it shows up as a diff; they are not output of the original scripts.
+GOLDEN_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+
+def read_text(path):
+    with open(path) as text_file:
+        return text_file.read()
+
+
+def golden(file_name):
+    return read_text(os.path.join(GOLDEN_DIRECTORY, file_name))
+
+
+def contract_objects(catalog):
+    return [name for _, name in catalog.tables], [name for _, name in catalog.views]
+
+
+def generate_v1(catalog, source_tables=None, source_views=None, **options):
+    tables, views = contract_objects(catalog)
+    return v1.generate_yaml_from_ddl(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                     AIRFLOW_CONNECTION_STRING, catalog.schema, 'public',
+                                     tables if source_tables is None else source_tables,
+                                     views if source_views is None else source_views,
+                                     run_stats_days=30, **options)
+
+
+@pytest.mark.parametrize('options', [
+    {'bulk_catalog': True},
+    {'bulk_catalog': True, 'max_workers': 4},
+    {'bulk_catalog': False},
+    {'bulk_catalog': False, 'max_workers': 4},
+])
+def test_v1_contract_matches_golden(stand_in_catalog, options):
+    v1.save_yaml(generate_v1(stand_in_catalog, **options), 'contract_v1.yaml')
+
+    assert read_text('contract_v1.yaml') == golden('contract_v1.yaml')
+
+
+def test_v1_streamed_contract_matches_golden(stand_in_catalog):
+    tables, views = contract_objects(stand_in_catalog)
+    v1.generate_yaml_streaming(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, AIRFLOW_CONNECTION_STRING,
+                               stand_in_catalog.schema, 'public', tables, views, 'contract_v1.yaml',
+                               bulk_catalog=True, max_workers=2, run_stats_days=30, batch_size=2)
+
+    assert read_text('contract_v1.yaml') == golden('contract_v1.yaml')
+
+
+def test_v2_contract_matches_golden(stand_in_catalog):
+    os.makedirs('output')
+    v2.run({'schema_views': {stand_in_catalog.schema: []}})
+
+    assert read_text('output/mssql_gen_data_contract_v2.yaml') == golden('contract_v2.yaml')
+    assert read_text('output/mssql_metadata_output.yaml') == golden('metadata_v2.yaml')
+
+
+@pytest.mark.parametrize('bulk_catalog', [True, False])
+def test_v1_contract_without_openjson_matches_golden(stand_in_catalog, bulk_catalog):
+    # Compatibility level 120 (SQL Server 2014) has no OPENJSON; the stand-in then rejects queries using it
+    stand_in_catalog.compatibility_level = 120
+    v1.save_yaml(generate_v1(stand_in_catalog, bulk_catalog=bulk_catalog), 'contract_v1.yaml')
+
+    assert read_text('contract_v1.yaml') == golden('contract_v1.yaml')
+
+
+def test_v2_contract_without_openjson_matches_golden(stand_in_catalog):
+    stand_in_catalog.compatibility_level = 120
+    os.makedirs('output')
+    v2.run({'schema_views': {stand_in_catalog.schema: []}})
+
+    assert read_text('output/mssql_gen_data_contract_v2.yaml') == golden('contract_v2.yaml')
+    # Every referenced table was fetched on its own instead of in one prefetch
+    referenced = {edge[:2] for _, edges, _ in stand_in_catalog.views.values() for edge in edges if edge[2] == 'U'}
+    assert stand_in_catalog.log.queries['table_columns'] == len(referenced)
+
+
+def test_v2_reports_references_it_cannot_follow(stand_in_catalog):
+    schema = stand_in_catalog.schema
+    ddl, edges, columns = stand_in_catalog.views[(schema, 'vReport00000')]
+    tables = [edge[:2] for edge in edges if edge[2] == 'U']
+    # A table in another database, and a table the server could not bind
+    edges = edges + [('dbo', 'Customers', None, None, 'OtherDb'), (schema, 'Dropped', None)]
+    stand_in_catalog.views[(schema, 'vReport00000')] = (ddl, edges, columns)
+    metrics = start_run()
+
+    cursor = synthetic_catalog.StandInConnection(stand_in_catalog, stand_in_catalog.log).cursor()
+    view_tables = v2.resolve_view_tables(cursor, {schema: ['vReport00000']}, v2.TableMetadataCache(cursor))
+
+    assert view_tables[(schema, 'vReport00000')] == tables
+    assert metrics.counters['unresolved_references'] == 2
+    assert metrics.unresolved_references == {f'{schema}.vReport00000': ['OtherDb.dbo.Customers', f'{schema}.Dropped']}
+    assert 'unresolved references: ' in metrics.summary()
+
+
+def test_catalog_round_trip_renders_the_golden_contract(stand_in_catalog):
+    contract = generate_v1(stand_in_catalog, bulk_catalog=True)
+
+    with closing(metadata_catalog.open_catalog('contracts.sqlite')) as catalog:
+        metadata_catalog.store_contract(catalog, 'contract_v1', contract, schema=stand_in_catalog.schema)
+        metadata_catalog.render_contract(catalog, 'contract_v1', 'rendered.yaml')
+        dependents = metadata_catalog.views_depending_on(catalog, 'Table00005', schema=stand_in_catalog.schema)
+
+    assert read_text('rendered.yaml') == golden('contract_v1.yaml')
+    assert sorted({dependent['view'] for dependent in dependents}) == ['vReport00000', 'vReport00001']
+
+
+def generate_incremental(catalog, source_tables=None, source_views=None):
+    tables, views = contract_objects(catalog)
+    contract = v1.generate_yaml_incremental(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                            AIRFLOW_CONNECTION_STRING, catalog.schema, 'public',
+                                            tables if source_tables is None else source_tables,
+                                            views if source_views is None else source_views,
+                                            'contract_v1.yaml', 'contract_v1.cache.json', bulk_catalog=True,
+                                            run_stats_days=30)
+    v1.save_yaml(contract, 'contract_v1.yaml')
+    return contract
+
+
+def test_incremental_run_of_an_unchanged_schema_extracts_nothing(stand_in_catalog):
+    generate_incremental(stand_in_catalog)
+    assert read_text('contract_v1.yaml') == golden('contract_v1.yaml')
+
+    stand_in_catalog.log.reset()
+    generate_incremental(stand_in_catalog)
+
+    assert read_text('contract_v1.yaml') == golden('contract_v1.yaml')
+    queries = stand_in_catalog.log.queries
+    assert queries['catalog_columns'] == queries['module_definitions'] == queries['destination_catalog'] == 0
+
+
+def test_incremental_run_picks_up_altered_objects(stand_in_catalog):
+    generate_incremental(stand_in_catalog)
+
+    # A column added to a table the views read, and to one view's result
+    schema = stand_in_catalog.schema
+    table_columns = stand_in_catalog.tables[(schema, 'Table00005')]
+    table_columns.append((len(table_columns) + 1, 'AddedColumn', table_columns[1][2], True, False))
+    view_columns = stand_in_catalog.views[(schema, 'vReport00002')][2]
+    view_columns.append((len(view_columns) + 1, 'AddedColumn', view_columns[1][2], True, False))
+    stand_in_catalog.touch(schema, ['Table00005', 'vReport00002'])
+
+    stand_in_catalog.log.reset()
+    contract = generate_incremental(stand_in_catalog)
+    incremental_rows = stand_in_catalog.log.rows['catalog_columns']
+    stand_in_catalog.log.reset()
+
+    assert contract == generate_v1(stand_in_catalog, bulk_catalog=True)
+    assert contract['source']['tables']['Table00005']['columns'][-1]['name'] == 'AddedColumn'
+    assert contract['source']['views']['vReport00002']['columns'][-1]['name'] == 'AddedColumn'
+    # Only the altered objects, and the views reading the altered table, were read again
+    assert incremental_rows < stand_in_catalog.log.rows['catalog_columns']
+
+
+def test_incremental_run_drops_removed_objects(stand_in_catalog):
+    tables, views = contract_objects(stand_in_catalog)
+    generate_incremental(stand_in_catalog)
+
+    schema = stand_in_catalog.schema
+    del stand_in_catalog.tables[(schema, 'Table00003')]
+    del stand_in_catalog.views[(schema, 'vReport00002')]
+    tables.remove('Table00003')
+    views.remove('vReport00002')
+
+    contract = generate_incremental(stand_in_catalog, tables, views)
+
+    assert contract == generate_v1(stand_in_catalog, tables, views, bulk_catalog=True)
+    assert 'Table00003' not in contract['source']['tables'] and 'table00003' not in contract['destination']
+    assert 'vReport00002' not in contract['source']['views']
+    cache = read_text('contract_v1.cache.json')
+    assert 'Table00003' not in cache and 'vReport00002' not in cache
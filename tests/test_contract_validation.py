@@ -0,0 +1,14 @@
+import os
+
+import contract_validation
+import mssql_data_contract_gen_v2
+
+
+def test_default_generate_v2_output_passes_default_validation(stand_in_catalog):
+    os.makedirs('output')
+    mssql_data_contract_gen_v2.run({'schema_views': {stand_in_catalog.schema: []}})
+
+    # The views-only metadata file sits next to the contract but is not a contract
+    assert contract_validation.find_contract_files(contract_validation.DEFAULT_CONFIG['contract_paths']) == \
+        [os.path.abspath('output/mssql_gen_data_contract_v2.yaml')]
+    assert contract_validation.run({'max_workers': 1}) == 0
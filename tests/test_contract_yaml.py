@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import mssql_data_contract_gen
+from bench_extraction import AIRFLOW_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, SOURCE_CONNECTION_STRING
+from contract_yaml import ShardedContractWriter, load_yaml
+
+
+def load_file(path):
+    with open(path) as yaml_file:
+        return load_yaml(yaml_file)
+
+
+def test_keys_with_colliding_file_names_get_their_own_shards(tmp_path):
+    with ShardedContractWriter(str(tmp_path)) as writer:
+        for key in ('a b', 'a_b', 'Orders', 'orders'):
+            writer.write(('source', 'tables'), key, {'columns': [key]})
+
+    files = load_file(tmp_path / 'index.yaml')['shards']['source/tables']
+    assert len({file_name.lower() for file_name in files.values()}) == 4
+    for key, file_name in files.items():
+        assert load_file(os.path.join(str(tmp_path), file_name)) == {key: {'columns': [key]}}
+
+
+def test_a_shard_is_never_overwritten(tmp_path):
+    with ShardedContractWriter(str(tmp_path)) as writer:
+        writer.write(('source', 'tables'), 'Orders', {'columns': []})
+        with pytest.raises(ValueError):
+            writer.write(('source', 'tables'), 'Orders', {'columns': ['other']})
+
+    assert load_file(tmp_path / 'source' / 'tables' / os.listdir(tmp_path / 'source' / 'tables')[0]) == \
+        {'Orders': {'columns': []}}
+
+
+def reassemble(directory):
+    # The contract a sharded run describes: the index's top-level entries plus every shard under its path
+    index = load_file(os.path.join(directory, 'index.yaml'))
+    contract = {key: value for key, value in index.items() if key != 'shards'}
+    for path, files in index['shards'].items():
+        mapping = contract
+        for part in path.split('/'):
+            mapping = mapping.setdefault(part, {})
+        for key, file_name in files.items():
+            mapping.update(load_file(os.path.join(directory, file_name)))
+    return contract
+
+
+def test_streamed_shards_reassemble_to_the_single_file_contract(stand_in_catalog):
+    tables = [name for _, name in stand_in_catalog.tables]
+    views = [name for _, name in stand_in_catalog.views]
+    for path, shard in (('contract_v1.yaml', False), ('contract_v1', True)):
+        mssql_data_contract_gen.generate_yaml_streaming(
+            SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING, AIRFLOW_CONNECTION_STRING,
+            stand_in_catalog.schema, 'public', tables, views, path, shard=shard, bulk_catalog=True, max_workers=2,
+            run_stats_days=30, batch_size=2)
+
+    index = load_file(os.path.join('contract_v1', 'index.yaml'))
+    assert list(index['shards']) == ['destination', 'source/tables', 'source/views']
+    assert list(index['shards']['source/tables']) == tables
+    assert reassemble('contract_v1') == load_file('contract_v1.yaml')
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from ddl_export import DefinitionDirectoryWriter, iter_module_definitions, open_definition_writer
+from synthetic_catalog import StandInConnection
+
+
+def test_surrogate_pairs_split_across_chunks_are_decoded_whole(stand_in_catalog):
+    schema = stand_in_catalog.schema
+    view_ddl, edges, columns = stand_in_catalog.views[(schema, 'vReport00000')]
+    view_ddl = view_ddl.replace('AS', "AS /* \U0001F600 \U00020000 */", 1)
+    stand_in_catalog.views[(schema, 'vReport00000')] = (view_ddl, edges, columns)
+
+    # One UTF-16 code unit per chunk cuts every surrogate pair in half
+    cursor = StandInConnection(stand_in_catalog, stand_in_catalog.log).cursor()
+    definitions = {name: definition
+                   for _, name, _, definition in iter_module_definitions(cursor, schema, chunk_size=1)}
+
+    assert definitions['vReport00000'] == view_ddl
+    assert definitions['vReport00001'] == stand_in_catalog.views[(schema, 'vReport00001')][0]
+
+
+def write_script(path, overwrite):
+    with open_definition_writer(path, overwrite=overwrite) as writer:
+        writer.write('dbo', 'vOne', 'V', 'CREATE VIEW dbo.vOne AS SELECT 1 AS One\n')
+    with open(path) as script:
+        return script.read()
+
+
+def test_definition_script_is_appended_to_unless_overwritten(tmp_path):
+    path = str(tmp_path / 'view_ddl.txt')
+    definition = 'GOCREATE VIEW dbo.vOne AS SELECT 1 AS One\n'
+
+    assert write_script(path, overwrite=False) == definition
+    assert write_script(path, overwrite=False) == definition * 2
+    assert write_script(path, overwrite=True) == definition
+
+
+def test_per_object_files_of_colliding_names_are_kept_apart(tmp_path):
+    directory = str(tmp_path / 'definitions')
+    with DefinitionDirectoryWriter(directory) as writer:
+        for name in ('vOrders', 'VORDERS', 'v Orders', 'v_Orders'):
+            writer.write('dbo', name, 'V', f'CREATE VIEW dbo.[{name}] AS SELECT 1 AS One')
+
+    with open(os.path.join(directory, 'manifest.json')) as manifest_file:
+        manifest = json.load(manifest_file)['objects']
+    files = [entry['file'] for entry in manifest]
+    assert len({file_name.lower() for file_name in files}) == 4
+    for entry in manifest:
+        with open(os.path.join(directory, entry['file'])) as definition_file:
+            assert definition_file.read() == f"CREATE VIEW dbo.[{entry['name']}] AS SELECT 1 AS One"
+
+
+def test_writing_an_object_twice_is_refused(tmp_path):
+    with DefinitionDirectoryWriter(str(tmp_path)) as writer:
+        writer.write('dbo', 'vOrders', 'V', 'CREATE VIEW dbo.vOrders AS SELECT 1 AS One')
+
+        with pytest.raises(ValueError, match='already written'):
+            writer.write('dbo', 'vOrders', 'V', 'CREATE VIEW dbo.vOrders AS SELECT 2 AS Two')
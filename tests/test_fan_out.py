@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+import mssql_data_contract_gen_v2 as v2
+from contract_yaml import load_yaml, open_contract_writer
+
+
+def contract_views(path):
+    with open(path) as contract_file:
+        return load_yaml(contract_file)['dataset'][0]['views']
+
+
+def test_fan_out_merges_overlapping_targets_in_target_order(stand_in_catalog, opened_connections):
+    schema = stand_in_catalog.schema
+    summaries = v2.run_targets([['srv', 'db', schema, ['vReport00001']], ['srv', 'db', schema, []]], 'user',
+                               'password', 'driver', output_directory='fan_out', max_workers=2)
+
+    assert [(summary['status'], summary['views']) for summary in summaries] == [('ok', 1), ('ok', 3)]
+    views = contract_views(os.path.join('fan_out', 'mssql_gen_data_contract_v2.srv.db.yaml'))
+    assert list(views) == ['vReport00001', 'vReport00000', 'vReport00002']
+
+    os.makedirs('output')
+    v2.run({'schema_views': {schema: []}})
+    assert views == contract_views(os.path.join('output', 'mssql_gen_data_contract_v2.yaml'))
+    assert opened_connections and all(connection.closed for connection in opened_connections)
+
+
+def test_failed_target_is_reported_and_its_connection_closed(monkeypatch, stand_in_catalog, opened_connections):
+    resolve_view_tables = v2.resolve_view_tables
+
+    def resolve_or_fail(cursor, schema_views, *args, **kwargs):
+        if 'vReport00002' in schema_views[stand_in_catalog.schema]:
+            raise RuntimeError('lost connection')
+        return resolve_view_tables(cursor, schema_views, *args, **kwargs)
+
+    monkeypatch.setattr(v2, 'resolve_view_tables', resolve_or_fail)
+    schema = stand_in_catalog.schema
+    summaries = v2.run_targets([['srv', 'db', schema, ['vReport00002']], ['srv', 'db', schema, ['vReport00000']]],
+                               'user', 'password', 'driver', output_directory='fan_out')
+
+    assert [(summary['status'], summary['error']) for summary in summaries] == [('failed', 'lost connection'),
+                                                                             ('ok', None)]
+    assert list(contract_views(os.path.join('fan_out', 'mssql_gen_data_contract_v2.srv.db.yaml'))) == ['vReport00000']
+    assert len(opened_connections) == 2 and all(connection.closed for connection in opened_connections)
+
+
+def test_single_run_closes_its_connection_on_failure(monkeypatch, stand_in_catalog, opened_connections):
+    def iter_view_metadata(*args):
+        raise RuntimeError('lost connection')
+        yield
+
+    monkeypatch.setattr(v2, 'iter_view_metadata', iter_view_metadata)
+
+    with pytest.raises(RuntimeError, match='lost connection'):
+        v2.run_single('connection string', {stand_in_catalog.schema: []}, output_directory='.')
+
+    assert len(opened_connections) == 1 and opened_connections[0].closed
+
+
+def test_queries_are_cut_off_at_the_target_timeout(stand_in_catalog, opened_connections):
+    v2.run_targets([['srv', 'db', stand_in_catalog.schema, []]], 'user', 'password', 'driver',
+                   output_directory='fan_out', target_timeout=5, query_timeout=120)
+
+    assert 1 <= opened_connections[0].timeout <= 5
+
+
+def test_remaining_query_timeout():
+    started = v2.time.monotonic()
+
+    assert v2.remaining_query_timeout(started, None, 120) == 120
+    assert v2.remaining_query_timeout(started, 600, 120) == 120
+    assert v2.remaining_query_timeout(started, 30, 0) == 30
+    assert v2.remaining_query_timeout(started, 0.2, 120) == 1
+    with pytest.raises(TimeoutError):
+        v2.remaining_query_timeout(started - 10, 5, 120)
+
+
+def write_partial(path, views):
+    with open_contract_writer(path) as writer:
+        for view_name in views:
+            writer.write((), view_name, {'tables_referenced': {}})
+
+
+def test_merge_folds_the_case_of_schemas_and_views(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('partials')
+    summaries = []
+    for index, (schema, views) in enumerate([('Sales', ['vOrders']), ('SALES', ['VORDERS', 'vLines']),
+                                             ('Archive', ['vOrders'])]):
+        partial = os.path.join('partials', f'{index}.yaml')
+        write_partial(partial, views)
+        summaries.append({'server': 'srv', 'database': 'db', 'schema': schema, 'status': 'ok', 'partial': partial})
+
+    output_path, = v2.merge_partials(summaries, '.')
+
+    assert list(contract_views(output_path)) == ['vOrders', 'vLines', 'Archive.vOrders']
@@ -0,0 +1,47 @@
+from contextlib import closing
+
+import pytest
+
+import metadata_catalog
+
+
+def view_contract(columns):
+    return {'source': {'views': {'vOrders': {'columns': columns, 'referenced_tables': ['dbo.Orders']}}}}
+
+
+def test_failed_run_keeps_the_stored_contract(tmp_path):
+    with closing(metadata_catalog.open_catalog(str(tmp_path / 'contracts.sqlite'))) as catalog:
+        metadata_catalog.store_contract(catalog, 'contract', view_contract([]), schema='dbo')
+
+        with pytest.raises(RuntimeError):
+            with metadata_catalog.CatalogContractWriter(catalog, 'contract', schema='dbo') as writer:
+                writer.write(metadata_catalog.SOURCE_VIEWS_PATH, 'vOther', {'columns': []})
+                raise RuntimeError('extraction failed')
+
+        # The next run starts its own transaction on the same connection
+        metadata_catalog.store_contract(catalog, 'other', view_contract([]), schema='dbo')
+        names = catalog.execute('SELECT o.name FROM objects AS o JOIN contracts AS c USING (contract_id) '
+                                'WHERE c.name = ?', ('contract',)).fetchall()
+
+    assert names == [('vOrders',)]
+
+
+def test_contract_stored_for_another_path_is_not_replaced(tmp_path):
+    with closing(metadata_catalog.open_catalog(str(tmp_path / 'contracts.sqlite'))) as catalog:
+        metadata_catalog.store_contract(catalog, 'contract', view_contract([]), path='a/contract.yaml')
+
+        with pytest.raises(ValueError):
+            metadata_catalog.store_contract(catalog, 'contract', view_contract([]), path='b/contract.yaml')
+        metadata_catalog.store_contract(catalog, 'contract', view_contract([]), path='a/contract.yaml')
+
+
+def test_view_dependencies_are_stored_once(tmp_path):
+    columns = [{'name': 'OrderId', 'type': 'int', 'table': 'dbo.Orders', 'column': 'OrderId'},
+               {'name': 'OrderKey', 'type': 'int', 'table': 'dbo.Orders', 'column': 'OrderId'}]
+
+    with closing(metadata_catalog.open_catalog(str(tmp_path / 'contracts.sqlite'))) as catalog:
+        metadata_catalog.store_contract(catalog, 'contract', view_contract(columns), schema='dbo')
+        edges = catalog.execute('SELECT referenced_schema, referenced_name, referenced_column FROM dependencies '
+                                'ORDER BY referenced_column').fetchall()
+
+    assert edges == [('dbo', 'Orders', None), ('dbo', 'Orders', 'OrderId')]
@@ -0,0 +1,46 @@
+from run_metrics import InstrumentedCursor, get_metrics, start_run
+
+
+class ServerSideCursor:
+    # Rows of a named cursor; psycopg2 fetches them itersize at a time until a fetch returns nothing
+    def __init__(self, rows, name=None):
+        self.rows = rows
+        self.name = name
+        self.itersize = 2
+        self.description = None
+
+    def execute(self, query, *params):
+        return None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def test_named_cursor_counts_one_round_trip_per_fetch():
+    for row_count, fetches in ((0, 1), (1, 2), (2, 2), (4, 3), (5, 4)):
+        start_run()
+        cursor = InstrumentedCursor(ServerSideCursor(list(range(row_count)), name='catalog'), 'psycopg2')
+        cursor.execute('SELECT 1')
+        assert list(cursor) == list(range(row_count))
+
+        assert get_metrics().counters['round_trips'] == fetches
+        assert get_metrics().counters['rows_fetched'] == row_count
+
+
+def test_client_side_cursor_counts_the_execute():
+    start_run()
+    cursor = InstrumentedCursor(ServerSideCursor([1, 2, 3]), 'pyodbc')
+    cursor.execute('SELECT 1')
+    list(cursor)
+
+    assert get_metrics().counters['round_trips'] == 1
+
+
+def test_phase_seconds_are_exported_as_a_counter():
+    start_run()
+    with get_metrics().phase('parse'):
+        pass
+
+    text = get_metrics().prometheus_text()
+    assert '# TYPE data_contract_phase_seconds_total counter' in text
+    assert 'data_contract_phase_seconds_total{phase="parse"}' in text
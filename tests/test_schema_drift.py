@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import schema_drift
+from bench_extraction import DESTINATION_CONNECTION_STRING, SOURCE_CONNECTION_STRING
+from mssql_data_contract_gen import load_contract
+
+GOLDEN_CONTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'contract_v1.yaml')
+
+
+@pytest.mark.parametrize('fingerprint_only', [False, True])
+def test_generated_contract_has_no_column_drift(fingerprint_only):
+    report = schema_drift.check_contract_drift(load_contract(GOLDEN_CONTRACT), fingerprint_only)
+
+    # Views are not replicated, so only they are missing from the destination
+    assert report['missing_objects'] == ['vReport00000', 'vReport00001', 'vReport00002']
+    assert report['objects_checked'] + report['objects_skipped'] == 6
+    assert not any(report[key] for key in ('added', 'removed', 'incompatible', 'unchecked'))
+
+
+@pytest.mark.parametrize('fingerprint_only', [False, True])
+def test_destination_changes_are_reported(fingerprint_only):
+    contract = load_contract(GOLDEN_CONTRACT)
+    destination_columns = contract['destination']['table00001']['columns']
+    del destination_columns[1]
+    destination_columns[-1]['type'] = 'boolean'
+    destination_columns.append({'name': 'extra', 'type': 'text', 'is_nullable': True, 'is_primary_key': False})
+
+    report = schema_drift.check_contract_drift(contract, fingerprint_only)
+
+    assert report['added'] == [{'object': 'Table00001', 'column': 'Column01', 'type': 'varchar'}]
+    assert report['removed'] == [{'object': 'Table00001', 'column': 'extra', 'type': 'text'}]
+    assert report['incompatible'] == [{'object': 'Table00001', 'column': 'Column02', 'source_type': 'decimal',
+                                       'destination_type': 'boolean'}]
+    assert report['objects_checked'] == (1 if fingerprint_only else 6)
+
+
+def test_live_fingerprint_check_reads_no_destination_columns(stand_in_catalog):
+    tables = [name for _, name in stand_in_catalog.tables]
+    report = schema_drift.check_live_drift(SOURCE_CONNECTION_STRING, DESTINATION_CONNECTION_STRING,
+                                           stand_in_catalog.schema, 'public', object_names=tables,
+                                           fingerprint_only=True)
+
+    assert not schema_drift.has_drift(report)
+    assert report['objects_skipped'] == len(tables)
+    assert stand_in_catalog.log.queries['destination_catalog'] == 0
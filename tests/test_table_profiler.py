@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import mssql_data_contract_gen_v2 as v2
+from synthetic_catalog import StandInConnection, StandInCursor
+from table_profiler import COLUMN_STATISTICS_QUERY, TableProfiler, parse_sample_row
+
+
+@pytest.fixture
+def failing_sample(monkeypatch):
+    # The sample of Table00001 returns no row at all, every other table a normal one
+    sample_row = StandInCursor._sample_row
+
+    def sample_row_or_none(query):
+        return None if '[Table00001]' in query else sample_row(query)
+
+    monkeypatch.setattr(StandInCursor, '_sample_row', staticmethod(sample_row_or_none))
+
+
+def profile_tables(catalog, keys):
+    connection = StandInConnection(catalog, catalog.log)
+    cursor = connection.cursor()
+    with TableProfiler(lambda: StandInConnection(catalog, catalog.log), max_workers=2) as profiler:
+        profiler.profile(cursor, v2.TableMetadataCache(cursor), keys)
+        return {key: profiler.get(*key) for key in keys}
+
+
+def test_a_failed_sample_is_recorded_and_the_other_tables_are_profiled(stand_in_catalog, failing_sample):
+    schema = stand_in_catalog.schema
+    profiles = profile_tables(stand_in_catalog, [(schema, 'Table00000'), (schema, 'Table00001')])
+
+    failed = profiles[(schema, 'Table00001')]
+    assert failed['status'] == 'failed' and 'NoneType' in failed['error']
+    # Statistics are kept; only the sampled columns stay unprofiled
+    assert failed['columns']['Id']['source'] == 'statistics'
+    assert all(profile is None for name, profile in failed['columns'].items() if name != 'Id')
+
+    profiled = profiles[(schema, 'Table00000')]
+    assert profiled['status'] == 'ok' and profiled['error'] is None
+    assert all(profile is not None for profile in profiled['columns'].values())
+
+
+def test_v2_run_completes_when_a_sample_fails(stand_in_catalog, failing_sample):
+    os.makedirs('output')
+    v2.run({'schema_views': {stand_in_catalog.schema: []}, 'profile_tables': True})
+
+    with open('output/mssql_gen_data_contract_v2.yaml') as contract_file:
+        contract = contract_file.read()
+    assert all(view in contract for _, view in stand_in_catalog.views)
+
+
+def test_an_empty_sample_leaves_ratios_and_ranges_unknown():
+    profiles = parse_sample_row((0, None, 0, None, None), [('Amount', True, True)], table_rows=0)
+
+    assert profiles['Amount'] == {'source': 'sample', 'null_ratio': None, 'distinct_estimate': 0, 'min': None,
+                                  'max': None, 'sampled_rows': 0}
+
+
+def test_filtered_statistics_are_not_profiled():
+    assert 'has_filter = 0' in COLUMN_STATISTICS_QUERY
@@ -0,0 +1,112 @@
+from column_records import NameIndex
+from mssql_data_contract_gen import _referenced_modify_date, parse_view_ddl
+from run_metrics import start_run
+from tsql_view_parser import parse_view
+
+
+def test_cross_database_references_keep_their_database():
+    view = parse_view("""
+        CREATE VIEW dbo.vOrders AS
+        SELECT o.OrderId, c.Name
+        FROM dbo.Orders AS o
+        JOIN OtherDb.dbo.Customers AS c ON c.CustomerId = o.CustomerId
+        JOIN LinkedServer.Archive.dbo.Orders AS a ON a.OrderId = o.OrderId
+    """)
+
+    assert view['tables'] == [
+        (None, None, 'dbo', 'Orders'),
+        (None, 'OtherDb', 'dbo', 'Customers'),
+        ('LinkedServer', 'Archive', 'dbo', 'Orders'),
+    ]
+    assert view['columns'][1]['source_table'] == (None, 'OtherDb', 'dbo', 'Customers')
+
+
+def test_cross_database_tables_are_named_with_their_database():
+    columns, tables = parse_view_ddl("""
+        CREATE VIEW vOrders AS
+        SELECT o.OrderId, c.Name, h.Total
+        FROM Orders AS o
+        JOIN OtherDb.dbo.Customers AS c ON c.CustomerId = o.CustomerId
+        JOIN OtherDb..History AS h ON h.OrderId = o.OrderId
+    """, 'Sales')
+
+    assert tables == ['OtherDb..History', 'OtherDb.dbo.Customers', 'Sales.Orders']
+    assert [column['table'] for column in columns] == ['Sales.Orders', 'OtherDb.dbo.Customers', 'OtherDb..History']
+
+
+def test_cross_database_tables_never_invalidate_cached_views():
+    freshness = NameIndex({'Orders': {'object_id': 1, 'modify_date': '2024-01-01T00:00:00'}})
+
+    assert _referenced_modify_date(freshness, 'dbo', 'dbo.orders') == '2024-01-01T00:00:00'
+    assert _referenced_modify_date(freshness, 'dbo', 'OtherDb.dbo.Orders') is None
+
+
+def test_ctes_carry_lineage_to_the_outer_select():
+    view = parse_view("""
+        CREATE VIEW dbo.vTotals AS
+        WITH totals (CustomerId, Total) AS (
+            SELECT o.CustomerId, SUM(o.Amount) FROM dbo.Orders AS o GROUP BY o.CustomerId
+        )
+        SELECT t.CustomerId, t.Total FROM totals AS t
+    """)
+
+    assert view['tables'] == [(None, None, 'dbo', 'Orders')]
+    assert [(column['name'], column['source_column']) for column in view['columns']] == [
+        ('CustomerId', 'CustomerId'), ('Total', None),
+    ]
+
+
+def test_apply_and_derived_tables_are_sources():
+    view = parse_view("""
+        CREATE VIEW dbo.vLatest AS
+        SELECT c.Name, d.OrderCount, l.OrderDate
+        FROM dbo.Customers c
+        JOIN (SELECT CustomerId, COUNT(*) AS OrderCount FROM dbo.Orders GROUP BY CustomerId) AS d
+            ON d.CustomerId = c.CustomerId
+        CROSS APPLY (SELECT TOP (1) o.OrderDate FROM Sales.Orders o WHERE o.CustomerId = c.CustomerId) l
+    """)
+
+    assert view['tables'] == [(None, None, 'Sales', 'Orders'), (None, None, 'dbo', 'Customers'),
+                              (None, None, 'dbo', 'Orders')]
+    assert [(column['name'], column['source_table']) for column in view['columns']] == [
+        ('Name', (None, None, 'dbo', 'Customers')),
+        ('OrderCount', None),
+        ('OrderDate', (None, None, 'Sales', 'Orders')),
+    ]
+
+
+def test_nested_comments_and_unicode_strings_are_skipped():
+    view = parse_view("""
+        CREATE VIEW dbo.vNotes AS
+        /* outer /* nested FROM dbo.Ignored */ still a comment */
+        SELECT n.NoteId, N'it''s -- not a comment' AS Label, 'x' 'Quoted'  -- FROM dbo.AlsoIgnored
+        FROM dbo.Notes n
+    """)
+
+    assert view['tables'] == [(None, None, 'dbo', 'Notes')]
+    assert [column['name'] for column in view['columns']] == ['NoteId', 'Label', 'Quoted']
+
+
+def test_alias_equals_expression_and_view_column_list():
+    view = parse_view("""
+        CREATE VIEW [dbo].[vPeople] ([Id], [Full Name], Email) AS
+        SELECT p.PersonId, DisplayName = p.FirstName + ' ' + p.LastName, Mail = p.Email
+        FROM [dbo].[People] AS p
+    """)
+
+    assert view['name'] == (None, None, 'dbo', 'vPeople')
+    assert [(column['name'], column['source_column']) for column in view['columns']] == [
+        ('Id', 'PersonId'), ('Full Name', None), ('Email', 'Email'),
+    ]
+
+
+def test_unparsable_views_are_reported_in_the_run_metrics():
+    depth = 5000
+    view_ddl = 'CREATE VIEW dbo.vDeep AS SELECT x FROM ' + '(SELECT x FROM ' * depth + 'dbo.t' + ') AS d' * depth
+    metrics = start_run()
+
+    assert parse_view_ddl(view_ddl, 'dbo', 'vDeep') == ([], [])
+    assert metrics.counters['parse_errors'] == 1
+    assert metrics.parse_errors == {'dbo.vDeep': 'subqueries are nested too deeply to parse'}
+    assert 'views without lineage: dbo.vDeep' in metrics.summary()
+    assert 'data_contract_parse_errors_total 1' in metrics.prometheus_text()
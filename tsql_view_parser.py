@@ -0,0 +1,520 @@
+import re
+from bisect import bisect_left
+from itertools import compress, count
+
+# Single-pass tokenizer and light parser for T-SQL CREATE VIEW bodies. The tokenizer splits the
+# text with one findall over a master pattern, so the scan runs in the regex engine and its cost is
+# linear in the size of the DDL. Tokens are plain strings, with a parallel upper-cased copy for the
+# keyword tests. The parser then works on the token lists only: it finds the projection of the
+# outermost SELECT, resolves table aliases, JOIN/APPLY sources, derived tables and CTEs, and reports
+# each output column with the base table and column it comes from when that can be determined. Tables
+# are named by (server, database, schema, object) tuples with None for the parts the definition leaves
+# out, so references into another database stay distinguishable from local tables.
+
+# Leading whitespace and comments are consumed by the same match as the token that follows it, so they
+# never become tokens. The most frequent tokens come first; N'' strings are matched before the words
+# starting with N. A block comment with another comment nested inside is not matched as a comment but as
+# the /\*.* token, up to the end of the text, and tokenize() skips it by counting the nesting depth.
+TOKEN_PATTERN = re.compile(r"""\s*(?:(?:--[^\n]*|/\*[^*/]*(?:(?:\*(?!/)|/(?!\*))[^*/]*)*\*/)\s*)*(
+    [^\W\dNn][\w@$#]*
+  | [(),;]
+  | \.(?!\d)
+  | \[[^\]]*(?:\]\][^\]]*)*\]
+  | [Nn]?'[^']*(?:''[^']*)*'
+  | [Nn][\w@$#]*
+  | /\*.*
+  | "[^"]*(?:""[^"]*)*"
+  | (?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?
+  | @@?[\w@$#]+
+  | <>|!=|>=|<=|::
+  | \S
+)""", re.VERBOSE | re.DOTALL)
+
+COMMENT_MARKER_PATTERN = re.compile(r'/\*|\*/')
+
+OPERATORS = frozenset(('<>', '!=', '>=', '<=', '::', '-', '+', '*', '/', '%', '=', '<', '>', '!', '&', '|', '^', '~'))
+PARENTHESES = frozenset('()')
+
+# Keywords that end a table source or a select item; anything else after a name is an alias
+CLAUSE_KEYWORDS = frozenset((
+    'ON', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'APPLY', 'WHERE', 'GROUP', 'HAVING',
+    'ORDER', 'UNION', 'EXCEPT', 'INTERSECT', 'OPTION', 'FOR', 'WITH', 'FROM', 'SELECT', 'INTO', 'AS',
+    'PIVOT', 'UNPIVOT', 'WINDOW', 'GO',
+))
+
+# Keywords that can end an expression but never act as a column alias
+EXPRESSION_KEYWORDS = frozenset((
+    'END', 'NULL', 'AND', 'OR', 'NOT', 'IS', 'IN', 'LIKE', 'BETWEEN', 'CASE', 'WHEN', 'THEN', 'ELSE', 'COLLATE',
+    'OVER', 'ASC', 'DESC', 'EXISTS',
+))
+
+JOIN_KEYWORDS = frozenset(('JOIN', 'APPLY'))
+SET_OPERATORS = frozenset(('UNION', 'EXCEPT', 'INTERSECT'))
+SELECT_MODIFIERS = frozenset(('ALL', 'DISTINCT'))
+TOP_MODIFIERS = frozenset(('PERCENT', 'WITH', 'TIES'))
+SUBQUERY_STARTS = frozenset(('SELECT', 'WITH'))
+
+# Where the projection, the FROM clause and a join condition end
+PROJECTION_END = frozenset(('FROM', 'INTO', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'OPTION', 'FOR')) | SET_OPERATORS
+FROM_END = frozenset(('WHERE', 'GROUP', 'HAVING', 'ORDER', 'OPTION', 'FOR')) | SET_OPERATORS
+# Tokens the projection is split on; the others are stepped over without being looked at
+PROJECTION_MARKS = frozenset(('(', ',')) | PROJECTION_END
+CONDITION_END = frozenset((
+    ',', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'OUTER', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'OPTION',
+    'FOR',
+)) | SET_OPERATORS
+
+
+# Appended to the text so the last match always ends in a token; a trailing comment is then consumed
+# whole instead of being given back character by character
+END_MARKER = '\n;'
+
+
+def tokenize(sql):
+    # The text of every token in order, without whitespace and comments
+    text = sql + END_MARKER
+    tokens = TOKEN_PATTERN.findall(text)
+
+    # T-SQL block comments nest. A comment with another one inside runs to the end of the text in the
+    # pattern, so its real end is found by counting the nesting depth and the rest is tokenized again.
+    while tokens[-1].startswith('/*'):
+        position = _skip_block_comment(text, len(text) - len(tokens.pop()) + 2)
+        tokens += TOKEN_PATTERN.findall(text, min(position, len(sql)))
+
+    tokens.pop()
+    return tokens
+
+
+def _skip_block_comment(sql, position):
+    depth = 1
+    while depth:
+        marker = COMMENT_MARKER_PATTERN.search(sql, position)
+        if marker is None:
+            return len(sql)
+        depth += 1 if marker.group() == '/*' else -1
+        position = marker.end()
+    return position
+
+
+def is_word(token):
+    # Keywords and undelimited identifiers; N'...' is a string
+    first = token[0]
+    return (first.isalpha() or first == '_') and token[1:2] != "'"
+
+
+def is_name(token):
+    # Words and [bracketed] or "quoted" identifiers
+    return token[0] in '["' or is_word(token)
+
+
+def is_string(token):
+    return token[0] == "'" or (token[0] in 'Nn' and token[1:2] == "'")
+
+
+def is_identifier(token):
+    # A name that is not a clause keyword
+    return token[0] in '["' or (is_word(token) and token.upper() not in CLAUSE_KEYWORDS)
+
+
+def identifier_text(token):
+    # Strip [brackets] and "quotes" from delimited identifiers
+    if token[0] == '[':
+        return token[1:-1].replace(']]', ']')
+    if token[0] == '"':
+        return token[1:-1].replace('""', '"')
+    return token
+
+
+def string_text(token):
+    # The value of a 'string' or N'string' literal
+    return token[token.index("'") + 1:-1].replace("''", "'")
+
+
+class ViewParseError(ValueError):
+    pass
+
+
+def parse_view(view_ddl):
+    # Returns the view name, its output columns with lineage, and the base tables it reads from
+    tokens = tokenize(view_ddl)
+    parser = _ViewParser(tokens)
+    try:
+        return parser.parse()
+    except RecursionError:
+        # Every nested subquery is a level of recursion; beyond the interpreter's limit the view is not parsed
+        raise ViewParseError("subqueries are nested too deeply to parse") from None
+
+
+class _ViewParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        # Upper-cased tokens for keyword tests; delimited identifiers and strings keep their quotes, so they
+        # never equal a keyword
+        self.keys = keys = list(map(str.upper, tokens))
+
+        # Matching parenthesis for every '(' so nested blocks can be skipped in constant time
+        self.closing = {}
+        stack = []
+        for index in compress(count(), map(PARENTHESES.__contains__, keys)):
+            if keys[index] == '(':
+                stack.append(index)
+            elif stack:
+                self.closing[stack.pop()] = index
+        self.projection_marks = list(compress(count(), map(PROJECTION_MARKS.__contains__, keys)))
+        self.tables = {}
+
+    def parse(self):
+        tokens = self.tokens
+        keys = self.keys
+        view_name = None
+        column_list = None
+
+        # CREATE [OR ALTER] VIEW name [(column, ...)] [WITH options] AS
+        if 'VIEW' in keys:
+            view_name, index = self._qualified_name(keys.index('VIEW') + 1)
+            if index < len(tokens) and keys[index] == '(':
+                end = self.closing.get(index, len(tokens) - 1)
+                column_list = [identifier_text(token) for token in tokens[index + 1:end] if is_identifier(token)]
+                index = end + 1
+            index = keys.index('AS', index) + 1 if 'AS' in keys[index:] else len(tokens)
+        else:
+            index = 0
+
+        columns = self._query(index, len(tokens), {})
+
+        # An explicit column list renames the projection positionally
+        if column_list and len(column_list) == len(columns):
+            for column, name in zip(columns, column_list):
+                column['name'] = name
+
+        return {
+            'name': view_name,
+            'columns': columns,
+            'tables': sorted(self.tables.values(), key=lambda table: tuple(part or '' for part in table)),
+        }
+
+    def _qualified_name(self, index):
+        # server.database.schema.object in any delimited form; returns (server, database, schema, object)
+        tokens = self.tokens
+        keys = self.keys
+        parts = []
+        while index < len(tokens) and is_identifier(tokens[index]):
+            parts.append(identifier_text(tokens[index]))
+            index += 1
+            if index < len(tokens) and keys[index] == '.':
+                index += 1
+                # database..object leaves the schema part empty
+                while index < len(tokens) and keys[index] == '.':
+                    parts.append(None)
+                    index += 1
+            else:
+                break
+        if not parts:
+            return None, index
+        return tuple([None] * (4 - len(parts)) + parts[-4:]), index
+
+    def _query(self, start, end, ctes):
+        # [WITH cte AS (...), ...] SELECT ... [UNION SELECT ...]
+        tokens = self.tokens
+        keys = self.keys
+        index = start
+        ctes = dict(ctes)
+
+        if index < end and keys[index] == 'WITH':
+            index += 1
+            while index < end:
+                name = identifier_text(tokens[index])
+                index += 1
+                cte_columns = None
+                if index < end and keys[index] == '(':
+                    close = self.closing.get(index, end - 1)
+                    cte_columns = [identifier_text(token) for token in tokens[index + 1:close] if is_identifier(token)]
+                    index = close + 1
+                # AS ( query )
+                while index < end and keys[index] != '(':
+                    index += 1
+                close = self.closing.get(index, end - 1)
+                projection = self._query(index + 1, close, ctes)
+                if cte_columns and len(cte_columns) == len(projection):
+                    for column, column_name in zip(projection, cte_columns):
+                        column['name'] = column_name
+                ctes[name.upper()] = projection
+                index = close + 1
+                if index < end and keys[index] == ',':
+                    index += 1
+                    continue
+                break
+
+        # Only the first branch of a set operation names the output columns; the other branches
+        # still contribute referenced tables
+        columns = None
+        while index < end:
+            key = keys[index]
+            if key == '(':
+                # ( SELECT ... ) UNION ...
+                close = self.closing.get(index, end - 1)
+                branch = self._query(index + 1, close, ctes)
+                index = close + 1
+            elif key == 'SELECT':
+                branch, index = self._select(index + 1, end, ctes)
+            else:
+                index += 1
+                continue
+            if columns is None:
+                columns = branch
+            while index < end and keys[index] not in SET_OPERATORS:
+                index += 1
+
+        return columns or []
+
+    def _select(self, start, end, ctes):
+        keys = self.keys
+        index = start
+
+        # DISTINCT / ALL / TOP (n) [PERCENT] [WITH TIES]
+        while index < end:
+            key = keys[index]
+            if key in SELECT_MODIFIERS:
+                index += 1
+            elif key == 'TOP':
+                index += 1
+                index = self.closing.get(index, index) + 1
+                while index < end and keys[index] in TOP_MODIFIERS:
+                    index += 1
+            else:
+                break
+
+        # Split the projection on top-level commas until FROM, visiting only commas, parentheses and the
+        # keywords that end the projection
+        items = []
+        item_start = index
+        marks = self.projection_marks
+        position = bisect_left(marks, index)
+        index = end
+        while position < len(marks) and marks[position] < end:
+            mark = marks[position]
+            key = keys[mark]
+            if key == '(':
+                position = bisect_left(marks, self._subquery(mark, end, ctes), position)
+                continue
+            if key != ',':
+                index = mark
+                break
+            items.append((item_start, mark))
+            item_start = mark + 1
+            position += 1
+        items.append((item_start, index))
+
+        # SELECT ... INTO target is not a source; skip to FROM
+        while index < end and keys[index] != 'FROM' and keys[index] not in SET_OPERATORS:
+            index += 1
+
+        sources = {}
+        if index < end and keys[index] == 'FROM':
+            index = self._from_clause(index + 1, end, ctes, sources)
+
+        # WHERE / GROUP BY / HAVING may still read other tables through subqueries
+        while index < end and keys[index] not in SET_OPERATORS:
+            if keys[index] == '(':
+                index = self._subquery(index, end, ctes)
+            else:
+                index += 1
+
+        columns = []
+        for item_start, item_end in items:
+            if item_start < item_end:
+                columns.extend(self._select_item(item_start, item_end, sources))
+        return columns, index
+
+    def _from_clause(self, start, end, ctes, sources):
+        keys = self.keys
+        index = start
+
+        while index < end:
+            key = keys[index]
+            if key in FROM_END:
+                break
+            if key == ',' or key in JOIN_KEYWORDS:
+                index = self._table_source(index + 1, end, ctes, sources)
+            elif key == 'ON':
+                # Join conditions may contain subqueries that read more tables
+                index = self._skip_condition(index + 1, end, ctes)
+            elif index == start:
+                index = self._table_source(index, end, ctes, sources)
+            elif key == '(':
+                index = self._subquery(index, end, ctes)
+            else:
+                index += 1
+        return index
+
+    def _subquery(self, index, end, ctes):
+        # Skip a parenthesized block, collecting the tables of any subquery inside it, including subqueries
+        # nested in an expression, e.g. COALESCE((SELECT ...), 0). The block is walked once: plain parentheses
+        # are stepped into and each subquery is handed to _query and jumped over.
+        keys = self.keys
+        close = self.closing.get(index, end - 1)
+        position = index
+        while position < close:
+            if keys[position] == '(' and position + 1 < close and keys[position + 1] in SUBQUERY_STARTS:
+                subquery_close = self.closing.get(position, close)
+                self._query(position + 1, subquery_close, ctes)
+                position = subquery_close + 1
+            else:
+                position += 1
+        return close + 1
+
+    def _skip_condition(self, start, end, ctes):
+        keys = self.keys
+        index = start
+        while index < end:
+            key = keys[index]
+            if key == '(':
+                index = self._subquery(index, end, ctes)
+                continue
+            if key in CONDITION_END:
+                break
+            index += 1
+        return index
+
+    def _table_source(self, index, end, ctes, sources):
+        keys = self.keys
+        if index >= end:
+            return index
+
+        if keys[index] == '(':
+            # Derived table: ( SELECT ... ) [AS] alias [(column, ...)]
+            close = self.closing.get(index, end - 1)
+            projection = self._query(index + 1, close, ctes)
+            index = close + 1
+            alias, index = self._alias(index, end)
+            if alias is not None:
+                sources[alias.upper()] = {'columns': {column['name'].upper(): column for column in projection}}
+            return index
+
+        name, index = self._qualified_name(index)
+        if name is None:
+            return index + 1
+
+        # Table-valued function call: name(args) — read its arguments for subqueries only
+        if index < end and keys[index] == '(':
+            index = self.closing.get(index, end - 1) + 1
+            alias, index = self._alias(index, end)
+            if alias is not None:
+                sources[alias.upper()] = {'columns': {}}
+            return index
+
+        alias, index = self._alias(index, end)
+
+        # Table hints: WITH (NOLOCK)
+        if index + 1 < end and keys[index] == 'WITH' and keys[index + 1] == '(':
+            index = self.closing.get(index + 1, end - 1) + 1
+
+        object_name = name[-1]
+        cte = ctes.get(object_name.upper()) if name[:3] == (None, None, None) else None
+        if cte is not None:
+            source = {'columns': {column['name'].upper(): column for column in cte}}
+        else:
+            self.tables[tuple(part and part.upper() for part in name)] = name
+            source = {'table': name}
+
+        sources[(alias or object_name).upper()] = source
+        if alias is not None and cte is None:
+            # The table name itself also qualifies columns when no alias hides it
+            sources.setdefault(object_name.upper(), source)
+        return index
+
+    def _alias(self, index, end):
+        tokens = self.tokens
+        keys = self.keys
+        if index < end and keys[index] == 'AS':
+            index += 1
+        if index < end and is_identifier(tokens[index]) and keys[index] not in ('OUTER', 'CROSS'):
+            alias = identifier_text(tokens[index])
+            index += 1
+            # Derived table column aliases: AS d (a, b)
+            if index < end and keys[index] == '(':
+                index = self.closing.get(index, end - 1) + 1
+            return alias, index
+        return None, index
+
+    def _select_item(self, start, end, sources):
+        tokens = self.tokens
+        keys = self.keys
+
+        # alias = expression
+        if end - start > 2 and keys[start + 1] == '=' and is_identifier(tokens[start]):
+            return [self._column(identifier_text(tokens[start]), start + 2, end, sources)]
+
+        # expression [AS] alias
+        alias = None
+        if end - start > 1:
+            last, before = tokens[end - 1], keys[end - 2]
+            if before != '.' and keys[end - 1] not in EXPRESSION_KEYWORDS \
+                    and (is_string(last) or is_identifier(last)):
+                if before == 'AS':
+                    alias = last
+                    end -= 2
+                elif before != '(' and before not in OPERATORS and before not in EXPRESSION_KEYWORDS:
+                    alias = last
+                    end -= 1
+        if alias is not None:
+            alias = string_text(alias) if is_string(alias) else identifier_text(alias)
+
+        # * or qualifier.*
+        if end > start and keys[end - 1] == '*' and (end - start == 1 or keys[end - 2] == '.'):
+            qualifier = identifier_text(tokens[end - 3]) if end - start >= 3 else None
+            return self._star(qualifier, sources)
+
+        column = self._column(alias, start, end, sources)
+        return [column] if column['name'] else []
+
+    def _column(self, name, start, end, sources):
+        source_table = source_column = None
+
+        # A bare or qualified column reference (names separated by dots) carries lineage; computed
+        # expressions do not
+        tokens = self.tokens
+        if (end - start) % 2 == 1 and self.keys[start + 1:end:2].count('.') == (end - start) // 2 \
+                and all(map(is_name, tokens[start:end:2])):
+            parts = [identifier_text(token) for token in tokens[start:end:2]]
+            qualifier = parts[-2] if len(parts) > 1 else None
+            source_table, source_column = self._resolve(qualifier, parts[-1], sources)
+            name = name or parts[-1]
+
+        return {'name': name, 'source_table': source_table, 'source_column': source_column}
+
+    def _resolve(self, qualifier, column_name, sources):
+        if qualifier is not None:
+            candidates = [sources.get(qualifier.upper())]
+        else:
+            # An unqualified column can only be attributed when exactly one source is in scope
+            unique = {id(source): source for source in sources.values()}
+            candidates = list(unique.values()) if len(unique) == 1 else []
+
+        for source in candidates:
+            if source is None:
+                continue
+            if 'table' in source:
+                return source['table'], column_name
+            column = source['columns'].get(column_name.upper())
+            if column is not None:
+                return column['source_table'], column['source_column']
+        return None, None
+
+    def _star(self, qualifier, sources):
+        if qualifier is not None:
+            selected = [sources.get(qualifier.upper())]
+        else:
+            unique = {id(source): source for source in sources.values()}
+            selected = list(unique.values())
+
+        columns = []
+        for source in selected:
+            if source is None:
+                continue
+            if 'table' in source:
+                # Base table columns are unknown to the parser; callers expand them from metadata
+                columns.append({'name': '*', 'source_table': source['table'], 'source_column': '*'})
+            else:
+                columns.extend(dict(column) for column in source['columns'].values())
+        return columns